@@ -0,0 +1,82 @@
+# bench_metrics.py
+"""
+Overhead of the metrics registry: cost per recording and per /ask-shaped request.
+
+"/ask instrumentation" is what one /ask records: a DB checkout, an embedding
+batch (histogram and counter), a FAISS search and an LLM call, each timed
+with Histogram.time(). The threaded runs compare the per-thread slots with a
+single lock-protected counter.
+
+    python bench_metrics.py --ops 200000 --threads 8
+"""
+import argparse
+import threading
+import time
+from metrics import Registry
+
+def per_op(fn, ops: int) -> float:
+    start = time.perf_counter()
+    for _ in range(ops):
+        fn()
+    return (time.perf_counter() - start) / ops * 1e9
+
+def threaded(fn, ops: int, threads: int) -> float:
+    workers = [threading.Thread(target=lambda: [fn() for _ in range(ops)]) for _ in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return (time.perf_counter() - start) / (ops * threads) * 1e9
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--ops", type=int, default=200000)
+    parser.add_argument("--threads", type=int, default=8)
+    args = parser.parse_args()
+
+    registry = Registry()
+    counter = registry.counter("bench_total", "bench")
+    histogram = registry.histogram("bench_seconds", "bench")
+    labeled = registry.histogram("bench_labeled_seconds", "bench", labelnames=("operation",))
+    checkout = registry.histogram("checkout_seconds", "bench")
+    embed = registry.histogram("embed_seconds", "bench")
+    texts = registry.counter("texts_total", "bench")
+    search = registry.histogram("search_seconds", "bench")
+    llm = registry.histogram("llm_seconds", "bench", labelnames=("mode",))
+
+    def ask():
+        with checkout.time():
+            pass
+        with embed.time():
+            pass
+        texts.inc(1)
+        with search.time():
+            pass
+        with llm.labels("call").time():
+            pass
+
+    def timed():
+        with histogram.time():
+            pass
+
+    lock, locked_value = threading.Lock(), [0]
+
+    def locked_inc():
+        with lock:
+            locked_value[0] += 1
+
+    print(f"{'no-op call':<28} {per_op(lambda: None, args.ops):8.0f} ns")
+    print(f"{'Counter.inc':<28} {per_op(counter.inc, args.ops):8.0f} ns")
+    print(f"{'Histogram.observe':<28} {per_op(lambda: histogram.observe(0.003), args.ops):8.0f} ns")
+    print(f"{'labels().observe':<28} {per_op(lambda: labeled.labels('verify').observe(0.003), args.ops):8.0f} ns")
+    print(f"{'with Histogram.time()':<28} {per_op(timed, args.ops):8.0f} ns")
+    print(f"{'/ask instrumentation':<28} {per_op(ask, args.ops // 5):8.0f} ns per request")
+    print(f"{'Counter.inc, ' + str(args.threads) + ' threads':<28} {threaded(counter.inc, args.ops // args.threads, args.threads):8.0f} ns")
+    print(f"{'locked inc, ' + str(args.threads) + ' threads':<28} {threaded(locked_inc, args.ops // args.threads, args.threads):8.0f} ns")
+    start = time.perf_counter()
+    text = registry.render()
+    print(f"{'render':<28} {(time.perf_counter() - start) * 1e3:8.2f} ms for {len(text.splitlines())} lines")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+# bench_telemetry.py
+"""
+Telemetry rows per second: per-row add/commit vs. the write-behind TelemetryWriter.
+
+Runs against a throwaway SQLite file unless --url points at a real database.
+"per-row" is how log_usage wrote before; "write-behind" times submit() alone
+(what a request pays) and then the drain until every row is in the table.
+
+    python bench_telemetry.py --rows 20000
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+from datetime import datetime
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--url", default=None, help="database URL (default: temporary SQLite file)")
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    url = args.url or f"sqlite:///{os.path.join(directory, 'telemetry.db')}"
+    os.environ.setdefault("DATABASE_URL", url)
+
+    from sqlalchemy import create_engine, func
+    from sqlalchemy.orm import sessionmaker
+    from models import Base, UsageStat
+    from telemetry import TelemetryWriter
+
+    engine = create_engine(url)
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+
+    def row(i):
+        return dict(user_id=i % 100, username=f"user{i % 100}", endpoint="/ask", request_type="POST",
+                    timestamp=datetime.utcnow())
+
+    db = Session()
+    start = time.perf_counter()
+    for i in range(args.rows):
+        db.add(UsageStat(**row(i)))
+        db.commit()
+    per_row = time.perf_counter() - start
+    db.close()
+    print(f"per-row        {args.rows / per_row:10.0f} rows/s  {per_row / args.rows * 1e6:8.1f} us/row on the caller")
+
+    writer = TelemetryWriter(Session, max_queue=args.rows + 1, batch_size=args.batch_size)
+    start = time.perf_counter()
+    for i in range(args.rows):
+        writer.submit(UsageStat, **row(i))
+    submitted = time.perf_counter() - start
+    writer.flush()
+    total = time.perf_counter() - start
+    writer.close()
+    print(f"write-behind   {args.rows / total:10.0f} rows/s  {submitted / args.rows * 1e6:8.1f} us/row on the caller"
+          f"  ({writer.batches} batches)")
+
+    db = Session()
+    print(f"rows in table: {db.query(func.count(UsageStat.id)).scalar()} (expected {2 * args.rows})")
+    db.close()
+    engine.dispose()
+    shutil.rmtree(directory)
+
+if __name__ == "__main__":
+    main()
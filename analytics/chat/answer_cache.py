@@ -0,0 +1,95 @@
+# answer_cache.py
+import os
+import time
+import threading
+from collections import OrderedDict
+import numpy as np
+
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))  # cosine similarity
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "2000"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "3600"))  # seconds
+
+
+class SemanticAnswerCache:
+    """
+    LRU + TTL cache of answers, matched on question-embedding similarity.
+
+    Cached questions live as unit vectors in one preallocated matrix, so a
+    lookup is a single matrix-vector product. Every entry carries the scope
+    it was answered in (the shards searched and their generations), and only
+    entries of the same scope can match: a hit never serves one user's
+    documents to another, and answers from before an index change are never
+    matched again and age out of the LRU. Only answers produced without
+    conversation history are stored, so a hit never leaks another user's
+    conversation.
+    """
+
+    def __init__(self, threshold: float = ANSWER_CACHE_THRESHOLD,
+                 max_entries: int = ANSWER_CACHE_MAX_ENTRIES, ttl: float = ANSWER_CACHE_TTL):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # row -> (answer, created_at, cost_seconds)
+        self._matrix = None
+        self._valid = np.zeros(max_entries, dtype=bool)
+        self._scopes = np.zeros(max_entries, dtype="int64")
+
+    @staticmethod
+    def _unit(embedding) -> np.ndarray:
+        embedding = np.asarray(embedding, dtype="float32")
+        return embedding / (np.linalg.norm(embedding) or 1.0)
+
+    def _drop(self, row: int):
+        self._entries.pop(row, None)
+        self._valid[row] = False
+
+    def get(self, embedding, scope):
+        """Return the cached answer for a similar question asked in the same scope, or None."""
+        with self._lock:
+            if self._entries:
+                scores = self._matrix @ self._unit(embedding)
+                scores[~(self._valid & (self._scopes == hash(scope)))] = -1.0
+                row = int(np.argmax(scores))
+                if scores[row] >= self.threshold:
+                    answer, created_at, cost = self._entries[row]
+                    if time.time() - created_at <= self.ttl:
+                        self._entries.move_to_end(row)
+                        self.hits += 1
+                        self.saved_seconds += cost
+                        return answer
+                    self._drop(row)
+            self.misses += 1
+            return None
+
+    def put(self, embedding, answer: str, scope, cost_seconds: float = 0.0):
+        """Store an answer; cost_seconds is the LLM time a future hit will save."""
+        embedding = self._unit(embedding)
+        with self._lock:
+            if self._matrix is None:
+                self._matrix = np.zeros((self.max_entries, len(embedding)), dtype="float32")
+
+            if len(self._entries) >= self.max_entries:
+                row, _ = self._entries.popitem(last=False)
+            else:
+                row = int(np.argmin(self._valid))  # first free row
+            self._matrix[row] = embedding
+            self._valid[row] = True
+            self._scopes[row] = hash(scope)
+            self._entries[row] = (answer, time.time(), cost_seconds)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+            "saved_seconds": round(self.saved_seconds, 2),
+        }
+
+
+answer_cache = SemanticAnswerCache()
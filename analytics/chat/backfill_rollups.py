@@ -0,0 +1,92 @@
+# backfill_rollups.py
+"""
+Rebuild daily_message_rollups from chat_history.
+
+Run once after deploying the code that maintains the rollup (save_chat and
+store_chat_history count every new message). Every chat up to the highest
+id seen at the start is counted, in id-ordered batches, into a staging
+table while the live rollup keeps serving. One transaction then replaces
+the rollup with the staging table and counts the chats saved since the
+start, so the endpoints never see partial counts and no chat is missed.
+
+    python backfill_rollups.py --batch-size 50000
+"""
+import argparse
+import time
+from sqlalchemy import MetaData, func, delete, insert, select
+from database import SessionLocal, engine
+from models import Base, ChatHistory, DailyMessageRollup
+from rollups import count_messages
+from migrate_timestamps import parse_timestamp
+
+
+STAGING_TABLE = "daily_message_rollups_backfill"
+
+
+def count_chats(db, after_id: int, end_id=None, batch_size: int = 50000, table=DailyMessageRollup.__table__):
+    """
+    Count the chats with after_id < id <= end_id (no upper bound if None) into
+    table, in id-ordered batches. Returns (chats counted, chats skipped).
+    """
+    counted = skipped = 0
+    last_id = after_id
+    start = time.perf_counter()
+    while True:
+        query = db.query(ChatHistory.id, ChatHistory.user_id, ChatHistory.timestamp).filter(ChatHistory.id > last_id)
+        if end_id is not None:
+            query = query.filter(ChatHistory.id <= end_id)
+        batch = query.order_by(ChatHistory.id).limit(batch_size).all()
+        if not batch:
+            break
+        days = {}  # (user_id, day) -> [count, last activity]
+        for _, user_id, timestamp in batch:
+            at = parse_timestamp(timestamp)
+            if at is None or user_id is None:
+                skipped += 1
+                continue
+            entry = days.setdefault((user_id, at.date()), [0, at])
+            entry[0] += 1
+            entry[1] = max(entry[1], at)
+        count_messages(db, [(user_id, day, count, last) for (user_id, day), (count, last) in days.items()], table)
+        counted += len(batch)
+        last_id = batch[-1][0]
+        if end_id is not None:
+            db.commit()
+            print(f"... {counted} chats counted (id {last_id} of {end_id}), {time.perf_counter() - start:.1f}s")
+    return counted, skipped
+
+
+def backfill(batch_size: int = 50000):
+    Base.metadata.create_all(bind=engine, tables=[DailyMessageRollup.__table__])
+    rollup = DailyMessageRollup.__table__
+    staging = rollup.to_metadata(MetaData(), name=STAGING_TABLE)
+    staging.indexes.clear()  # index names are per schema; the staging table only needs its primary key
+    staging.drop(bind=engine, checkfirst=True)  # left over from an interrupted run
+    staging.create(bind=engine)
+    db = SessionLocal()
+    try:
+        end = db.query(func.max(ChatHistory.id)).scalar() or 0
+        counted, skipped = count_chats(db, 0, end, batch_size, staging)
+
+        # Swap in one transaction. Chats saved since `end` counted themselves
+        # into the rollup being replaced, so they are counted again here.
+        db.execute(delete(rollup))
+        db.execute(insert(rollup).from_select([c.name for c in staging.c], select(staging)))
+        caught_up, late_skipped = count_chats(db, end, None, batch_size)
+        db.commit()
+    finally:
+        db.close()
+        staging.drop(bind=engine, checkfirst=True)
+    print(f"✅ Rollup rebuilt from {counted + caught_up} chats "
+          f"({skipped + late_skipped} without a user or a readable timestamp).")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--batch-size", type=int, default=50000)
+    args = parser.parse_args()
+    backfill(args.batch_size)
+
+
+if __name__ == "__main__":
+    main()
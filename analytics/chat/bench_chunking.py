@@ -0,0 +1,73 @@
+# bench_chunking.py
+"""
+Chunking throughput and boundary quality: fixed 500-character slices vs. chunking.iter_chunks.
+
+Pages are extracted once up front, so the numbers cover chunking alone.
+"cut words" counts chunks that end in the middle of a word; "sentence ends"
+counts chunks that end on . ! or ?.
+
+    python bench_chunking.py ../../documents --repeat 20
+"""
+import argparse
+import os
+import time
+from docs_to_chunks import iter_pages
+from chunking import iter_chunks
+
+SUPPORTED = (".pdf", ".docx", ".txt")
+
+def fixed_slices(pages, size: int = 500):
+    # The slicing every ingestion path used before chunking.py
+    text = "\n".join(pages)
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+def quality(document: str, spans):
+    cut = sum(1 for start, end in spans
+              if end < len(document) and document[end - 1].isalnum() and document[end].isalnum())
+    sentences = sum(1 for start, end in spans if document[start:end].rstrip()[-1:] in ".!?")
+    return cut, sentences
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("directory", nargs="?", default=os.path.join("..", "..", "documents"))
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    documents = []
+    for name in sorted(os.listdir(args.directory)):
+        ext = os.path.splitext(name)[1].lower()
+        if ext in SUPPORTED and not name.startswith("~$"):
+            documents.append(list(iter_pages(os.path.join(args.directory, name), ext)))
+    size_mb = sum(len("\n".join(pages).encode("utf-8")) for pages in documents) / 1e6
+    print(f"{len(documents)} documents, {size_mb:.2f} MB of text, x{args.repeat}")
+
+    configs = [
+        ("fixed 500 chars", None),
+        ("500 chars, 0 overlap", dict(size=500, overlap=0, unit="chars")),
+        ("500 chars, 50 overlap", dict(size=500, overlap=50, unit="chars")),
+        ("128 tokens, 16 overlap", dict(size=128, overlap=16, unit="tokens")),
+    ]
+    for label, config in configs:
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            results = []
+            for pages in documents:
+                if config is None:
+                    chunks = fixed_slices(pages)
+                    offsets = range(0, len("\n".join(pages)), 500)
+                    results.append([(o, o + len(c)) for o, c in zip(offsets, chunks)])
+                else:
+                    results.append([(c.offset, c.offset + len(c.text)) for c in iter_chunks(pages, **config)])
+        elapsed = time.perf_counter() - start
+
+        count = sum(len(spans) for spans in results)
+        cut = sentences = 0
+        for pages, spans in zip(documents, results):
+            c, s = quality("\n".join(pages), spans)
+            cut += c
+            sentences += s
+        print(f"{label:<24} {size_mb * args.repeat / elapsed:7.1f} MB/s  {count} chunks  "
+              f"cut words {cut / count:5.1%}  sentence ends {sentences / count:5.1%}")
+
+if __name__ == "__main__":
+    main()
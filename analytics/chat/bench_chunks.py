@@ -0,0 +1,96 @@
+# bench_chunks.py
+"""
+Startup time and memory of the chunk store: pickled list vs. memory-mapped blob.
+
+Writes a synthetic corpus both ways, then starts --workers processes at once
+for each format (like uvicorn workers) that each load the chunks and serve
+--queries lookups of k random ids. Per worker it reports load time, RSS and,
+on Linux, PSS, which splits shared page-cache pages between the processes
+mapping them.
+
+    python bench_chunks.py --chunks 500000 --workers 4
+"""
+import argparse
+import multiprocessing
+import os
+import pickle
+import tempfile
+import time
+import numpy as np
+from chunk_store import ChunkFile, ChunkStore, write_chunks
+
+def memory_mb():
+    """(RSS, PSS) of this process in MB; PSS is None where /proc is unavailable."""
+    try:
+        with open("/proc/self/smaps_rollup", "r") as f:
+            fields = {line.split(":")[0]: int(line.split()[1]) for line in f if line.split()[-1] == "kB"}
+        return fields["Rss"] / 1024, fields["Pss"] / 1024
+    except (FileNotFoundError, KeyError):
+        from embedding_service import max_rss_mb
+        return max_rss_mb(), None
+
+def worker(kind, prefix, queries, k, barrier, results):
+    start = time.perf_counter()
+    if kind == "pickle":
+        with open(prefix + ".pkl", "rb") as f:
+            chunks = pickle.load(f)
+    else:
+        chunks = ChunkStore()
+        chunks.update([(0, ChunkFile(prefix))])
+    load_seconds = time.perf_counter() - start
+
+    ids = np.random.default_rng(os.getpid()).integers(0, len(chunks), (queries, k)).tolist()
+    start = time.perf_counter()
+    for query_ids in ids:
+        context = "\n".join(chunks[i] for i in query_ids)
+    lookup_us = (time.perf_counter() - start) / queries * 1e6
+
+    barrier.wait()  # measure while every worker is alive, so shared pages are split
+    rss, pss = memory_mb()
+    results.put((kind, load_seconds, lookup_us, rss, pss))
+    barrier.wait()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--chunks", type=int, default=500000)
+    parser.add_argument("--chunk-size", type=int, default=500)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--k", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    words = [f"word{i}" for i in range(5000)]
+    per_chunk = args.chunk_size // 8
+    chunks = [" ".join(rng.choice(words, per_chunk)) for _ in range(args.chunks)]
+
+    with tempfile.TemporaryDirectory() as workdir:
+        prefix = os.path.join(workdir, "seg")
+        with open(prefix + ".pkl", "wb") as f:
+            pickle.dump(chunks, f)
+        write_chunks(prefix, chunks)
+        del chunks
+        print(f"{args.chunks} chunks: pickle {os.path.getsize(prefix + '.pkl') / 1e6:.0f} MB, "
+              f"blob {(os.path.getsize(prefix + '.txt') + os.path.getsize(prefix + '.off.npy')) / 1e6:.0f} MB")
+
+        context = multiprocessing.get_context("spawn")
+        for kind in ("pickle", "mmap"):
+            barrier = context.Barrier(args.workers)
+            results = context.Queue()
+            processes = [context.Process(target=worker, args=(kind, prefix, args.queries, args.k, barrier, results))
+                         for _ in range(args.workers)]
+            for process in processes:
+                process.start()
+            rows = [results.get() for _ in processes]
+            for process in processes:
+                process.join()
+
+            load = np.mean([r[1] for r in rows])
+            lookup = np.mean([r[2] for r in rows])
+            rss = sum(r[3] for r in rows)
+            pss = sum(r[4] for r in rows) if rows[0][4] is not None else None
+            print(f"{kind:<7} load {load * 1000:8.1f} ms/worker, get {args.k} chunks {lookup:6.1f} us, "
+                  f"{args.workers} workers RSS {rss:7.0f} MB" + (f", PSS {pss:7.0f} MB" if pss is not None else ""))
+
+if __name__ == "__main__":
+    main()
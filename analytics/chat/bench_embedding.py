@@ -0,0 +1,44 @@
+# bench_embedding.py
+"""
+Cold start, resident memory and throughput of the embedding model.
+
+"before" loads one SentenceTransformer per importing module, as docs_to_chunks,
+web_scraper and gemini_flash each used to; "after" goes through the shared
+embedding_service. Run each mode in a fresh process:
+
+    python bench_embedding.py --mode before
+    python bench_embedding.py --mode after --batch-sizes 16 64 256
+"""
+import argparse
+import time
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--mode", choices=["before", "after"], default="after")
+    parser.add_argument("--texts", type=int, default=2000)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[32, 64, 128])
+    args = parser.parse_args()
+
+    import embedding_service
+
+    start = time.perf_counter()
+    if args.mode == "before":
+        from sentence_transformers import SentenceTransformer
+        models = [SentenceTransformer(embedding_service.EMBEDDING_MODEL) for _ in range(3)]
+        encode = lambda texts, batch_size: models[0].encode(texts, batch_size=batch_size, convert_to_numpy=True)
+    else:
+        embedding_service.get_model()
+        encode = lambda texts, batch_size: embedding_service.encode(texts, batch_size=batch_size)
+    cold_start = time.perf_counter() - start
+
+    print(f"mode={args.mode} cold start {cold_start:.2f}s, max RSS {embedding_service.max_rss_mb()} MB")
+
+    texts = [f"Sample sentence number {i} about document intelligence and retrieval." * 4 for i in range(args.texts)]
+    for batch_size in args.batch_sizes:
+        start = time.perf_counter()
+        encode(texts, batch_size)
+        elapsed = time.perf_counter() - start
+        print(f"batch_size={batch_size:<5} {args.texts / elapsed:>8.0f} texts/s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+# bench_extract.py
+"""
+Extraction + chunking throughput and peak memory, whole-text vs. streaming.
+
+"whole-text" is extract_text(), which joins a document into one string, then
+chunk_text() on it, one file after another; bench_hybrid.py still loads its
+corpus this way. "streaming" is what an upload job runs: extract_chunks_to_file()
+streams pages into a chunk file, one file per call, spread over --workers
+processes the way each file's job goes to one of the JOB_WORKERS workers.
+Embedding is left out so the numbers isolate extraction.
+
+    python bench_extract.py ../../documents --copies 8
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from docs_to_chunks import extract_text, extract_chunks_to_file
+from chunking import chunk_text
+from embedding_service import max_rss_mb
+
+SUPPORTED = (".pdf", ".docx", ".txt")
+
+def children_max_rss_mb():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    return resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+
+def collect(directory: str, copies: int, workdir: str):
+    files = []
+    for name in sorted(os.listdir(directory)):
+        ext = os.path.splitext(name)[1].lower()
+        if ext not in SUPPORTED or name.startswith("~$"):
+            continue
+        for i in range(copies):
+            path = os.path.join(workdir, f"{i}_{name}")
+            shutil.copy(os.path.join(directory, name), path)
+            files.append((path, ext))
+    return files
+
+def whole_text(files):
+    chunks = 0
+    for path, ext in files:
+        chunks += len(chunk_text(extract_text(path, ext)))
+    return chunks
+
+def streaming(files, workers: int):
+    chunks = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for chunk_path in pool.map(extract_chunks_to_file, *zip(*files)):
+            with open(chunk_path, "r", encoding="utf-8") as f:
+                chunks += sum(1 for _ in f)
+            os.remove(chunk_path)
+    return chunks
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("directory", nargs="?", default=os.path.join("..", "..", "documents"))
+    parser.add_argument("--copies", type=int, default=8, help="copies of each document, to simulate a batch upload")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        files = collect(args.directory, args.copies, workdir)
+        size_mb = sum(os.path.getsize(path) for path, _ in files) / 1e6
+        print(f"{len(files)} files, {size_mb:.1f} MB")
+
+        for label, run in (("whole-text", lambda: whole_text(files)),
+                           ("streaming", lambda: streaming(files, args.workers))):
+            tracemalloc.start()
+            start = time.perf_counter()
+            chunks = run()
+            elapsed = time.perf_counter() - start
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print(f"{label:<11} {chunks} chunks in {elapsed:.2f}s ({size_mb / elapsed:.1f} MB/s), "
+                  f"parent Python peak {peak / 1e6:.1f} MB")
+
+        print(f"max RSS: parent {max_rss_mb()} MB, worker processes {children_max_rss_mb()} MB")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+# bench_hybrid.py
+"""
+Retrieval quality and latency of dense, BM25 and hybrid (RRF) search.
+
+Indexes the documents into a throwaway store, optionally stamping a fraction
+of the chunks with error codes the way manuals do. Queries are generated
+from the chunks themselves, so each query's source chunk is the relevant
+answer: "code" queries ask about an error code, "term" queries about a
+chunk's rarest word, "passage" queries quote a dozen words from it.
+
+    python bench_hybrid.py ../../documents --queries 300 --k 3
+"""
+import argparse
+import os
+import tempfile
+import time
+import numpy as np
+from docs_to_chunks import extract_text
+from chunking import chunk_text
+from embedding_service import encode
+from faiss_index import IndexManager
+from lexical_index import fuse_rrf, tokenize
+from query_batcher import HYBRID_CANDIDATES
+from vector_store import VectorStore
+
+SUPPORTED = (".pdf", ".docx", ".txt")
+
+def load_chunks(directory: str, code_fraction: float, rng):
+    chunks = []
+    for name in sorted(os.listdir(directory)):
+        ext = os.path.splitext(name)[1].lower()
+        if ext in SUPPORTED and not name.startswith("~$"):
+            chunks.extend(chunk_text(extract_text(os.path.join(directory, name), ext)))
+    codes = {}
+    for i in rng.choice(len(chunks), int(len(chunks) * code_fraction), replace=False):
+        code = f"E-{rng.integers(1000, 10000)}"
+        codes[int(i)] = code
+        chunks[i] += f" Error code {code} is raised when this step fails."
+    return chunks, codes
+
+def make_queries(chunks, codes, n: int, rng):
+    df = {}
+    for chunk in chunks:
+        for term in set(tokenize(chunk)):
+            df[term] = df.get(term, 0) + 1
+    queries = []
+    for i in rng.choice(len(chunks), n, replace=len(chunks) < n):
+        i = int(i)
+        words = chunks[i].split()
+        kind = rng.choice(["code", "term", "passage"]) if i in codes else rng.choice(["term", "passage"])
+        if kind == "code":
+            queries.append(("code", f"What does error {codes[i]} mean?", i))
+        elif kind == "term":
+            terms = [t for t in set(tokenize(chunks[i])) if len(t) > 3]
+            if terms:
+                rarest = min(terms, key=lambda t: (df[t], t))
+                queries.append(("term", f"Tell me about {rarest}", i))
+        elif len(words) > 12:
+            start = int(rng.integers(0, len(words) - 12))
+            queries.append(("passage", " ".join(words[start:start + 12]), i))
+    return queries
+
+def evaluate(name, rankings, queries, latencies, k):
+    line = f"{name:<8}"
+    for kind in ("code", "term", "passage", "all"):
+        selected = [(r, q) for r, q in zip(rankings, queries) if kind in ("all", q[0])]
+        if not selected:
+            continue
+        recall = sum(q[2] in r[:k] for r, q in selected) / len(selected)
+        mrr = sum(1 / (r.index(q[2]) + 1) for r, q in selected if q[2] in r[:k]) / len(selected)
+        line += f"  {kind} R@{k} {recall:.3f} MRR {mrr:.3f}"
+    latencies = np.array(latencies) * 1000
+    print(line + f"  p50 {np.percentile(latencies, 50):.2f}ms p95 {np.percentile(latencies, 95):.2f}ms")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("directory", nargs="?", default=os.path.join("..", "..", "documents"))
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--candidates", type=int, default=HYBRID_CANDIDATES)
+    parser.add_argument("--codes", type=float, default=0.2, help="fraction of chunks stamped with an error code")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    chunks, codes = load_chunks(args.directory, args.codes, rng)
+    queries = make_queries(chunks, codes, args.queries, rng)
+    print(f"{len(chunks)} chunks, {len(queries)} queries")
+
+    with tempfile.TemporaryDirectory() as root:
+        store = VectorStore(root)
+        store.append("bench", chunks, encode(chunks))
+        manager = IndexManager(store)
+        index, _ = manager.get()
+        lexical = manager.lexical
+
+        results = {"dense": ([], []), "bm25": ([], []), "hybrid": ([], [])}
+        for _, question, _ in queries:
+            start = time.perf_counter()
+            _, ids = index.search(encode([question]), args.candidates)
+            dense_ids = ids[0].tolist()
+            dense_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            lexical_ids, _ = lexical.search(question, args.candidates)
+            lexical_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            fused = [i for i, _ in fuse_rrf(dense_ids, lexical_ids)]
+            fusion_time = time.perf_counter() - start
+
+            for name, ranking, seconds in (("dense", dense_ids, dense_time),
+                                           ("bm25", lexical_ids, lexical_time),
+                                           ("hybrid", fused, dense_time + lexical_time + fusion_time)):
+                results[name][0].append(ranking)
+                results[name][1].append(seconds)
+
+        for name, (rankings, latencies) in results.items():
+            evaluate(name, rankings, queries, latencies, args.k)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+# bench_index.py
+"""
+Recall / latency / memory benchmark for the index types in faiss_index.build_index.
+
+Builds every configuration on the same synthetic corpus (clustered, unit-norm
+vectors shaped like MiniLM embeddings) and compares it to an exact flat search.
+
+    python bench_index.py --vectors 1000000 --queries 1000 --k 10
+"""
+import argparse
+import time
+import numpy as np
+import faiss
+from faiss_index import build_index, apply_search_params
+
+def synthetic_corpus(n: int, dim: int, clusters: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype("float32")
+    vectors = centers[rng.integers(0, clusters, n)] + 0.5 * rng.standard_normal((n, dim)).astype("float32")
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+def recall_at_k(found, truth, k: int) -> float:
+    hits = sum(len(set(f[:k]) & set(t[:k])) for f, t in zip(found, truth))
+    return hits / (len(truth) * k)
+
+def build(index_type, corpus):
+    start = time.perf_counter()
+    index = build_index(corpus.shape[1], len(corpus), index_type)
+    if not index.is_trained:
+        sample = corpus[np.random.default_rng(1).choice(len(corpus), min(len(corpus), 100000), replace=False)]
+        index.train(sample)
+    index.add_with_ids(corpus, np.arange(len(corpus), dtype="int64"))
+    return index, time.perf_counter() - start
+
+def measure(name, index, build_time, queries, truth, k):
+    memory_mb = faiss.serialize_index(index).nbytes / 1e6
+
+    # One query at a time, as /ask issues them
+    latencies = []
+    found = []
+    for query in queries:
+        start = time.perf_counter()
+        _, ids = index.search(query[None, :], k)
+        latencies.append(time.perf_counter() - start)
+        found.append(ids[0])
+    latencies = np.array(latencies) * 1000
+
+    print(f"{name:<28} {recall_at_k(found, truth, k):>8.3f} {np.percentile(latencies, 50):>9.3f} "
+          f"{np.percentile(latencies, 99):>9.3f} {memory_mb:>10.1f} {build_time:>9.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--vectors", type=int, default=200000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--clusters", type=int, default=1000)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    corpus = synthetic_corpus(args.vectors + args.queries, args.dim, args.clusters)
+    corpus, queries = corpus[:args.vectors], corpus[args.vectors:]
+
+    exact = faiss.IndexFlatL2(args.dim)
+    exact.add(corpus)
+    _, truth = exact.search(queries, args.k)
+
+    print(f"{args.vectors} vectors, dim {args.dim}, {args.queries} queries, recall@{args.k}")
+    print(f"{'config':<28} {'recall':>8} {'p50 ms':>9} {'p99 ms':>9} {'index MB':>10} {'build s':>9}")
+    sweeps = {
+        "flat": [{}],
+        "ivf": [{"nprobe": n} for n in (4, 16, 64)],
+        "hnsw": [{"ef_search": ef} for ef in (16, 64, 256)],
+        "ivfpq": [{"nprobe": n} for n in (16, 64)],
+    }
+    for index_type, settings in sweeps.items():
+        index, build_time = build(index_type, corpus)
+        for params in settings:
+            apply_search_params(index, **params)
+            label = " ".join([index_type] + [f"{key}={value}" for key, value in params.items()])
+            measure(label, index, build_time, queries, truth, args.k)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+# bench_load.py
+"""
+Concurrent load test for the chat service: latency percentiles under N parallel clients.
+
+Start the service with the offline LLM so the numbers measure the service, not Gemini:
+
+    LLM_BACKEND=fake uvicorn main:app --port 8001
+    python bench_load.py --concurrency 32 --requests 1000
+
+Passing --upload-every N mixes a plain-text upload in every N requests, to
+check that ingestion no longer stalls /ask on the same worker.
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import requests
+
+BASE_URL = "http://localhost:8001"
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--url", default=BASE_URL)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--upload-every", type=int, default=0)
+    args = parser.parse_args()
+
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_maxsize=args.concurrency)
+    session.mount("http://", adapter)
+
+    def one_request(i):
+        start = time.perf_counter()
+        if args.upload_every and i % args.upload_every == 0:
+            response = session.post(f"{args.url}/upload_all", data={
+                "plain_text": f"Load test document {i}. " * 200, "user_id": 1, "username": "loadtest"})
+            kind = "upload"
+        else:
+            response = session.post(f"{args.url}/ask", json={
+                "question": f"What does the manual say about topic {i % 50}?", "user_id": i % 100,
+                "username": "loadtest"})
+            kind = "ask"
+        return kind, response.status_code, time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(one_request, range(args.requests)))
+    elapsed = time.perf_counter() - start
+
+    print(f"{args.requests} requests, concurrency {args.concurrency}, {args.requests / elapsed:.1f} req/s")
+    for kind in ("ask", "upload"):
+        latencies = np.array([r[2] for r in results if r[0] == kind]) * 1000
+        if not len(latencies):
+            continue
+        errors = sum(1 for r in results if r[0] == kind and r[1] != 200)
+        print(f"{kind:<7} n={len(latencies):<6} errors={errors:<4} p50={np.percentile(latencies, 50):.1f}ms "
+              f"p95={np.percentile(latencies, 95):.1f}ms p99={np.percentile(latencies, 99):.1f}ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+# bench_timestamps.py
+"""
+Query plans and latency of the per-user chat_history/documents queries before and after migrate_timestamps.py.
+
+Builds the old schema (string timestamps in both formats writers used, no
+index but the primary key) with generated rows, runs each query for random
+users and prints its plan and latency, migrates, and runs them again.
+Uses a throwaway SQLite file unless --url points at a scratch database.
+
+    python bench_timestamps.py --rows 500000 --users 2000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+import numpy as np
+from sqlalchemy import create_engine, MetaData, Table, Column, Integer, String, Text, text
+from migrate_timestamps import migrate
+
+QUERIES = {
+    # user_summary: last activity
+    "latest chat": "SELECT timestamp FROM chat_history WHERE user_id = :user_id ORDER BY timestamp DESC LIMIT 1",
+    # total_messages
+    "count chats": "SELECT COUNT(id) FROM chat_history WHERE user_id = :user_id",
+    "chats since": "SELECT COUNT(id) FROM chat_history WHERE user_id = :user_id AND timestamp >= :since",
+    "latest document": "SELECT timestamp FROM documents WHERE user_id = :user_id ORDER BY timestamp DESC LIMIT 1",
+}
+
+
+def create_old_schema(engine, rows: int, users: int, rng):
+    metadata = MetaData()
+    tables = [
+        Table("chat_history", metadata, Column("id", Integer, primary_key=True), Column("user_id", Integer),
+              Column("username", String(50)), Column("message", Text), Column("timestamp", String(255))),
+        Table("documents", metadata, Column("id", Integer, primary_key=True), Column("user_id", Integer),
+              Column("username", String(50)), Column("doc_type", String(50)), Column("content", Text),
+              Column("timestamp", String(255))),
+    ]
+    metadata.create_all(engine)
+    start = datetime.utcnow() - timedelta(days=365)
+    for table, n in zip(tables, (rows, rows // 10)):
+        batch = []
+        for i in range(n):
+            user_id = rng.randint(1, users)
+            at = start + timedelta(seconds=rng.randint(0, 365 * 86400), microseconds=rng.randint(0, 999999))
+            # main.py wrote str(datetime); chat_history.py wrote strftime
+            stamp = str(at) if i % 2 else at.strftime("%Y-%m-%d %H:%M:%S")
+            row = {"user_id": user_id, "username": f"user{user_id}", "timestamp": stamp}
+            row.update({"message": "User: hi\nAssistant: hello"} if table.name == "chat_history"
+                       else {"doc_type": "text", "content": "some text"})
+            batch.append(row)
+            if len(batch) == 10000:
+                with engine.begin() as connection:
+                    connection.execute(table.insert(), batch)
+                batch = []
+        if batch:
+            with engine.begin() as connection:
+                connection.execute(table.insert(), batch)
+
+
+def plan(connection, dialect: str, query: str, params: dict) -> str:
+    if dialect == "sqlite":
+        rows = connection.execute(text("EXPLAIN QUERY PLAN " + query), params).all()
+        return "; ".join(row[-1] for row in rows)
+    rows = connection.execute(text("EXPLAIN " + query), params).all()
+    return "; ".join(" ".join(str(v) for v in row if v is not None) for row in rows)
+
+
+def run_queries(engine, users: int, samples: int, rng):
+    since = datetime.utcnow() - timedelta(days=30)
+    with engine.connect() as connection:
+        for name, query in QUERIES.items():
+            params = {"user_id": 1, "since": since}
+            print(f"  {name:<16} plan: {plan(connection, engine.dialect.name, query, params)}")
+            latencies = []
+            for _ in range(samples):
+                params = {"user_id": rng.randint(1, users), "since": since}
+                start = time.perf_counter()
+                connection.execute(text(query), params).all()
+                latencies.append(time.perf_counter() - start)
+            latencies = np.array(latencies) * 1000
+            print(f"  {'':<16} p50 {np.percentile(latencies, 50):.2f}ms p95 {np.percentile(latencies, 95):.2f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=500000, help="chat_history rows; documents get a tenth")
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--samples", type=int, default=200)
+    parser.add_argument("--url", default=None, help="scratch database URL (default: temporary SQLite file)")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_engine(args.url or f"sqlite:///{os.path.join(directory, 'bench.db')}")
+        start = time.perf_counter()
+        create_old_schema(engine, args.rows, args.users, rng)
+        print(f"{args.rows} chats, {args.rows // 10} documents, {args.users} users "
+              f"generated in {time.perf_counter() - start:.1f}s")
+
+        print("before (string timestamps, no index):")
+        run_queries(engine, args.users, args.samples, rng)
+
+        start = time.perf_counter()
+        migrate(engine, batch_size=50000)
+        print(f"migrated in {time.perf_counter() - start:.1f}s")
+
+        print("after (DATETIME, index on (user_id, timestamp)):")
+        run_queries(engine, args.users, args.samples, rng)
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,19 @@
 from datetime import datetime
 from sqlalchemy.orm import Session
 from models import ChatHistory, Document
+from rollups import count_message
 
 def store_chat_history(db: Session, user_id: int, username: str, message: str) -> str:
     """Store the user's chat message."""
+    now = datetime.utcnow()
     chat_entry = ChatHistory(
         user_id=user_id,
         username=username,
         message=message,
-        timestamp=datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+        timestamp=now
     )
     db.add(chat_entry)
+    count_message(db, user_id, now)
     db.commit()
     db.refresh(chat_entry)
     return f"Chat message stored for user {username}"
@@ -22,7 +25,7 @@ def store_document(db: Session, user_id: int, username: str, doc_type: str, cont
         username=username,
         doc_type=doc_type,
         content=content,
-        timestamp=datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+        timestamp=datetime.utcnow()
     )
     db.add(document_entry)
     db.commit()
@@ -0,0 +1,182 @@
+# chunk_store.py
+import os
+import mmap
+import bisect
+import numpy as np
+
+BLOB_EXT = ".txt"
+OFFSETS_EXT = ".off.npy"
+POSITIONS_EXT = ".pos.npy"
+
+
+def write_chunks(prefix: str, chunks, positions=None):
+    """
+    Write chunks as one UTF-8 blob (prefix.txt) plus n+1 byte offsets (prefix.off.npy),
+    and their (page, offset) positions in the source document if known (prefix.pos.npy;
+    -1 marks a chunk whose position wasn't recorded).
+    """
+    offsets = [0]
+    with open(prefix + BLOB_EXT, "wb") as f:
+        for chunk in chunks:
+            data = chunk.encode("utf-8")
+            f.write(data)
+            offsets.append(offsets[-1] + len(data))
+    np.save(prefix + OFFSETS_EXT, np.asarray(offsets, dtype="int64"))
+    if positions is not None:
+        np.save(prefix + POSITIONS_EXT, np.asarray(positions, dtype="int64").reshape(-1, 2))
+    return len(offsets) - 1
+
+
+class ChunkFile:
+    """
+    Read-only view of one segment's chunks.
+
+    Offsets and positions are small and read into memory. The blob and the
+    segment's embeddings (for reranking the chunks it returns) are
+    memory-mapped on first read, so only segments that are actually queried
+    hold a mapping and its file descriptor, and only the pages of chunks that
+    are read get loaded. Every process mapping the same segment shares those
+    pages through the OS page cache.
+    """
+
+    def __init__(self, prefix: str, embeddings_path: str = None, source: str = None):
+        self.prefix = prefix
+        self.source = source
+        self.embeddings_path = embeddings_path
+        self.offsets = np.load(prefix + OFFSETS_EXT)
+        positions_path = prefix + POSITIONS_EXT
+        self.positions = np.load(positions_path) if os.path.exists(positions_path) else None
+        self._blob = None
+        self._embeddings = None
+
+    @property
+    def blob(self):
+        if self._blob is None:
+            with open(self.prefix + BLOB_EXT, "rb") as f:
+                # mmap refuses empty files; a segment of empty chunks needs no mapping
+                self._blob = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if self.offsets[-1] else b""
+        return self._blob
+
+    @property
+    def embeddings(self):
+        if self._embeddings is None and self.embeddings_path:
+            self._embeddings = np.load(self.embeddings_path, mmap_mode="r")
+        return self._embeddings
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> str:
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return self.blob[int(self.offsets[i]):int(self.offsets[i + 1])].decode("utf-8")
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def vector(self, i: int) -> np.ndarray:
+        return np.asarray(self.embeddings[i], dtype="float32")
+
+    def position(self, i: int):
+        """(page, offset) of chunk i in its document; (None, None) if not recorded."""
+        if self.positions is None or self.positions[i][0] < 0:
+            return None, None
+        return tuple(self.positions[i].tolist())
+
+    def range(self, base: int, count: int, source: str = None):
+        """The chunks [base, base + count) of this file, as one document of a compacted segment."""
+        return ChunkRange(self, base, count, source)
+
+
+class ChunkRange:
+    """A document's contiguous run of chunks inside a shared ChunkFile."""
+
+    __slots__ = ("chunk_file", "base", "count", "source")
+
+    def __init__(self, chunk_file: ChunkFile, base: int, count: int, source: str = None):
+        self.chunk_file = chunk_file
+        self.base = base
+        self.count = count
+        self.source = source
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i: int) -> str:
+        if not 0 <= i < self.count:
+            raise IndexError(i)
+        return self.chunk_file[self.base + i]
+
+    def vector(self, i: int) -> np.ndarray:
+        return self.chunk_file.vector(self.base + i)
+
+    def position(self, i: int):
+        return self.chunk_file.position(self.base + i)
+
+
+class ChunkStore:
+    """
+    Maps global chunk ids to text across the live segments, without loading any.
+
+    Supports `id in store` and `store[id]`, like the dict it replaces. Each
+    segment, or each document of a compacted segment, covers the contiguous
+    id range [start_id, start_id + count), so a lookup is a bisect over start
+    ids. Updates swap in a new segment
+    list, so readers on other threads always see a consistent one.
+    """
+
+    def __init__(self):
+        # (start ids, [(start_id, count, ChunkFile or ChunkRange)]) sorted by start_id, replaced as one object
+        self._view = ([], [])
+
+    def update(self, added=(), removed=()):
+        """Add (start_id, ChunkFile or ChunkRange) pairs and drop the entries starting at the removed ids."""
+        removed = set(removed)
+        segments = [s for s in self._view[1] if s[0] not in removed]
+        segments += [(start_id, len(chunk_file), chunk_file) for start_id, chunk_file in added]
+        segments.sort(key=lambda s: s[0])
+        self._view = ([s[0] for s in segments], segments)
+
+    def _locate(self, chunk_id: int):
+        starts, segments = self._view
+        pos = bisect.bisect_right(starts, chunk_id) - 1
+        if pos < 0 or pos >= len(segments):
+            return None
+        start_id, count, chunk_file = segments[pos]
+        if chunk_id >= start_id + count:
+            return None
+        return chunk_file, chunk_id - start_id
+
+    def __contains__(self, chunk_id) -> bool:
+        return self._locate(int(chunk_id)) is not None
+
+    def __getitem__(self, chunk_id) -> str:
+        found = self._locate(int(chunk_id))
+        if found is None:
+            raise KeyError(chunk_id)
+        chunk_file, offset = found
+        return chunk_file[offset]
+
+    def vector(self, chunk_id) -> np.ndarray:
+        """Stored embedding of a chunk, read from its segment's memory-mapped .npy."""
+        found = self._locate(int(chunk_id))
+        if found is None:
+            raise KeyError(chunk_id)
+        chunk_file, offset = found
+        return chunk_file.vector(offset)
+
+    def metadata(self, chunk_id) -> dict:
+        """Source document, page and character offset of a chunk; page and offset are None if not recorded."""
+        found = self._locate(int(chunk_id))
+        if found is None:
+            raise KeyError(chunk_id)
+        chunk_file, offset = found
+        page, position = chunk_file.position(offset)
+        return {"source": chunk_file.source, "page": page, "offset": position}
+
+    def get_many(self, chunk_ids) -> list:
+        """Text of the given ids, skipping any that are no longer live."""
+        return [self[i] for i in chunk_ids if i in self]
+
+    def __len__(self):
+        return sum(s[1] for s in self._view[1])
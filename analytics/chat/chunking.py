@@ -0,0 +1,141 @@
+# chunking.py
+"""
+Boundary-aware chunking shared by every ingestion path.
+
+A chunk is cut at the last paragraph break that fits, else the last sentence
+end, else the last whitespace; only a single run longer than the chunk size
+is cut mid-word. Consecutive chunks overlap by roughly CHUNK_OVERLAP, with
+the overlap also starting on a sentence or word boundary.
+"""
+import os
+from collections import namedtuple
+import numpy as np
+
+CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "500"))
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "50"))
+# "chars", or "tokens" counted like conversation_memory.count_tokens (~4 characters each)
+CHUNK_UNIT = os.getenv("CHUNK_UNIT", "chars")
+CHARS_PER_TOKEN = 4
+
+# Character classes by code point; anything past the table is none of them
+SPACE, SENTENCE_END, CLOSER = 1, 2, 4
+CHAR_CLASSES = np.zeros(0x3004, dtype="uint8")
+for chars, char_class in ((" \t\n\r\x0b\x0c\x85\xa0\u2028\u2029\u3000", SPACE), (".!?।。", SENTENCE_END),
+                          ("\"')]\u201d\u2019", CLOSER)):
+    CHAR_CLASSES[[ord(c) for c in chars]] = char_class
+
+Chunk = namedtuple("Chunk", ["text", "source", "page", "offset"])
+
+
+def _chars(n: int, unit: str) -> int:
+    if unit == "tokens":
+        return n * CHARS_PER_TOKEN
+    if unit == "chars":
+        return n
+    raise ValueError(f"Unknown chunk unit: {unit}")
+
+def _boundaries(text: str):
+    """
+    Positions right after each paragraph break, sentence end and word break,
+    as sorted arrays. Every break is the end of a whitespace run, so all three
+    come from one pass of array operations over the text's code points.
+    """
+    codes = np.frombuffer(text.encode("utf-32-le"), dtype="<u4")
+    classes = CHAR_CLASSES[np.minimum(codes, len(CHAR_CLASSES) - 1)]
+    edges = np.diff((classes == SPACE).view("int8"), prepend=0, append=0)
+    run_starts, run_ends = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+
+    # Two or more newlines in a run of whitespace separate paragraphs
+    newlines = np.concatenate(([0], np.cumsum(codes == 10)))
+    paragraphs = run_ends[newlines[run_ends] - newlines[run_starts] >= 2]
+
+    # A run that follows . ! ? (possibly closed by one quote or bracket) ends a sentence
+    # np.where evaluates both sides, so the indices are clipped before the mask is applied
+    before = np.where(run_starts >= 1, classes[np.maximum(run_starts - 1, 0)], 0)
+    two_before = np.where(run_starts >= 2, classes[np.maximum(run_starts - 2, 0)], 0)
+    ends_sentence = (before == SENTENCE_END) | ((before == CLOSER) & (two_before == SENTENCE_END))
+    return paragraphs, run_ends[ends_sentence], run_ends
+
+def _last_within(ends, low: int, high: int):
+    i = np.searchsorted(ends, high, side="right") - 1
+    return int(ends[i]) if i >= 0 and ends[i] > low else None
+
+def _first_within(ends, low: int, high: int):
+    i = np.searchsorted(ends, low, side="left")
+    return int(ends[i]) if i < len(ends) and ends[i] < high else None
+
+def _split(text: str, start: int, size: int, overlap: int, final: bool):
+    """
+    Return the (start, end) spans of the chunks in text from start on, and
+    where the next chunk starts. Unless final, stops while no more than a full
+    chunk of text is left, since the next page may extend it.
+    """
+    paragraphs, sentences, words = _boundaries(text)
+    spans = []
+    while len(text) - start > size or (final and start < len(text)):
+        limit = start + size
+        if limit >= len(text):
+            spans.append((start, len(text)))
+            return spans, len(text)
+        # Don't settle for a paragraph or sentence break that leaves the chunk less than half full
+        floor = start + size // 2
+        end = (_last_within(paragraphs, floor, limit) or _last_within(sentences, floor, limit)
+               or _last_within(words, start, limit) or limit)
+        spans.append((start, end))
+        next_start = end
+        if overlap:
+            target = max(end - overlap, start + 1)
+            next_start = _first_within(sentences, target, end) or _first_within(words, target, end) or end
+        start = next_start
+    return spans, start
+
+def _page_of(page_starts, offset: int):
+    for page_offset, number in reversed(page_starts):
+        if page_offset <= offset:
+            return number
+    return page_starts[0][1]
+
+def iter_chunks(pages, source: str = None, size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP,
+                unit: str = CHUNK_UNIT):
+    """
+    Stream Chunks from an iterable of page texts, joined by newlines.
+
+    Only the current page and the unfinished tail of the previous one are held
+    in memory. Each chunk records its source, the 1-based page it starts on
+    and its character offset in the joined document.
+    """
+    size, overlap = _chars(size, unit), _chars(overlap, unit)
+    if not 0 <= overlap < size:
+        raise ValueError("chunk overlap must be smaller than the chunk size")
+
+    buffer, buffer_offset, cursor = "", 0, 0
+    page_starts = []  # (document offset, page number) of the pages still in the buffer
+    pages = iter(pages)
+    page = next(pages, None)
+    number = 0
+    while page is not None:
+        number += 1
+        if number > 1:
+            buffer += "\n"
+        page_starts.append((buffer_offset + len(buffer), number))
+        buffer += page
+        page = next(pages, None)
+
+        spans, cursor = _split(buffer, cursor, size, overlap, final=page is None)
+        for start, end in spans:
+            text = buffer[start:end]
+            stripped = text.lstrip()
+            offset = buffer_offset + start + len(text) - len(stripped)
+            stripped = stripped.rstrip()
+            if stripped:
+                yield Chunk(stripped, source, _page_of(page_starts, offset), offset)
+
+        # Keep only the unfinished tail, and the pages it still covers
+        buffer_offset += cursor
+        buffer, cursor = buffer[cursor:], 0
+        page_starts = [p for p, following in zip(page_starts, page_starts[1:] + [(float("inf"), None)])
+                       if following[0] > buffer_offset]
+
+def chunk_text(text: str, size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP, unit: str = CHUNK_UNIT) -> list:
+    """Chunk texts of a single in-memory document."""
+    return [chunk.text for chunk in iter_chunks([text], size=size, overlap=overlap, unit=unit)]
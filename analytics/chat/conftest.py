@@ -0,0 +1,16 @@
+# conftest.py
+"""
+Points VECTOR_DB_DIR at a temp dir before any test imports the chat modules,
+so the job queue, caches and segments they create never land in vector_db/.
+"""
+import os
+import shutil
+import tempfile
+
+VECTOR_DB_DIR = tempfile.mkdtemp(prefix="vector_db-")
+os.environ["VECTOR_DB_DIR"] = VECTOR_DB_DIR
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+
+def pytest_unconfigure(config):
+    shutil.rmtree(VECTOR_DB_DIR, ignore_errors=True)
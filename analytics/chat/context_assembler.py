@@ -0,0 +1,126 @@
+# context_assembler.py
+import os
+import threading
+import numpy as np
+from conversation_memory import count_tokens
+
+# Tokens for the whole prompt: retrieved context, conversation history and the question
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "2000"))
+# Share of what's left after the question that history may take; context gets the rest
+HISTORY_BUDGET_SHARE = float(os.getenv("HISTORY_BUDGET_SHARE", "0.4"))
+MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", "0.7"))  # 1 = relevance only, 0 = diversity only
+# Candidates this similar (cosine) to one already picked are dropped as duplicates
+MMR_DUPLICATE_THRESHOLD = float(os.getenv("MMR_DUPLICATE_THRESHOLD", "0.92"))
+PROMPT_OVERHEAD_TOKENS = 20  # instructions and labels in build_prompt's template
+
+
+def mmr_order(relevance, vectors, lambda_: float = MMR_LAMBDA, duplicate_threshold: float = MMR_DUPLICATE_THRESHOLD):
+    """
+    Order candidates by maximal marginal relevance, leaving out near-duplicates.
+
+    relevance is any score where higher is better; it is scaled to [0, 1] so
+    it weighs against cosine similarity. All pairwise similarities come from
+    one matrix product, and each pick updates every candidate's max
+    similarity to the picks so far in one vectorized step.
+    """
+    relevance = np.asarray(relevance, dtype="float32")
+    n = len(relevance)
+    if n == 0:
+        return [], 0
+    spread = relevance.max() - relevance.min()
+    relevance = (relevance - relevance.min()) / spread if spread else np.ones(n, dtype="float32")
+
+    unit = np.asarray(vectors, dtype="float32")
+    unit = unit / np.maximum(np.linalg.norm(unit, axis=1, keepdims=True), 1e-12)
+    similarity = unit @ unit.T
+
+    order, duplicates = [], 0
+    closest = np.zeros(n, dtype="float32")  # max similarity to anything picked so far
+    remaining = np.ones(n, dtype=bool)
+    while remaining.any():
+        scores = np.where(remaining, lambda_ * relevance - (1 - lambda_) * closest, -np.inf)
+        best = int(np.argmax(scores))
+        remaining[best] = False
+        if order and closest[best] >= duplicate_threshold:
+            duplicates += 1
+            continue
+        order.append(best)
+        closest = np.maximum(closest, similarity[best])
+    return order, duplicates
+
+
+class ContextAssembler:
+    """
+    Turns retrieved candidates and conversation history into prompt inputs that
+    fit one token budget.
+
+    The question is always kept. History keeps its newest turns within its
+    share of the budget; context fills the rest with candidates in MMR order,
+    skipping near-duplicates and any chunk that no longer fits.
+    """
+
+    def __init__(self, token_budget: int = PROMPT_TOKEN_BUDGET, history_share: float = HISTORY_BUDGET_SHARE):
+        self.token_budget = token_budget
+        self.history_share = history_share
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.candidates = 0
+        self.packed = 0
+        self.duplicates = 0
+        self.candidate_tokens = 0
+        self.context_tokens = 0
+
+    def _fit_history(self, history: list, budget: int):
+        kept, used = [], 0
+        for turn in reversed(history or []):
+            tokens = count_tokens(turn["user"]) + count_tokens(turn["assistant"])
+            if used + tokens > budget:
+                break
+            kept.append(turn)
+            used += tokens
+        kept.reverse()
+        return kept, used
+
+    def assemble(self, question: str, candidates: list, history: list = None):
+        """
+        candidates are (score, text, vector) tuples, best first.
+        Returns (context chunks, history turns) for build_prompt.
+        """
+        remaining = self.token_budget - PROMPT_OVERHEAD_TOKENS - count_tokens(question)
+        history, history_tokens = self._fit_history(history, int(max(remaining, 0) * self.history_share))
+        remaining -= history_tokens
+
+        order, duplicates = mmr_order([c[0] for c in candidates], [c[2] for c in candidates]) \
+            if candidates else ([], 0)
+        context, context_tokens = [], 0
+        for i in order:
+            tokens = count_tokens(candidates[i][1])
+            if context_tokens + tokens > remaining:
+                continue  # a shorter chunk further down may still fit
+            context.append(candidates[i][1])
+            context_tokens += tokens
+
+        with self._lock:
+            self.requests += 1
+            self.candidates += len(candidates)
+            self.packed += len(context)
+            self.duplicates += duplicates
+            self.candidate_tokens += sum(count_tokens(c[1]) for c in candidates)
+            self.context_tokens += context_tokens
+        return context, history
+
+    def stats(self) -> dict:
+        if not self.requests:
+            return {"requests": 0, "token_budget": self.token_budget}
+        return {
+            "requests": self.requests,
+            "token_budget": self.token_budget,
+            "mean_candidates": round(self.candidates / self.requests, 2),
+            "mean_packed": round(self.packed / self.requests, 2),
+            "duplicates_dropped": self.duplicates,
+            "mean_candidate_tokens": round(self.candidate_tokens / self.requests, 1),
+            "mean_context_tokens": round(self.context_tokens / self.requests, 1),
+        }
+
+
+context_assembler = ContextAssembler()
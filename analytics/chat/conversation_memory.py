@@ -0,0 +1,74 @@
+# conversation_memory.py
+import os
+import threading
+from collections import OrderedDict, deque
+
+MEMORY_TOKEN_BUDGET = int(os.getenv("CHAT_MEMORY_TOKEN_BUDGET", "1500"))
+MEMORY_MAX_USERS = int(os.getenv("CHAT_MEMORY_MAX_USERS", "10000"))
+
+def count_tokens(text: str) -> int:
+    # ~4 characters per token for English; cheap and close enough for budgeting
+    return len(text) // 4 + 1
+
+
+class ConversationMemory:
+    """
+    Per-user chat memory that keeps only the most recent turns within a token budget.
+
+    Each user has a deque of (turn, tokens) and a running token total, so an
+    append drops the oldest turns in amortised O(1) instead of re-counting the
+    whole history. The newest turn is always kept, even if it alone exceeds the
+    budget. Users are held in LRU order and the least recently active one is
+    forgotten once max_users is reached.
+    """
+
+    def __init__(self, token_budget: int = MEMORY_TOKEN_BUDGET, max_users: int = MEMORY_MAX_USERS):
+        self.token_budget = token_budget
+        self.max_users = max_users
+        self._turns = OrderedDict()  # user_id -> deque of (turn, tokens)
+        self._tokens = {}
+        self._lock = threading.Lock()
+
+    def append(self, user_id: int, question: str, answer: str):
+        turn = {"user": question, "assistant": answer}
+        tokens = count_tokens(question) + count_tokens(answer)
+        with self._lock:
+            turns = self._turns.get(user_id)
+            if turns is None:
+                turns = self._turns[user_id] = deque()
+                self._tokens[user_id] = 0
+                if len(self._turns) > self.max_users:
+                    evicted, _ = self._turns.popitem(last=False)
+                    del self._tokens[evicted]
+            else:
+                self._turns.move_to_end(user_id)
+
+            turns.append((turn, tokens))
+            self._tokens[user_id] += tokens
+            while self._tokens[user_id] > self.token_budget and len(turns) > 1:
+                _, dropped = turns.popleft()
+                self._tokens[user_id] -= dropped
+
+    def history(self, user_id: int) -> list:
+        with self._lock:
+            return [turn for turn, _ in self._turns.get(user_id, ())]
+
+    def clear(self, user_id: int = None):
+        """Forget one user's conversation, or everyone's when user_id is None."""
+        with self._lock:
+            if user_id is None:
+                self._turns.clear()
+                self._tokens.clear()
+            else:
+                self._turns.pop(user_id, None)
+                self._tokens.pop(user_id, None)
+
+    def stats(self) -> dict:
+        return {
+            "users": len(self._turns),
+            "tokens": sum(self._tokens.values()),
+            "token_budget": self.token_budget,
+        }
+
+
+conversation_memory = ConversationMemory()
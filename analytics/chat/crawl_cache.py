@@ -0,0 +1,59 @@
+# crawl_cache.py
+import os
+import json
+import time
+import sqlite3
+import threading
+from vector_store import VECTOR_DB_DIR
+
+CACHE_FILE = "crawl_cache.sqlite"
+CACHE_PATH = os.path.join(VECTOR_DB_DIR, CACHE_FILE)
+
+
+class CrawlCache:
+    """
+    Per-URL validators (ETag, Last-Modified), content hash and outgoing links
+    from the last crawl, so a re-crawl can send conditional requests and
+    still follow the links of pages that came back 304 or unchanged.
+    """
+
+    def __init__(self, path: str = CACHE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connection(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS pages ("
+                "url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, content_hash TEXT, "
+                "links TEXT, fetched_at REAL)"
+            )
+        return self._conn
+
+    def get(self, url: str):
+        with self._lock:
+            row = self._connection().execute(
+                "SELECT etag, last_modified, content_hash, links FROM pages WHERE url = ?", (url,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {"etag": row[0], "last_modified": row[1], "content_hash": row[2], "links": json.loads(row[3])}
+
+    def put_many(self, pages: list):
+        """Record the validators of crawled pages; call only once their chunks are stored."""
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            conn.executemany(
+                "INSERT OR REPLACE INTO pages (url, etag, last_modified, content_hash, links, fetched_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(p["url"], p["etag"], p["last_modified"], p["content_hash"], json.dumps(p["links"]), now)
+                 for p in pages],
+            )
+            conn.commit()
+
+
+crawl_cache = CrawlCache()
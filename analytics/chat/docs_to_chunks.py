@@ -1,22 +1,51 @@
 # docs_to_chunks.py
 import os
+import json
+import hashlib
 import tempfile
-import numpy as np
-import pickle
-from typing import List
-from sentence_transformers import SentenceTransformer
+from itertools import islice
 from fastapi import UploadFile
 import fitz  # PyMuPDF
 from docx import Document
+from vector_store import vector_store, VectorStore
+from embedding_service import encode_cached
+from chunking import iter_chunks
 
-VECTOR_DB_DIR = "vector_db"
-CHUNK_SIZE = 500
-os.makedirs(VECTOR_DB_DIR, exist_ok=True)
+# Chunks embedded and stored per step; bounds ingestion memory whatever the document size
+EMBED_WINDOW = int(os.getenv("EMBED_WINDOW", "256"))
+DOCX_PARAGRAPHS_PER_PAGE = 50
+TXT_BLOCK_SIZE = 64 * 1024
+UPLOAD_READ_SIZE = 1024 * 1024
 
-embedder = SentenceTransformer("all-MiniLM-L6-v2")
+def iter_pages(file_path, ext):
+    """Yield a document's text a page (PDF) or a block of paragraphs / lines (DOCX / TXT) at a time."""
+    if ext == ".pdf":
+        with fitz.open(file_path) as doc:
+            for page in doc:
+                yield page.get_text()
+    elif ext == ".docx":
+        paragraphs = iter(Document(file_path).paragraphs)
+        while True:
+            block = list(islice(paragraphs, DOCX_PARAGRAPHS_PER_PAGE))
+            if not block:
+                break
+            yield "\n".join(p.text for p in block)
+    elif ext == ".txt":
+        with open(file_path, "r", encoding="utf-8") as f:
+            block, size = [], 0
+            for line in f:
+                block.append(line)
+                size += len(line)
+                if size >= TXT_BLOCK_SIZE:
+                    yield _join_lines(block)
+                    block, size = [], 0
+            if block:
+                yield _join_lines(block)
 
-def chunk_text(text, size=CHUNK_SIZE):
-    return [text[i:i + size] for i in range(0, len(text), size)]
+def _join_lines(lines):
+    # iter_chunks puts the newline back between blocks
+    text = "".join(lines)
+    return text[:-1] if text.endswith("\n") else text
 
 def extract_text(file_path, ext):
     if ext == ".pdf":
@@ -30,37 +59,84 @@ def extract_text(file_path, ext):
             return f.read()
     return ""
 
-async def process_uploaded_files(files: List[UploadFile]) -> str:
-    all_chunks = []
-    all_embeddings = []
+def _counted(pages, on_page):
+    for page in pages:
+        on_page(1)
+        yield page
 
-    for file in files:
-        ext = os.path.splitext(file.filename)[1].lower()
-        with tempfile.NamedTemporaryFile(delete=False, suffix=ext) as tmp:
-            tmp.write(await file.read())
-            tmp_path = tmp.name
+def extract_chunks_to_file(file_path: str, ext: str, on_page=None, source: str = None) -> str:
+    """
+    Streams the document's pages into chunks and spills them, with their page
+    and offset, to a JSON-lines file, returning its path. on_page(n) is called
+    as pages are parsed.
+    """
+    pages = iter_pages(file_path, ext)
+    if on_page:
+        pages = _counted(pages, on_page)
+    with tempfile.NamedTemporaryFile("w", delete=False, suffix=".chunks", encoding="utf-8") as out:
+        for chunk in iter_chunks(pages, source):
+            out.write(json.dumps([chunk.text, chunk.page, chunk.offset]) + "\n")
+        return out.name
 
-        content = extract_text(tmp_path, ext)
-        os.remove(tmp_path)
+def embed_chunk_file(chunk_path: str, doc_id: str, content_hash: str = None, on_chunks=None,
+                     store: VectorStore = vector_store) -> int:
+    """Embed and store a spilled chunk file EMBED_WINDOW chunks at a time; on_chunks(n) follows progress."""
+    total = 0
+    with open(chunk_path, "r", encoding="utf-8") as f:
+        window = [json.loads(line) for line in islice(f, EMBED_WINDOW)]
+        while window:
+            next_window = [json.loads(line) for line in islice(f, EMBED_WINDOW)]
+            texts = [text for text, _, _ in window]
+            # The first window replaces any earlier upload of the same document; the hash
+            # goes on the last one only, so a half-ingested file is never taken as complete
+            store.append(doc_id, texts, encode_cached(texts), replace=(total == 0),
+                         content_hash=None if next_window else content_hash,
+                         positions=[(page, offset) for _, page, offset in window])
+            total += len(window)
+            if on_chunks:
+                on_chunks(len(window))
+            window = next_window
+    return total
 
-        if content:
-            chunks = chunk_text(content)
-            embeddings = embedder.encode(chunks, convert_to_numpy=True)
-            all_chunks.extend(chunks)
-            all_embeddings.extend(embeddings)
+async def spool_upload(file: UploadFile, directory: str = None) -> dict:
+    """
+    Copy an upload to disk in one pass, hashing it on the way, so it is never
+    held in memory whole. Everything downstream reads this one copy.
+    """
+    ext = os.path.splitext(file.filename)[1].lower()
+    digest = hashlib.sha256()
+    size = 0
+    with tempfile.NamedTemporaryFile(delete=False, suffix=ext, dir=directory) as tmp:
+        while block := await file.read(UPLOAD_READ_SIZE):
+            digest.update(block)
+            tmp.write(block)
+            size += len(block)
+    return {"path": tmp.name, "ext": ext, "filename": file.filename, "size": size,
+            "sha256": digest.hexdigest(), "chunks": 0, "unchanged": False}
 
-    np.save(os.path.join(VECTOR_DB_DIR, "embeddings.npy"), all_embeddings)
-    with open(os.path.join(VECTOR_DB_DIR, "chunks.pkl"), "wb") as f:
-        pickle.dump(all_chunks, f)
+def ingest_upload(upload: dict, on_page=None, on_chunks=None, store: VectorStore = vector_store) -> dict:
+    """Extract, chunk, embed and store one spooled upload in a shard's store; fills in upload["chunks"]."""
+    # Re-uploading a file with the same name replaces its previous chunks,
+    # unless the content is byte-for-byte what was ingested last time
+    doc_id = f"file:{upload['filename']}"
+    if store.document_hash(doc_id) == upload["sha256"]:
+        upload["unchanged"] = True
+        return upload
 
-    return f"✅ Processed {len(all_chunks)} chunks from the uploaded files."
+    chunk_path = extract_chunks_to_file(upload["path"], upload["ext"], on_page, doc_id)
+    try:
+        upload["chunks"] = embed_chunk_file(chunk_path, doc_id, upload["sha256"], on_chunks, store)
+    finally:
+        os.remove(chunk_path)
+    return upload
 
-def process_plain_text(plain_text: str) -> str:
-    chunks = chunk_text(plain_text)
-    embeddings = embedder.encode(chunks, convert_to_numpy=True)
+def process_plain_text(plain_text: str, store: VectorStore = vector_store) -> str:
+    doc_id = "text:" + hashlib.sha1(plain_text.encode("utf-8")).hexdigest()
+    chunks = list(iter_chunks([plain_text], doc_id))
+    texts = [chunk.text for chunk in chunks]
+    embeddings = encode_cached(texts)
 
-    np.save(os.path.join(VECTOR_DB_DIR, "embeddings.npy"), embeddings)
-    with open(os.path.join(VECTOR_DB_DIR, "chunks.pkl"), "wb") as f:
-        pickle.dump(chunks, f)
+    store.append(doc_id, texts, embeddings, replace=True,
+                 positions=[(chunk.page, chunk.offset) for chunk in chunks])
 
     return f"✅ Processed {len(chunks)} chunks from the plain text."
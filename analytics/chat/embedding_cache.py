@@ -0,0 +1,97 @@
+# embedding_cache.py
+import os
+import time
+import hashlib
+import sqlite3
+import threading
+import numpy as np
+from vector_store import VECTOR_DB_DIR
+
+CACHE_PATH = os.path.join(VECTOR_DB_DIR, "embedding_cache.sqlite")
+# ~1.5 KB per entry for 384-d float32 vectors
+CACHE_MAX_ENTRIES = int(os.getenv("EMBED_CACHE_MAX_ENTRIES", "500000"))
+# Evict down to this fraction of the limit so eviction isn't paid on every insert
+EVICT_TO = 0.9
+LOOKUP_BATCH = 500  # stays under SQLite's bound-parameter limit
+
+
+class EmbeddingCache:
+    """
+    Persistent embedding cache keyed by sha1(model name + chunk text).
+
+    Vectors are stored as raw float32 blobs in SQLite, with a last-used stamp
+    for least-recently-used eviction once the entry limit is exceeded.
+    """
+
+    def __init__(self, path: str = CACHE_PATH, max_entries: int = CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connection(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "key BLOB PRIMARY KEY, vector BLOB NOT NULL, last_used INTEGER NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_used ON embeddings (last_used)")
+        return self._conn
+
+    @staticmethod
+    def key(model_name: str, text: str) -> bytes:
+        return hashlib.sha1(f"{model_name}\0{text}".encode("utf-8")).digest()
+
+    def get_many(self, keys: list) -> dict:
+        found = {}
+        now = int(time.time())
+        with self._lock:
+            conn = self._connection()
+            for start in range(0, len(keys), LOOKUP_BATCH):
+                batch = keys[start:start + LOOKUP_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                rows = conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                for key, vector in rows:
+                    found[key] = np.frombuffer(vector, dtype="float32")
+            if found:
+                conn.executemany("UPDATE embeddings SET last_used = ? WHERE key = ?",
+                                 [(now, key) for key in found])
+                conn.commit()
+        return found
+
+    def put_many(self, items: dict):
+        now = int(time.time())
+        with self._lock:
+            conn = self._connection()
+            conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+                [(key, np.asarray(vector, dtype="float32").tobytes(), now) for key, vector in items.items()],
+            )
+            count = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            if count > self.max_entries:
+                excess = count - int(self.max_entries * EVICT_TO)
+                conn.execute(
+                    "DELETE FROM embeddings WHERE key IN "
+                    "(SELECT key FROM embeddings ORDER BY last_used LIMIT ?)", (excess,)
+                )
+                self.evictions += excess
+            conn.commit()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+            "evictions": self.evictions,
+        }
+
+
+embedding_cache = EmbeddingCache()
@@ -0,0 +1,93 @@
+# embedding_service.py
+import os
+import time
+import threading
+import numpy as np
+from embedding_cache import embedding_cache
+import shared  # puts analytics/ on sys.path for metrics.py
+from metrics import registry
+
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+EMBED_THREADS = int(os.getenv("EMBED_THREADS", "0"))  # 0 = let torch decide
+# Keep off for the L2 indexes already on disk; turn on together with a rebuild
+EMBED_NORMALIZE = os.getenv("EMBED_NORMALIZE", "false").lower() == "true"
+
+_model = None
+_lock = threading.Lock()
+_load_time = None
+
+EMBED_SECONDS = registry.histogram("embedding_batch_seconds", "Time per encode() call on the embedding model")
+EMBED_TEXTS = registry.counter("embedding_texts_total", "Texts embedded by the model (cache misses only)")
+
+def max_rss_mb():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    # ru_maxrss is in KB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def get_model():
+    """Load the sentence-transformers model on first use and share it process-wide."""
+    global _model, _load_time
+    if _model is None:
+        with _lock:
+            if _model is None:
+                start = time.perf_counter()
+                import torch
+                from sentence_transformers import SentenceTransformer
+                if EMBED_THREADS:
+                    torch.set_num_threads(EMBED_THREADS)
+                _model = SentenceTransformer(EMBEDDING_MODEL)
+                _load_time = time.perf_counter() - start
+    return _model
+
+def encode(texts, batch_size: int = None, normalize: bool = None) -> np.ndarray:
+    """Embed a list of texts in batches, returning a float32 (n, dim) array."""
+    texts = list(texts)
+    model = get_model()
+    with EMBED_SECONDS.time():
+        embeddings = model.encode(
+            texts,
+            batch_size=batch_size or EMBED_BATCH_SIZE,
+            normalize_embeddings=EMBED_NORMALIZE if normalize is None else normalize,
+            convert_to_numpy=True,
+            show_progress_bar=False,
+        ).astype("float32")
+    EMBED_TEXTS.inc(len(texts))
+    return embeddings
+
+def encode_cached(texts, batch_size: int = None) -> np.ndarray:
+    """Like encode(), but only texts missing from the embedding cache reach the model."""
+    texts = list(texts)
+    if not texts:
+        return np.empty((0, 0), dtype="float32")
+
+    # Normalized and raw vectors of the same text must not share a cache entry
+    model_key = f"{EMBEDDING_MODEL}:normalized" if EMBED_NORMALIZE else EMBEDDING_MODEL
+    keys = [embedding_cache.key(model_key, text) for text in texts]
+    vectors = embedding_cache.get_many(list(set(keys)))
+
+    missing = {}  # also dedupes chunks repeated within this batch
+    for key, text in zip(keys, texts):
+        if key not in vectors:
+            missing.setdefault(key, text)
+    if missing:
+        encoded = encode(list(missing.values()), batch_size=batch_size)
+        fresh = dict(zip(missing.keys(), encoded))
+        embedding_cache.put_many(fresh)
+        vectors.update(fresh)
+
+    embedding_cache.hits += len(texts) - len(missing)
+    embedding_cache.misses += len(missing)
+    return np.stack([vectors[key] for key in keys])
+
+def stats() -> dict:
+    return {
+        "model": EMBEDDING_MODEL,
+        "loaded": _model is not None,
+        "load_time_ms": round(_load_time * 1000, 2) if _load_time is not None else None,
+        "max_rss_mb": max_rss_mb(),
+        "cache": embedding_cache.stats(),
+    }
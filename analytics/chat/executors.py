@@ -0,0 +1,77 @@
+# executors.py
+import os
+import time
+import asyncio
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+import shared  # puts analytics/ on sys.path for metrics.py
+from metrics import registry
+
+# Separate pools so a burst of uploads can't starve /ask of LLM or DB threads.
+# Embedding (torch), FAISS and PyMuPDF release the GIL, so threads scale for CPU work too.
+CPU_WORKERS = int(os.getenv("CPU_WORKERS", str(os.cpu_count() or 4)))
+IO_WORKERS = int(os.getenv("IO_WORKERS", "16"))
+LLM_WORKERS = int(os.getenv("LLM_WORKERS", "8"))
+
+cpu_pool = ThreadPoolExecutor(max_workers=CPU_WORKERS, thread_name_prefix="cpu")
+io_pool = ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix="io")
+llm_pool = ThreadPoolExecutor(max_workers=LLM_WORKERS, thread_name_prefix="llm")
+
+# Measured on the LLM pool, so waiting for a free thread isn't counted
+LLM_SECONDS = registry.histogram("llm_call_seconds", "Time per LLM call, to the last token when streamed",
+                                 labelnames=("mode",))
+
+async def _run(pool, fn, *args, **kwargs):
+    return await asyncio.get_running_loop().run_in_executor(pool, partial(fn, *args, **kwargs))
+
+async def run_cpu(fn, *args, **kwargs):
+    """Embedding, index building, FAISS search."""
+    return await _run(cpu_pool, fn, *args, **kwargs)
+
+async def run_io(fn, *args, **kwargs):
+    """Database commits, blocking HTTP and file I/O."""
+    return await _run(io_pool, fn, *args, **kwargs)
+
+def _timed_call(fn, *args, **kwargs):
+    with LLM_SECONDS.labels("call").time():
+        return fn(*args, **kwargs)
+
+async def run_llm(fn, *args, **kwargs):
+    """Blocking LLM calls."""
+    return await _run(llm_pool, _timed_call, fn, *args, **kwargs)
+
+async def stream_llm(make_iterator):
+    """
+    Drive a blocking iterator (e.g. a streamed LLM response) on the LLM pool
+    and yield its items on the event loop as they arrive.
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    finished = object()
+
+    def pump():
+        start = time.perf_counter()
+        try:
+            for item in make_iterator():
+                loop.call_soon_threadsafe(queue.put_nowait, (item, None))
+            loop.call_soon_threadsafe(queue.put_nowait, (finished, None))
+        except Exception as e:
+            loop.call_soon_threadsafe(queue.put_nowait, (finished, e))
+        finally:
+            LLM_SECONDS.labels("stream").observe(time.perf_counter() - start)
+
+    pumping = loop.run_in_executor(llm_pool, pump)
+    while True:
+        item, error = await queue.get()
+        if item is finished:
+            if error is not None:
+                raise error
+            break
+        yield item
+    await pumping
+
+def stats() -> dict:
+    return {
+        name: {"workers": pool._max_workers, "queued": pool._work_queue.qsize()}
+        for name, pool in (("cpu", cpu_pool), ("io", io_pool), ("llm", llm_pool))
+    }
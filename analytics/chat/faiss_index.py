@@ -1,21 +1,360 @@
 # faiss_index.py
 import os
+import json
+import time
+import threading
 import numpy as np
 import faiss
-import pickle
+from vector_store import vector_store, VectorStore, VECTOR_DB_DIR
+from chunk_store import ChunkStore
+from lexical_index import LexicalIndex
+import shared  # puts analytics/ on sys.path for metrics.py
+from metrics import registry
 
-VECTOR_DB_DIR = "vector_db"
+# The published snapshot: {"index": <index-*.faiss file>, "segments": <manifest entries baked into it>}.
+# Replacing this one file swaps the index and its segment list together; later segments are added on load.
+SNAPSHOT_FILE = "snapshot.json"
+SNAPSHOT_PATH = os.path.join(VECTOR_DB_DIR, SNAPSHOT_FILE)
+# Written before snapshot.json existed, as two files replaced one after the other
+LEGACY_INDEX_FILE = "index.faiss"
 
-def create_index() -> str:
-    embeddings = np.load(os.path.join(VECTOR_DB_DIR, "embeddings.npy"))
-    dim = embeddings.shape[1]
-    index = faiss.IndexFlatL2(dim)
-    index.add(embeddings)
-    faiss.write_index(index, os.path.join(VECTOR_DB_DIR, "index.faiss"))
+# Index type built by create_index(): flat | ivf | hnsw | ivfpq.
+# Run bench_index.py to pick the type and search parameters for a corpus size.
+INDEX_TYPE = os.getenv("FAISS_INDEX_TYPE", "flat")
+IVF_NLIST = int(os.getenv("FAISS_NLIST", "0"))  # 0 = 4 * sqrt(n)
+IVF_NPROBE = int(os.getenv("FAISS_NPROBE", "16"))
+HNSW_M = int(os.getenv("FAISS_HNSW_M", "32"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("FAISS_EF_CONSTRUCTION", "200"))
+HNSW_EF_SEARCH = int(os.getenv("FAISS_EF_SEARCH", "64"))
+PQ_M = int(os.getenv("FAISS_PQ_M", "16"))  # sub-quantizers, must divide the dimension
+TRAIN_SAMPLE_PER_LIST = 64
+MIN_TRAIN_SAMPLE = 10000  # PQ codebooks need far more than 256 points to be useful
+
+# "full" when the snapshot was (re)read from disk, "incremental" when only segments changed
+INDEX_LOAD_SECONDS = registry.histogram("index_load_seconds", "Time to load or resync an index and its chunks",
+                                        labelnames=("kind",))
+
+def _new_index(dim: int):
+    # Used for segments that arrive before any snapshot; needs no training
+    return faiss.IndexIDMap2(faiss.IndexFlatL2(dim))
+
+def _default_nlist(n: int) -> int:
+    # faiss wants at least 39 training points per list
+    return max(1, min(int(4 * np.sqrt(n)), n // 39))
+
+def build_index(dim: int, n: int, index_type: str = INDEX_TYPE, nlist: int = IVF_NLIST,
+                hnsw_m: int = HNSW_M, pq_m: int = PQ_M):
+    """
+    Create an empty index of the requested type for n vectors that takes our ids.
+
+    Flat and HNSW are wrapped in IDMap2. IVF variants store the ids in their
+    inverted lists themselves: IDMap2 assumes remove_ids() renumbers the
+    remaining vectors, which IVF doesn't, so wrapping it would shift every
+    id after a delete. IVF still needs train() before vectors are added;
+    small corpora that can't train it fall back to a flat index.
+    """
+    nlist = nlist or _default_nlist(n)
+    if index_type == "flat" or (index_type in ("ivf", "ivfpq") and n < 39 * nlist):
+        description = "IDMap2,Flat"
+    elif index_type == "ivf":
+        description = f"IVF{nlist},Flat"
+    elif index_type == "ivfpq":
+        if n < 256:
+            description = "IDMap2,Flat"
+        else:
+            description = f"IVF{nlist},PQ{pq_m}x8"
+    elif index_type == "hnsw":
+        description = f"IDMap2,HNSW{hnsw_m},Flat"
+    else:
+        raise ValueError(f"Unknown FAISS index type: {index_type}")
+
+    index = faiss.index_factory(dim, description)
+    if index_type == "hnsw":
+        faiss.downcast_index(index.index).hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+    return index
+
+def apply_search_params(index, nprobe: int = IVF_NPROBE, ef_search: int = HNSW_EF_SEARCH):
+    """Set nprobe / efSearch on whichever index types understand them."""
+    params = faiss.ParameterSpace()
+    inner = faiss.downcast_index(index.index) if hasattr(index, "index") else index
+    if isinstance(inner, faiss.IndexIVF):
+        params.set_index_parameter(index, "nprobe", nprobe)
+    elif isinstance(inner, faiss.IndexHNSW):
+        params.set_index_parameter(index, "efSearch", ef_search)
+    return index
+
+class EmptyIndexError(Exception):
+    pass
+
+def _training_sample(store: VectorStore, segments, size: int):
+    # Takes a proportional random slice of every segment instead of loading the corpus
+    total = sum(s["count"] for s in segments)
+    fraction = min(1.0, size / total)
+    rng = np.random.default_rng(0)
+    sample = []
+    for segment in segments:
+        embeddings, _ = store.load_segment(segment)
+        take = max(1, int(round(len(embeddings) * fraction)))
+        sample.append(embeddings[rng.choice(len(embeddings), take, replace=False)])
+    return np.concatenate(sample).astype("float32")
+
+def create_index(store: VectorStore = vector_store) -> str:
+    """
+    Compact every live segment of a store (the shared one by default) into one
+    segment and build a fresh index.faiss snapshot over it.
+    """
+    with store.compacting():
+        store.import_legacy()
+        store.compact()
+        segments = store.segments()
+        if not segments:
+            raise EmptyIndexError("No documents have been uploaded yet.")
+
+        total = sum(len(store.segment_ids(s)) for s in segments)
+        dim = store.load_segment(segments[0])[0].shape[1]
+        index = build_index(dim, total)
+        if not index.is_trained:
+            nlist = faiss.extract_index_ivf(index).nlist
+            index.train(_training_sample(store, segments, max(nlist * TRAIN_SAMPLE_PER_LIST, MIN_TRAIN_SAMPLE)))
+
+        for segment in segments:
+            embeddings, _ = store.load_segment(segment)
+            index.add_with_ids(embeddings, store.segment_ids(segment))
+        apply_search_params(index)
+
+        _publish_snapshot(store.root, index, segments)
+        store.remove_orphans()
+
+    # Other managers, in this process or others, see the new snapshot's mtime on their next get()
+    if store.root == index_manager.store.root:
+        index_manager.reload()
     return "✅ FAISS index created and saved successfully."
 
+def _publish_snapshot(root: str, index, segments):
+    """
+    Write the index under a new name, then point snapshot.json at it and its
+    segments with a single rename, so readers see either the old pair or the
+    new one. The previous index file is kept for readers that just read the
+    old pointer; older ones are deleted.
+    """
+    snapshot_path = os.path.join(root, SNAPSHOT_FILE)
+    previous = _read_snapshot(root)
+    index_file = f"index-{time.time_ns()}.faiss"
+    faiss.write_index(index, os.path.join(root, index_file + ".tmp"))
+    os.replace(os.path.join(root, index_file + ".tmp"), os.path.join(root, index_file))
+    with open(snapshot_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump({"index": index_file, "segments": segments}, f)
+    os.replace(snapshot_path + ".tmp", snapshot_path)
+
+    keep = {index_file, previous and previous[0]}
+    stale = [f for f in os.listdir(root) if f.startswith("index-") and f.endswith(".faiss") and f not in keep]
+    for filename in stale + [LEGACY_INDEX_FILE, LEGACY_INDEX_FILE + ".json"]:
+        try:
+            os.remove(os.path.join(root, filename))
+        except (FileNotFoundError, PermissionError):
+            pass  # PermissionError: still open by a worker on Windows; retried next time
+
+def _read_snapshot(root: str):
+    """(index file name, segments) of the published snapshot, or None if there isn't one."""
+    try:
+        with open(os.path.join(root, SNAPSHOT_FILE), "r", encoding="utf-8") as f:
+            snapshot = json.load(f)
+        return snapshot["index"], snapshot["segments"]
+    except FileNotFoundError:
+        pass
+    try:
+        with open(os.path.join(root, LEGACY_INDEX_FILE + ".json"), "r", encoding="utf-8") as f:
+            return LEGACY_INDEX_FILE, json.load(f)
+    except FileNotFoundError:
+        return None
+
 def load_index_and_chunks():
-    index = faiss.read_index(os.path.join(VECTOR_DB_DIR, "index.faiss"))
-    with open(os.path.join(VECTOR_DB_DIR, "chunks.pkl"), "rb") as f:
-        chunks = pickle.load(f)
-    return index, chunks
+    """Read the index snapshot plus every live segment from disk."""
+    manager = IndexManager()
+    return manager.get()
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+class IndexManager:
+    """
+    Process-wide holder for the FAISS index, its chunks (a ChunkStore of
+    memory-mapped segments, looked up by id) and their BM25 index.
+
+    One manager serves one VectorStore: the shared store by default, or a
+    user's shard (see shards.py). The index snapshot is read from disk once and every request is served from
+    memory. Segments appended after the snapshot are added to the live index
+    as they show up in the manifest, and deleted ones are removed, so an
+    upload costs a reload proportional to its own size. A full reload only
+    happens when create_index() publishes a new snapshot. Change detection is
+    a stat of two files per request, which also picks up writes from other
+    worker processes.
+    """
+
+    def __init__(self, store: VectorStore = vector_store):
+        self.store = store
+        self.snapshot_path = os.path.join(store.root, SNAPSHOT_FILE)
+        self.legacy_index_path = os.path.join(store.root, LEGACY_INDEX_FILE)
+        self._lock = threading.Lock()
+        self._index = None
+        self._chunks = ChunkStore()
+        self._lexical = LexicalIndex()
+        self._segments = {}  # name -> manifest entry whose ids are in the index (None: all of them)
+        self._loaded = {}  # name -> (manifest entry, ChunkFile, SegmentPostings) behind _chunks and _lexical
+        self._snapshot_sig = None
+        self._signature = None
+        self.generation = 0
+        self.load_time = None
+        self.loaded_at = None
+
+    def _disk_signature(self):
+        return (_mtime(self.snapshot_path) or _mtime(self.legacy_index_path), _mtime(self.store.manifest_path))
+
+    def _load_snapshot(self):
+        self._index = None
+        self._chunks = ChunkStore()
+        self._lexical = LexicalIndex()
+        self._segments = {}
+        self._loaded = {}
+        for _ in range(3):
+            snapshot = _read_snapshot(self.store.root)
+            if snapshot is None:
+                return
+            path = os.path.join(self.store.root, snapshot[0])
+            try:
+                index = faiss.read_index(path)
+                break
+            except RuntimeError:
+                if os.path.exists(path):
+                    raise
+                # Pruned by two newer publishes since the pointer was read; read it again
+        else:
+            raise RuntimeError(f"Index snapshot in {self.store.root} keeps changing while loading")
+        self._index = apply_search_params(index)
+        # Snapshots written before compaction only list names; those segments are indexed in full
+        self._segments = {s if isinstance(s, str) else s["name"]: None if isinstance(s, str) else s
+                          for s in snapshot[1]}
+
+    def _remove_ids(self, ids):
+        index = self._index
+        if hasattr(index, "index") and isinstance(faiss.downcast_index(index.index), faiss.IndexIVF):
+            return  # IDMap2 over IVF, from an older snapshot: removing would shift ids; filtered by chunk lookup
+        try:
+            index.remove_ids(ids)
+        except RuntimeError:
+            pass  # HNSW can't remove; the ids are filtered out by chunk lookup
+
+    def _sync(self, signature):
+        start = time.perf_counter()
+        kind = "incremental"
+        if signature[1] is None:
+            self.store.import_legacy()
+        if signature[0] != self._snapshot_sig:
+            self._load_snapshot()
+            self._snapshot_sig = signature[0]
+            kind = "full"
+
+        documents = self.store.documents
+        live = {s["name"]: s for s in self.store.segments()}
+        added, added_postings, removed, removed_postings = [], [], [], []
+        for name, segment in live.items():
+            if name not in self._segments:
+                embeddings, _ = self.store.load_segment(segment)
+                if self._index is None:
+                    self._index = _new_index(embeddings.shape[1])
+                self._index.add_with_ids(embeddings, self.store.segment_ids(segment))
+            elif self._segments[name] is not None and documents(self._segments[name]) != documents(segment):
+                # Documents deleted from a compacted segment
+                self._remove_ids(np.setdiff1d(self.store.segment_ids(self._segments[name]),
+                                              self.store.segment_ids(segment)))
+            self._segments[name] = segment
+
+            loaded = self._loaded.get(name)
+            if loaded is not None and documents(loaded[0]) == documents(segment):
+                continue
+            if loaded is not None:
+                removed.extend(d["start_id"] for d in documents(loaded[0]))
+                removed_postings.append(segment["start_id"])
+                chunk_file, postings = loaded[1:]
+            else:
+                chunk_file, postings = self.store.open_chunks(segment), self.store.open_postings(segment)
+            if "documents" in segment:
+                added.extend((d["start_id"], chunk_file.range(d["start_id"] - segment["start_id"], d["count"],
+                                                              d["doc_id"]))
+                             for d in segment["documents"])
+            else:
+                added.append((segment["start_id"], chunk_file))
+            added_postings.append((segment["start_id"],
+                                   postings.restrict(self.store.segment_ids(segment) - segment["start_id"])))
+            self._loaded[name] = (segment, chunk_file, postings)
+
+        for name in [n for n in self._segments if n not in live]:
+            segment = self._segments.pop(name)
+            loaded = self._loaded.pop(name, None)
+            if loaded is not None:
+                removed.extend(d["start_id"] for d in documents(loaded[0]))
+                removed_postings.append(loaded[0]["start_id"])
+                segment = segment or loaded[0]
+            if segment is None:
+                continue  # only in the snapshot, never had chunks loaded
+            self._remove_ids(self.store.segment_ids(segment))
+        self._chunks.update(added, removed)
+        self._lexical.update(added_postings, removed_postings)
+
+        self._signature = signature
+        self.load_time = time.perf_counter() - start
+        self.loaded_at = time.time()
+        self.generation += 1
+        INDEX_LOAD_SECONDS.labels(kind).observe(self.load_time)
+
+    def get(self):
+        """Return the resident (index, chunks), syncing first if the files changed."""
+        signature = self._disk_signature()
+        if signature != self._signature:
+            with self._lock:
+                if signature != self._signature:
+                    self._sync(signature)
+        if self._index is None:
+            raise EmptyIndexError("No documents have been indexed yet.")
+        return self._index, self._chunks
+
+    @property
+    def lexical(self) -> LexicalIndex:
+        """BM25 index of the chunks returned by the last get()."""
+        return self._lexical
+
+    def reload(self):
+        """Force a full reload from disk, e.g. right after a new index was written."""
+        with self._lock:
+            self._snapshot_sig = None
+            self._sync(self._disk_signature())
+
+    def memory_bytes(self) -> int:
+        """Rough resident size: FAISS codes plus id map and HNSW links, and the BM25 postings."""
+        index = self._index
+        if index is None:
+            return 0
+        inner = faiss.downcast_index(index.index) if hasattr(index, "index") else index
+        per_vector = getattr(inner, "code_size", index.d * 4) + 16
+        if isinstance(inner, faiss.IndexHNSW):
+            inner_storage = faiss.downcast_index(inner.storage)
+            per_vector = getattr(inner_storage, "code_size", index.d * 4) + 16 + inner.hnsw.nb_neighbors(0) * 4
+        return index.ntotal * per_vector + self._lexical.nbytes
+
+    def stats(self) -> dict:
+        return {
+            "generation": self.generation,
+            "load_time_ms": round(self.load_time * 1000, 2) if self.load_time is not None else None,
+            "loaded_at": self.loaded_at,
+            "vectors": self._index.ntotal if self._index is not None else 0,
+            "chunks": len(self._chunks),
+            "segments": len(self._segments),
+        }
+
+
+index_manager = IndexManager()
@@ -1,28 +1,50 @@
 # gemini_flash.py
 import os
-import google.generativeai as genai
-import numpy as np
-from sentence_transformers import SentenceTransformer
+import time
 
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-model = genai.GenerativeModel("gemini-2.0-flash")
-embedder = SentenceTransformer("all-MiniLM-L6-v2")
+# "fake" swaps Gemini for a canned streaming model so the service runs offline
+LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini")
 
-def get_llm_response(index, chunks, question: str, history: list = None) -> str:
-    question_embedding = embedder.encode([question], convert_to_numpy=True)[0]
 
-    # ✅ Correct unpacking
-    distances, indices = index.search(np.array([question_embedding]), k=3)
+class _FakeChunk:
+    def __init__(self, text):
+        self.text = text
 
-    # ✅ Now use indices properly
-    context = "\n".join([chunks[i] for i in indices[0] if i != -1])
 
-    conversation_history = ""
-    if history:
-        for pair in history:
-            conversation_history += f"User: {pair['user']}\nAssistant: {pair['assistant']}\n"
+class FakeStreamingModel:
+    """Offline stand-in for genai.GenerativeModel that echoes the question word by word."""
 
-    prompt = f"""You are a helpful assistant.
+    def __init__(self, token_delay: float = float(os.getenv("FAKE_LLM_TOKEN_DELAY", "0.02"))):
+        self.token_delay = token_delay
+
+    def _tokens(self, prompt: str):
+        question = prompt.rsplit("User:", 1)[-1].split("Assistant:", 1)[0].strip()
+        for word in f"This is a stubbed answer to: {question}".split(" "):
+            time.sleep(self.token_delay)
+            yield _FakeChunk(word + " ")
+
+    def generate_content(self, prompt: str, stream: bool = False):
+        if stream:
+            return self._tokens(prompt)
+        return _FakeChunk("".join(chunk.text for chunk in self._tokens(prompt)))
+
+
+if LLM_BACKEND == "fake":
+    model = FakeStreamingModel()
+else:
+    import google.generativeai as genai
+    genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+    model = genai.GenerativeModel("gemini-2.0-flash")
+
+def build_prompt(question: str, context_chunks: list, history: list = None) -> str:
+    # context_chunks are the texts the query batcher retrieved from the caller's shards
+    context = "\n".join(context_chunks)
+
+    conversation_history = "".join(
+        f"User: {pair['user']}\nAssistant: {pair['assistant']}\n" for pair in history or []
+    )
+
+    return f"""You are a helpful assistant.
 Context:
 {context}
 
@@ -30,5 +52,14 @@ Context:
 User: {question}
 Assistant:"""
 
+def get_llm_response(question: str, context_chunks: list, history: list = None) -> str:
+    prompt = build_prompt(question, context_chunks, history)
     response = model.generate_content(prompt)
     return response.text.strip()
+
+def stream_llm_response(question: str, context_chunks: list, history: list = None):
+    """Yield the answer text piece by piece as the model generates it."""
+    prompt = build_prompt(question, context_chunks, history)
+    for chunk in model.generate_content(prompt, stream=True):
+        if chunk.text:
+            yield chunk.text
@@ -0,0 +1,191 @@
+# job_worker.py
+"""
+Worker processes that drain the ingestion job queue.
+
+The chat API starts JOB_WORKERS of them on startup; more can run on their own
+(on the same machine, sharing VECTOR_DB_DIR) with:
+
+    python job_worker.py --workers 4
+"""
+import os
+import time
+import argparse
+import threading
+import traceback
+import multiprocessing
+from jobs import job_queue, JOB_LEASE_SECONDS
+from docs_to_chunks import ingest_upload, process_plain_text
+from web_scraper import process_url_content
+from faiss_index import create_index, EmptyIndexError
+from chat_history import store_document
+from database import SessionLocal
+from shards import shard_store, SHARED_SHARD
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+POLL_INTERVAL = 0.5
+PROGRESS_INTERVAL = 1.0  # seconds between progress writes
+# Renews the lease while a handler runs, even one that reports no progress
+HEARTBEAT_INTERVAL = JOB_LEASE_SECONDS / 4
+# Failures that would fail the same way on every retry
+PERMANENT_ERRORS = (EmptyIndexError,)
+
+
+class Progress:
+    """
+    Job counters, written to the queue at most once per PROGRESS_INTERVAL.
+    Writing renews the job's lease; while the handler runs, a heartbeat
+    thread also writes every HEARTBEAT_INTERVAL.
+    """
+
+    def __init__(self, job_id: int, attempt: int, **initial):
+        self.job_id = job_id
+        self.attempt = attempt
+        self.values = dict(initial)
+        self.lease_lost = False
+        self._flushed_at = 0.0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._heartbeat = None
+
+    def add(self, key: str, n: int = 1):
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + n
+        self.flush()
+
+    def set(self, key: str, value):
+        with self._lock:
+            self.values[key] = value
+        self.flush(force=True)
+
+    def flush(self, force: bool = False):
+        now = time.monotonic()
+        if force or now - self._flushed_at >= PROGRESS_INTERVAL:
+            self._flushed_at = now
+            with self._lock:
+                values = dict(self.values)
+            if not job_queue.update_progress(self.job_id, values, self.attempt):
+                self.lease_lost = True
+
+    def _beat(self):
+        while not self._stop.wait(HEARTBEAT_INTERVAL):
+            try:
+                self.flush(force=True)
+            except Exception as e:
+                print(f"⚠️ Heartbeat for job {self.job_id} failed: {e}")
+
+    def __enter__(self):
+        self._heartbeat = threading.Thread(target=self._beat, name=f"heartbeat-{self.job_id}", daemon=True)
+        self._heartbeat.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._heartbeat.join()
+        return False
+
+
+def run_upload(payload: dict, progress: Progress) -> str:
+    responses = []
+    documents = []
+    uploads = payload.get("files", [])
+    store = shard_store(payload.get("shard", SHARED_SHARD))
+
+    for upload in uploads:
+        ingest_upload(upload, on_page=lambda n: progress.add("pages_parsed", n),
+                      on_chunks=lambda n: progress.add("chunks_embedded", n), store=store)
+        progress.add("files_done")
+        documents.append(("file", f"{upload['filename']} ({upload['size']} bytes, "
+                                  f"sha256 {upload['sha256']}, {upload['chunks']} chunks)"))
+    if uploads:
+        unchanged = sum(1 for upload in uploads if upload["unchanged"])
+        message = f"✅ Processed {sum(upload['chunks'] for upload in uploads)} chunks from the uploaded files."
+        if unchanged:
+            message += f" {unchanged} unchanged file(s) skipped."
+        responses.append(message)
+
+    if payload.get("plain_text"):
+        responses.append(process_plain_text(payload["plain_text"], store))
+        documents.append(("text", payload["plain_text"]))
+
+    if payload.get("website_url"):
+        responses.append(process_url_content(payload["website_url"], store))
+        documents.append(("url", payload["website_url"]))
+
+    # The live index picks up the new segments from the manifest on its next request
+    progress.set("index_updated", True)
+
+    # Stored last, so a retried job doesn't leave duplicate rows behind
+    db = SessionLocal()
+    try:
+        for doc_type, content in documents:
+            store_document(db, payload["user_id"], payload["username"], doc_type, content)
+    finally:
+        db.close()
+    return " | ".join(responses)
+
+def run_create_index(payload: dict, progress: Progress) -> str:
+    message = create_index(shard_store(payload.get("shard", SHARED_SHARD)))
+    progress.set("index_updated", True)
+    return message
+
+HANDLERS = {
+    "upload": run_upload,
+    "create_index": run_create_index,
+}
+
+def cleanup(payload: dict):
+    for upload in payload.get("files", []):
+        if os.path.exists(upload["path"]):
+            os.remove(upload["path"])
+
+def run_one() -> bool:
+    """Claim and run a single job; returns False when the queue had nothing runnable."""
+    for payload in job_queue.fail_expired():
+        cleanup(payload)
+    job = job_queue.claim()
+    if job is None:
+        return False
+
+    progress = Progress(job["id"], job["attempt"], files_total=len(job["payload"].get("files", [])))
+    try:
+        with progress:
+            result = HANDLERS[job["kind"]](job["payload"], progress)
+    except Exception as e:
+        traceback.print_exc()
+        if not job_queue.fail(job["id"], job["attempt"], str(e), retry=not isinstance(e, PERMANENT_ERRORS)):
+            cleanup(job["payload"])
+        return True
+
+    progress.flush(force=True)
+    if job_queue.complete(job["id"], job["attempt"], result):
+        cleanup(job["payload"])
+    else:
+        # Another worker holds the job now and still needs its files
+        print(f"⚠️ Job {job['id']} finished after its lease was lost; result discarded.")
+    return True
+
+def worker_loop():
+    while True:
+        if not run_one():
+            time.sleep(POLL_INTERVAL)
+
+def start_workers(count: int = JOB_WORKERS) -> list:
+    # spawn, not fork: the API process has threads and an event loop running
+    context = multiprocessing.get_context("spawn")
+    processes = [context.Process(target=worker_loop, name=f"job-worker-{i}", daemon=True) for i in range(count)]
+    for process in processes:
+        process.start()
+    return processes
+
+def main():
+    parser = argparse.ArgumentParser(description="Run ingestion job workers.")
+    parser.add_argument("--workers", type=int, default=JOB_WORKERS)
+    args = parser.parse_args()
+
+    processes = start_workers(args.workers)
+    print(f"Started {len(processes)} job workers.")
+    for process in processes:
+        process.join()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+# jobs.py
+import os
+import json
+import time
+import sqlite3
+from contextlib import contextmanager
+from vector_store import VECTOR_DB_DIR
+
+JOBS_PATH = os.path.join(VECTOR_DB_DIR, "jobs.sqlite")
+# Uploads wait here, outside the temp dir, until a worker has ingested them
+UPLOAD_SPOOL_DIR = os.path.join(VECTOR_DB_DIR, "uploads")
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+# A running job whose worker hasn't heartbeated for this long is handed to another worker,
+# or failed if it has no attempts left
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "600"))
+RETRY_BACKOFF_SECONDS = 5
+
+os.makedirs(UPLOAD_SPOOL_DIR, exist_ok=True)
+
+
+class JobQueue:
+    """
+    Persistent job queue in SQLite, shared by the API process and the workers.
+
+    Jobs move queued -> running -> done, or back to queued with exponential
+    backoff on failure until max_attempts is used up, then to failed.
+    A connection is opened per call so the queue can be used from any thread
+    or process; BEGIN IMMEDIATE makes claiming a job atomic across workers.
+
+    A claim is a lease identified by the job's attempt number: progress,
+    complete and fail only touch the job while it is still running under
+    that attempt, so a worker whose lease expired can't overwrite the worker
+    that took the job over.
+    """
+
+    def __init__(self, path: str = JOBS_PATH):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, kind TEXT NOT NULL, payload TEXT NOT NULL, "
+                "status TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, max_attempts INTEGER NOT NULL, "
+                "progress TEXT NOT NULL DEFAULT '{}', result TEXT, error TEXT, "
+                "run_after REAL NOT NULL, created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, run_after)")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def enqueue(self, kind: str, payload: dict, max_attempts: int = JOB_MAX_ATTEMPTS) -> int:
+        return self.enqueue_many(kind, [payload], max_attempts)[0]
+
+    def enqueue_many(self, kind: str, payloads: list, max_attempts: int = JOB_MAX_ATTEMPTS) -> list:
+        """Queue several jobs in one transaction, so either all of them run or none do."""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                ids = [
+                    conn.execute(
+                        "INSERT INTO jobs (kind, payload, status, max_attempts, run_after, created_at, updated_at) "
+                        "VALUES (?, ?, 'queued', ?, ?, ?, ?)",
+                        (kind, json.dumps(payload), max_attempts, now, now, now),
+                    ).lastrowid
+                    for payload in payloads
+                ]
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return ids
+
+    def claim(self):
+        """Atomically take the oldest runnable job, or return None."""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    "SELECT id, kind, payload, attempts FROM jobs "
+                    "WHERE (status = 'queued' AND run_after <= ?) "
+                    "OR (status = 'running' AND updated_at < ? AND attempts < max_attempts) "
+                    "ORDER BY id LIMIT 1",
+                    (now, now - JOB_LEASE_SECONDS),
+                ).fetchone()
+                if row is not None:
+                    conn.execute(
+                        "UPDATE jobs SET status = 'running', attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                        (now, row[0]),
+                    )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        if row is None:
+            return None
+        return {"id": row[0], "kind": row[1], "payload": json.loads(row[2]), "attempt": row[3] + 1}
+
+    def fail_expired(self) -> list:
+        """
+        Fail running jobs whose lease expired on their last attempt; returns
+        their payloads so the caller can remove their files.
+        """
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = conn.execute(
+                    "SELECT id, payload, attempts FROM jobs "
+                    "WHERE status = 'running' AND updated_at < ? AND attempts >= max_attempts",
+                    (now - JOB_LEASE_SECONDS,),
+                ).fetchall()
+                conn.executemany(
+                    "UPDATE jobs SET status = 'failed', error = ?, updated_at = ? WHERE id = ?",
+                    [(f"Worker stopped heartbeating on attempt {attempts}", now, job_id)
+                     for job_id, _, attempts in rows],
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return [json.loads(payload) for _, payload, _ in rows]
+
+    def update_progress(self, job_id: int, progress: dict, attempt: int) -> bool:
+        """Record progress, which also renews the lease; returns False if the lease is lost."""
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET progress = ?, updated_at = ? WHERE id = ? AND status = 'running' AND attempts = ?",
+                (json.dumps(progress), time.time(), job_id, attempt))
+            return cursor.rowcount == 1
+
+    def complete(self, job_id: int, attempt: int, result: str) -> bool:
+        """Mark the job done; returns False if the lease was lost and nothing was written."""
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = 'done', result = ?, error = NULL, updated_at = ? "
+                "WHERE id = ? AND status = 'running' AND attempts = ?",
+                (result, time.time(), job_id, attempt))
+            return cursor.rowcount == 1
+
+    def fail(self, job_id: int, attempt: int, error: str, retry: bool = True) -> bool:
+        """
+        Record a failure; returns True if the job will run again, either as a
+        retry or because another worker already took it over. retry=False
+        fails it for good, for errors another attempt can't fix.
+        """
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    "SELECT max_attempts FROM jobs WHERE id = ? AND status = 'running' AND attempts = ?",
+                    (job_id, attempt)).fetchone()
+                if row is not None:
+                    retry = retry and attempt < row[0]
+                    conn.execute(
+                        "UPDATE jobs SET status = ?, error = ?, run_after = ?, updated_at = ? WHERE id = ?",
+                        ("queued" if retry else "failed", error, now + RETRY_BACKOFF_SECONDS * 2 ** (attempt - 1),
+                         now, job_id),
+                    )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return row is None or retry
+
+    def get(self, job_id: int):
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT id, kind, status, attempts, max_attempts, progress, result, error, created_at, updated_at "
+                "FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        return {
+            "job_id": row[0], "kind": row[1], "status": row[2], "attempts": row[3], "max_attempts": row[4],
+            "progress": json.loads(row[5]), "result": row[6], "error": row[7],
+            "created_at": row[8], "updated_at": row[9],
+        }
+
+    def counts(self) -> dict:
+        with self._connect() as conn:
+            return dict(conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+
+
+job_queue = JobQueue()
@@ -0,0 +1,242 @@
+# lexical_index.py
+import os
+import re
+import copy
+import math
+import hashlib
+import tempfile
+from collections import Counter
+import numpy as np
+
+BM25_K1 = float(os.getenv("BM25_K1", "1.2"))
+BM25_B = float(os.getenv("BM25_B", "0.75"))
+# Reciprocal rank fusion of the dense and lexical rankings; a weight of 0 turns a retriever off
+HYBRID_DENSE_WEIGHT = float(os.getenv("HYBRID_DENSE_WEIGHT", "1.0"))
+HYBRID_LEXICAL_WEIGHT = float(os.getenv("HYBRID_LEXICAL_WEIGHT", "1.0"))
+RRF_K = int(os.getenv("RRF_K", "60"))
+# Query terms found in more than this share of chunks act as stopwords: long postings, near-zero idf
+BM25_MAX_DF_RATIO = float(os.getenv("BM25_MAX_DF_RATIO", "0.5"))
+POSTINGS_EXT = ".bm25.npz"
+
+# Keeps error codes, versions and ids such as "E-1042", "v2.3.1" or "ERR_TIMEOUT" as one term
+TOKEN_RE = re.compile(r"\w+(?:[-.:/]\w+)*")
+
+
+def tokenize(text: str) -> list:
+    return TOKEN_RE.findall(text.lower())
+
+def term_hash(term: str) -> int:
+    # Stable across processes, unlike hash(); terms are stored as 8-byte hashes, not strings
+    return int.from_bytes(hashlib.blake2b(term.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def write_postings(prefix: str, chunks):
+    """Write a segment's inverted index (term -> chunk, term frequency) to prefix.bm25.npz."""
+    postings = {}
+    lengths = []
+    for local_id, chunk in enumerate(chunks):
+        tokens = tokenize(chunk)
+        lengths.append(len(tokens))
+        for term, tf in Counter(tokens).items():
+            postings.setdefault(term_hash(term), []).append((local_id, tf))
+
+    terms = sorted(postings)
+    offsets = np.zeros(len(terms) + 1, dtype="int64")
+    doc_ids, tfs = [], []
+    for i, term in enumerate(terms):
+        for local_id, tf in postings[term]:
+            doc_ids.append(local_id)
+            tfs.append(tf)
+        offsets[i + 1] = len(doc_ids)
+    _save_postings(prefix, np.asarray(terms, dtype="uint64"), offsets, np.asarray(doc_ids, dtype="int32"),
+                   np.asarray(tfs, dtype="float32"), np.asarray(lengths, dtype="float32"))
+
+
+def merge_postings(prefix: str, parts):
+    """
+    Write one inverted index for the chunks of several segments, given as
+    (SegmentPostings, local ids to keep) in their new order. The CSR arrays
+    are concatenated and re-sorted by term, so nothing is re-tokenized.
+    """
+    terms, doc_ids, tfs, lengths = [], [], [], []
+    base = 0
+    for postings, local_ids in parts:
+        remap = np.full(len(postings.lengths), -1, dtype="int64")
+        remap[local_ids] = np.arange(base, base + len(local_ids))
+        new_ids = remap[postings.doc_ids]
+        keep = new_ids >= 0
+        terms.append(np.repeat(postings.terms, np.diff(postings.offsets))[keep])
+        doc_ids.append(new_ids[keep])
+        tfs.append(postings.tfs[keep])
+        lengths.append(postings.lengths[local_ids])
+        base += len(local_ids)
+
+    terms = np.concatenate(terms)
+    # Stable, so each term's postings stay in chunk order
+    order = np.argsort(terms, kind="stable")
+    terms = terms[order]
+    unique_terms, starts = np.unique(terms, return_index=True)
+    _save_postings(prefix, unique_terms, np.append(starts, len(terms)).astype("int64"),
+                   np.concatenate(doc_ids)[order].astype("int32"), np.concatenate(tfs)[order],
+                   np.concatenate(lengths))
+
+
+def _save_postings(prefix: str, terms, offsets, doc_ids, tfs, lengths):
+    # Old segments get their postings built on first load, possibly by several workers at once
+    # Named after the segment, so remove_orphans() leaves it alone while it's being written
+    with tempfile.NamedTemporaryFile(delete=False, dir=os.path.dirname(prefix) or None,
+                                     prefix=os.path.basename(prefix) + ".", suffix=".tmp") as tmp:
+        np.savez(tmp, terms=terms, offsets=offsets, doc_ids=doc_ids, tfs=tfs, lengths=lengths)
+    os.replace(tmp.name, prefix + POSTINGS_EXT)
+
+
+class SegmentPostings:
+    """
+    One segment's inverted index: sorted term hashes with CSR-style postings.
+
+    A compacted segment whose documents were partly deleted is searched
+    through restrict(), which hides the dead chunks without rewriting the
+    postings.
+    """
+
+    def __init__(self, prefix: str):
+        with np.load(prefix + POSTINGS_EXT) as data:
+            self.terms = data["terms"]
+            self.offsets = data["offsets"]
+            self.doc_ids = data["doc_ids"]
+            self.tfs = data["tfs"]
+            self.lengths = data["lengths"]
+        self.live = None  # bool per chunk, None when every chunk is live
+        self.live_count = len(self.lengths)
+        self.total_length = float(self.lengths.sum())
+
+    def restrict(self, local_ids) -> "SegmentPostings":
+        """A view of these postings limited to the given local chunk ids; the arrays are shared."""
+        if len(local_ids) == len(self.lengths):
+            return self
+        view = copy.copy(self)
+        view.live = np.zeros(len(self.lengths), dtype=bool)
+        view.live[local_ids] = True
+        view.live_count = len(local_ids)
+        view.total_length = float(self.lengths[local_ids].sum())
+        return view
+
+    def __len__(self):
+        return self.live_count
+
+    @property
+    def nbytes(self) -> int:
+        arrays = (self.terms, self.offsets, self.doc_ids, self.tfs, self.lengths)
+        return sum(a.nbytes for a in arrays) + (self.live.nbytes if self.live is not None else 0)
+
+    def lookup(self, terms: np.ndarray):
+        """
+        Postings of several term hashes with one binary search over the
+        segment's terms: [(index into terms, local chunk ids, term frequencies)]
+        for the terms found.
+        """
+        positions = np.searchsorted(self.terms, terms)
+        found = []
+        for i, pos in enumerate(positions.tolist()):
+            if pos == len(self.terms) or self.terms[pos] != terms[i]:
+                continue
+            start, end = self.offsets[pos], self.offsets[pos + 1]
+            doc_ids, tfs = self.doc_ids[start:end], self.tfs[start:end]
+            if self.live is not None:
+                keep = self.live[doc_ids]
+                doc_ids, tfs = doc_ids[keep], tfs[keep]
+                if not len(doc_ids):
+                    continue
+            found.append((i, doc_ids, tfs))
+        return found
+
+
+class LexicalIndex:
+    """
+    BM25 over the live segments of a store, keyed by the same global ids as FAISS.
+
+    Each segment's postings are written once at ingest (see VectorStore.append)
+    and merged into one set when segments are compacted, so keeping the index
+    current is just adding and dropping segments, like ChunkStore. Document frequencies and the average length are summed over
+    the live segments at query time, so deletions are reflected at once.
+    """
+
+    def __init__(self, k1: float = BM25_K1, b: float = BM25_B):
+        self.k1 = k1
+        self.b = b
+        # ([(start_id, SegmentPostings)], chunk count, total length), replaced as one object
+        self._view = ([], 0, 0.0)
+
+    def update(self, added=(), removed=()):
+        removed = set(removed)
+        segments = [s for s in self._view[0] if s[0] not in removed] + list(added)
+        self._view = (segments, sum(len(p) for _, p in segments), sum(p.total_length for _, p in segments))
+
+    def __len__(self):
+        return self._view[1]
+
+    @property
+    def nbytes(self) -> int:
+        return sum(p.nbytes for _, p in self._view[0])
+
+    def search(self, query: str, k: int):
+        """Return (ids, scores) of the k best BM25 matches, best first."""
+        segments, count, total_length = self._view
+        terms = np.array(sorted({term_hash(term) for term in tokenize(query)}), dtype="uint64")
+        if not count or not len(terms):
+            return [], []
+        avg_length = total_length / count or 1.0
+
+        # One lookup of all the query's terms per segment; after a compaction there are only a few
+        matches = [[] for _ in range(len(terms))]
+        for start_id, postings in segments:
+            for i, doc_ids, tfs in postings.lookup(terms):
+                matches[i].append((start_id, postings, doc_ids, tfs))
+        matches_by_term = []
+        for term_matches in matches:
+            df = sum(len(doc_ids) for _, _, doc_ids, _ in term_matches)
+            if df:
+                matches_by_term.append((df, term_matches))
+        selective = [m for m in matches_by_term if m[0] <= BM25_MAX_DF_RATIO * count]
+        # A query of nothing but common words still gets scored on them
+        matches_by_term = selective or matches_by_term
+
+        ids, scores = [], []
+        for df, matches in matches_by_term:
+            idf = math.log(1 + (count - df + 0.5) / (df + 0.5))
+            for start_id, postings, doc_ids, tfs in matches:
+                norm = self.k1 * (1 - self.b + self.b * postings.lengths[doc_ids] / avg_length)
+                ids.append(doc_ids.astype("int64") + start_id)
+                scores.append(idf * tfs * (self.k1 + 1) / (tfs + norm))
+        if not ids:
+            return [], []
+
+        ids, scores = np.concatenate(ids), np.concatenate(scores)
+        low = int(ids.min())
+        span = int(ids.max()) - low + 1
+        if span <= 4 * len(ids) + 1024:
+            # Sum per chunk into a dense array over the id range: no sort, unlike np.unique
+            totals = np.bincount(ids - low, weights=scores, minlength=span)
+            candidates = np.flatnonzero(totals)
+            unique_ids, totals = candidates + low, totals[candidates]
+        else:
+            unique_ids, inverse = np.unique(ids, return_inverse=True)
+            totals = np.bincount(inverse, weights=scores)
+        if len(totals) > k:
+            best = np.argpartition(-totals, k)[:k]
+            unique_ids, totals = unique_ids[best], totals[best]
+        top = np.argsort(-totals, kind="stable")
+        return unique_ids[top].tolist(), totals[top].tolist()
+
+
+def fuse_rrf(dense_ids, lexical_ids, dense_weight: float = HYBRID_DENSE_WEIGHT,
+             lexical_weight: float = HYBRID_LEXICAL_WEIGHT, k: int = RRF_K) -> list:
+    """Weighted reciprocal rank fusion of two rankings; returns [(id, score)], best first."""
+    scores = {}
+    for weight, ranking in ((dense_weight, dense_ids), (lexical_weight, lexical_ids)):
+        if not weight:
+            continue
+        for rank, chunk_id in enumerate(ranking):
+            if chunk_id >= 0:
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + weight / (k + rank + 1)
+    return sorted(scores.items(), key=lambda item: -item[1])
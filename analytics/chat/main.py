@@ -1,26 +1,43 @@
 # main.py
 from fastapi import FastAPI, UploadFile, File, Form, Depends
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from typing import List, Optional
 from models import QuestionPayload
-from docs_to_chunks import process_uploaded_files, process_plain_text
-from web_scraper import process_url_content
-from faiss_index import create_index, load_index_and_chunks
-from gemini_flash import get_llm_response
+from docs_to_chunks import spool_upload
+from faiss_index import index_manager
+from shards import shard_cache, shard_store, shard_root, user_shard, SHARED_SHARD
+import embedding_service
+from query_batcher import query_batcher
+from conversation_memory import conversation_memory
+from answer_cache import answer_cache
+from context_assembler import context_assembler
+import executors
+from executors import run_io, run_llm, stream_llm
+from jobs import job_queue, UPLOAD_SPOOL_DIR
+import job_worker
+from gemini_flash import get_llm_response, stream_llm_response
 from sqlalchemy.orm import Session
-from database import get_db
-from chat_history import store_document  # Services to store chat history & documents
+from database import get_db, SessionLocal
 from models import ChatHistory
+from rollups import count_message
 from datetime import datetime
+from collections import deque
+import os
+import json
+import time
+import shared  # puts analytics/ on sys.path for timing.py, telemetry.py and metrics.py
+from timing import RequestTimings, TimingMiddleware, phase, set_user
+from telemetry import TelemetryWriter
+from metrics import registry, CONTENT_TYPE
 
 app = FastAPI(
     title="Document Intelligence API",
     description="An API to upload documents, text, URLs, create vector index, and ask questions using Gemini Flash model."
 )
 
-# Memory store (for now simple, in RAM)
-chat_memory = []
+# (time to first token, total) in seconds for the most recent /ask_stream calls
+stream_timings = deque(maxlen=1000)
 
 # --- CORS Middleware ---
 app.add_middleware(
@@ -31,6 +48,29 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Per-route latency histograms, written to performance_metrics/usage_stats as periodic summaries
+request_timings = RequestTimings("chat", TelemetryWriter(SessionLocal))
+app.add_middleware(TimingMiddleware, timings=request_timings)
+
+
+# Ingestion worker processes started with the API
+job_workers = []
+
+
+@app.on_event("startup")
+async def start_job_workers():
+    if job_worker.JOB_WORKERS > 0:
+        job_workers.extend(job_worker.start_workers(job_worker.JOB_WORKERS))
+
+
+@app.on_event("shutdown")
+async def stop_job_workers():
+    for process in job_workers:
+        process.terminate()
+    for process in job_workers:
+        process.join(timeout=5)
+    job_workers.clear()
+
 
 @app.post("/upload_all")
 async def upload_all(
@@ -39,88 +79,230 @@ async def upload_all(
     website_url: Optional[str] = Form(None),
     user_id: int = Form(...),  # Assuming user_id is passed in the form data
     username: str = Form(...),  # Assuming username is passed in the form data
-    db: Session = Depends(get_db)
+    # Index into the shared shard, searched for every user; named so it doesn't shadow the shared module
+    to_shared: bool = Form(False, alias="shared"),
 ):
     try:
-        responses = []
-
-        if files:
-            file_message = await process_uploaded_files(files)
-            # Store the documents in the database
-            for file in files:
-                content = await file.read()
-                doc_type = 'file'  # You can adjust this depending on the file type (text, pdf, etc.)
-                store_document(db, user_id, username, doc_type, content.decode())
-            responses.append(file_message)
-
-        if plain_text:
-            text_message = process_plain_text(plain_text)
-            # Store the document in the database
-            store_document(db, user_id, username, 'text', plain_text)
-            responses.append(text_message)
-
-        if website_url:
-            url_message = process_url_content(website_url)
-            # Store the URL content in the database
-            store_document(db, user_id, username, 'url', website_url)
-            responses.append(url_message)
-
-        if not responses:
+        if not files and not plain_text and not website_url:
             return JSONResponse(content={"error": "No input provided."}, status_code=400)
 
-        return {"message": " | ".join(responses)}
+        # Only the upload itself happens in the request; parsing, embedding and
+        # storing the documents is left to the job workers. One job per file,
+        # so the workers extract the files of one upload in parallel.
+        uploads = [await spool_upload(file, UPLOAD_SPOOL_DIR) for file in files or []]
+        common = {"user_id": user_id, "username": username,
+                  "shard": SHARED_SHARD if to_shared else user_shard(user_id)}
+        payloads = [{"files": [upload], **common} for upload in uploads]
+        if plain_text or website_url:
+            payloads.append({"files": [], "plain_text": plain_text, "website_url": website_url, **common})
+        job_ids = await run_io(job_queue.enqueue_many, "upload", payloads)
+        return {"job_ids": job_ids, "status": "queued"}
 
     except Exception as e:
         return JSONResponse(content={"error": str(e)}, status_code=500)
 
 
 @app.post("/create_index")
-async def create_faiss_index():
+async def create_faiss_index(user_id: Optional[int] = None):
     try:
-        message = create_index()
-        return {"message": message}
+        # Compacts the user's shard, or the shared one when no user is given
+        shard = SHARED_SHARD if user_id is None else user_shard(user_id)
+        job_id = await run_io(job_queue.enqueue, "create_index", {"shard": shard})
+        return {"job_id": job_id, "status": "queued"}
     except Exception as e:
         return JSONResponse(content={"error": str(e)}, status_code=500)
 
 
+@app.get("/jobs/{job_id}")
+async def job_status(job_id: int):
+    try:
+        job = await run_io(job_queue.get, job_id)
+        if job is None:
+            return JSONResponse(content={"error": "Job not found."}, status_code=404)
+        return job
+    except Exception as e:
+        return JSONResponse(content={"error": str(e)}, status_code=500)
+
+
+@app.delete("/documents")
+async def delete_document(doc_id: str, user_id: Optional[int] = None):
+    try:
+        shard = SHARED_SHARD if user_id is None else user_shard(user_id)
+        if not os.path.isdir(shard_root(shard)):
+            return JSONResponse(content={"error": "Document not found."}, status_code=404)
+        removed = await run_io(shard_store(shard).delete_document, doc_id)
+        if not removed:
+            return JSONResponse(content={"error": "Document not found."}, status_code=404)
+        return {"message": f"✅ Removed {removed} chunks of {doc_id}."}
+    except Exception as e:
+        return JSONResponse(content={"error": str(e)}, status_code=500)
+
+
+@app.get("/index_status")
+async def index_status():
+    return {
+        **index_manager.stats(),
+        "embedding": embedding_service.stats(),
+        "query_batcher": query_batcher.stats(),
+        "streaming": stream_stats(),
+        "memory": conversation_memory.stats(),
+        "answer_cache": answer_cache.stats(),
+        "context": context_assembler.stats(),
+        "shards": shard_cache.stats(),
+        "executors": executors.stats(),
+        "jobs": job_queue.counts(),
+        "timing": request_timings.stats(),
+    }
+
+
+# Prometheus scrape endpoint
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return PlainTextResponse(registry.render(), media_type=CONTENT_TYPE)
+
+
+def stream_stats() -> dict:
+    if not stream_timings:
+        return {"requests": 0}
+    ttft = sorted(t[0] for t in stream_timings)
+    total = sorted(t[1] for t in stream_timings)
+    middle = len(stream_timings) // 2
+    return {
+        "requests": len(stream_timings),
+        "p50_ttft_ms": round(ttft[middle] * 1000, 1),
+        "p50_total_ms": round(total[middle] * 1000, 1),
+    }
+
+
 @app.post("/ask")
 async def ask_question(payload: QuestionPayload, db: Session = Depends(get_db)):
     try:
         question = payload.question
         user_id = payload.user_id
         username = payload.username
+        set_user(user_id, username)
 
-        index, chunks = load_index_and_chunks()
+        # Concurrent questions share one embedding call; each searches the shared shard and the user's own
+        with phase("retrieval"):
+            question_embedding, candidates, scope = await query_batcher.search(question, user_id)
 
-        # Get the LLM response
-        answer = get_llm_response(index, chunks, question, history=chat_memory)
+        # Get the LLM response, unless a near-identical question was already answered over the same shards;
+        # cached answers ignore history, so they only serve (and are only stored for) a fresh conversation
+        history = conversation_memory.history(user_id)
+        answer = answer_cache.get(question_embedding, scope) if not history else None
+        if answer is None:
+            # Drop near-duplicate chunks and fit context + history + question into the prompt budget
+            context_chunks, prompt_history = context_assembler.assemble(question, candidates, history)
+            llm_start = time.perf_counter()
+            with phase("llm"):
+                answer = await run_llm(get_llm_response, question, context_chunks, history=prompt_history)
+            if not history:
+                answer_cache.put(question_embedding, answer, scope, time.perf_counter() - llm_start)
 
-        # Save chat in chat_memory
-        chat_memory.append({
-            "user": question,
-            "assistant": answer
-        })
+        # Save chat in the user's conversation memory
+        conversation_memory.append(user_id, question, answer)
 
         # Save chat in database
-        chat_record = ChatHistory(
-            user_id=user_id,
-            username=username,
-            message=f"User: {question}\nAssistant: {answer}",
-            timestamp=str(datetime.utcnow())
-        )
-        db.add(chat_record)
-        db.commit()
-        db.refresh(chat_record)
+        with phase("db"):
+            await run_io(save_chat, db, user_id, username, question, answer)
 
         return {"answer": answer}
     except Exception as e:
         return JSONResponse(content={"error": str(e)}, status_code=500)
 
 
+def save_chat(db: Session, user_id: int, username: str, question: str, answer: str):
+    now = datetime.utcnow()
+    chat_record = ChatHistory(
+        user_id=user_id,
+        username=username,
+        message=f"User: {question}\nAssistant: {answer}",
+        timestamp=now
+    )
+    db.add(chat_record)
+    count_message(db, user_id, now)
+    db.commit()
+
+
+def _sse(data: dict, event: str = None) -> str:
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+
+@app.post("/ask_stream")
+async def ask_question_stream(payload: QuestionPayload):
+    """Same as /ask, but sends the answer as Server-Sent Events while it is generated."""
+    start = time.perf_counter()
+    set_user(payload.user_id, payload.username)
+    try:
+        with phase("retrieval"):
+            question_embedding, candidates, scope = await query_batcher.search(payload.question, payload.user_id)
+        history = conversation_memory.history(payload.user_id)
+        cached_answer = answer_cache.get(question_embedding, scope) if not history else None
+        if cached_answer is None:
+            context_chunks, prompt_history = context_assembler.assemble(payload.question, candidates, history)
+    except Exception as e:
+        return JSONResponse(content={"error": str(e)}, status_code=500)
+
+    async def cached():
+        yield cached_answer
+
+    async def events():
+        parts = []
+        first_token_at = None
+        if cached_answer is not None:
+            pieces = cached()
+        else:
+            # The blocking LLM stream runs on the LLM pool, not on the event loop
+            pieces = stream_llm(lambda: stream_llm_response(payload.question, context_chunks,
+                                                            history=prompt_history))
+        llm_start = time.perf_counter()
+        try:
+            with phase("llm"):
+                async for text in pieces:
+                    if first_token_at is None:
+                        first_token_at = time.perf_counter()
+                    parts.append(text)
+                    yield _sse({"token": text})
+        except Exception as e:
+            yield _sse({"error": str(e)}, event="error")
+            return
+
+        # Cost the answer by LLM time only, as /ask does
+        llm_seconds = time.perf_counter() - llm_start
+        answer = "".join(parts).strip()
+        if cached_answer is None and not history:
+            answer_cache.put(question_embedding, answer, scope, llm_seconds)
+        conversation_memory.append(payload.user_id, payload.question, answer)
+
+        # The request-scoped session is gone once streaming starts, so use a fresh one
+        try:
+            db = SessionLocal()
+            try:
+                with phase("db"):
+                    await run_io(save_chat, db, payload.user_id, payload.username, payload.question, answer)
+            finally:
+                db.close()
+        except Exception as e:
+            # The answer is already out; tell the client it wasn't saved instead of cutting the stream
+            yield _sse({"error": f"Failed to save chat: {e}"}, event="error")
+            return
+
+        end = time.perf_counter()
+        ttft = (first_token_at or end) - start
+        stream_timings.append((ttft, end - start))
+        yield _sse({"ttft_ms": round(ttft * 1000, 1), "total_ms": round((end - start) * 1000, 1)}, event="done")
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
 @app.post("/clear_memory")
-async def clear_memory():
+async def clear_memory(user_id: Optional[int] = None):
     try:
-        chat_memory.clear()
+        conversation_memory.clear(user_id)
+        if user_id is not None:
+            return {"message": f"✅ Chat memory of user {user_id} has been cleared successfully."}
         return {"message": "✅ Chat memory has been cleared successfully."}
     except Exception as e:
         return JSONResponse(content={"error": str(e)}, status_code=500)
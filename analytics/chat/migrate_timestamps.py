@@ -0,0 +1,174 @@
+# migrate_timestamps.py
+"""
+Convert chat_history.timestamp and documents.timestamp from strings to DATETIME.
+
+Each table gets a nullable timestamp_dt column, filled in id-ordered batches
+of short transactions (both string formats writers have used are parsed).
+Once it has caught up, the columns are swapped by renaming, which only
+touches table metadata: timestamp becomes the DATETIME column and the old
+strings stay in timestamp_str until --drop-old. Rows written during the
+swap are converted afterwards. Finally an index on (user_id, timestamp) is
+built, online where the database supports it. Every step checks the
+schema first, so the tool can be re-run after an interruption.
+
+    python migrate_timestamps.py --batch-size 10000 --pause-ms 50
+"""
+import argparse
+import time
+from datetime import datetime
+from sqlalchemy import MetaData, Table, DateTime, inspect, select, update, bindparam, text
+
+TABLES = ("chat_history", "documents")
+COLUMN = "timestamp"
+SHADOW_COLUMN = "timestamp_dt"
+OLD_COLUMN = "timestamp_str"
+
+
+def parse_timestamp(value):
+    # str(datetime.utcnow()) in main.py, "%Y-%m-%d %H:%M:%S" in chat_history.py
+    if value is None or isinstance(value, datetime):
+        return value
+    try:
+        return datetime.fromisoformat(value.strip())
+    except ValueError:
+        return None
+
+
+def index_name(table: str) -> str:
+    return f"ix_{table}_user_id_timestamp"
+
+
+def _columns(engine, table: str) -> dict:
+    return {c["name"]: c["type"] for c in inspect(engine).get_columns(table)}
+
+
+def _quote(engine, name: str) -> str:
+    return engine.dialect.identifier_preparer.quote(name)
+
+
+def add_shadow_column(engine, table: str):
+    # The dialect's own DateTime type: DATETIME on MySQL/SQLite, TIMESTAMP WITHOUT TIME ZONE on PostgreSQL
+    column_type = DateTime().compile(dialect=engine.dialect)
+    with engine.begin() as connection:
+        connection.execute(text(f"ALTER TABLE {_quote(engine, table)} ADD COLUMN {SHADOW_COLUMN} {column_type} NULL"))
+    print(f"✅ Added {table}.{SHADOW_COLUMN}")
+
+
+def convert(engine, table: str, source: str, target: str, after_id: int = 0, batch_size: int = 10000,
+            pause: float = 0.0) -> int:
+    """
+    Parse source into target for rows with id > after_id whose target is still
+    NULL, one short transaction per batch. Returns the last id visited.
+    """
+    t = Table(table, MetaData(), autoload_with=engine)
+    set_target = update(t).where(t.c.id == bindparam("_id")).values({target: bindparam("_at")})
+    converted = unreadable = 0
+    start = time.perf_counter()
+    while True:
+        with engine.begin() as connection:
+            rows = connection.execute(
+                select(t.c.id, t.c[source])
+                .where(t.c.id > after_id, t.c[target].is_(None))
+                .order_by(t.c.id)
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            values = []
+            for row_id, value in rows:
+                at = parse_timestamp(value)
+                if at is None:
+                    unreadable += 1
+                else:
+                    values.append({"_id": row_id, "_at": at})
+            if values:
+                connection.execute(set_target, values)
+        converted += len(values)
+        after_id = rows[-1][0]
+        print(f"... {table}: {converted} rows converted (id {after_id}), {time.perf_counter() - start:.1f}s")
+        if pause:
+            time.sleep(pause)
+    if unreadable:
+        print(f"⚠️ {table}: {unreadable} rows have no readable {source} and stay NULL")
+    return after_id
+
+
+def swap_columns(engine, table: str):
+    quoted = _quote(engine, table)
+    column = _quote(engine, COLUMN)
+    with engine.begin() as connection:
+        if engine.dialect.name == "mysql":
+            # One statement, so no moment where the table has no timestamp column
+            connection.execute(text(f"ALTER TABLE {quoted} RENAME COLUMN {column} TO {OLD_COLUMN}, "
+                                    f"RENAME COLUMN {SHADOW_COLUMN} TO {column}"))
+        else:
+            connection.execute(text(f"ALTER TABLE {quoted} RENAME COLUMN {column} TO {OLD_COLUMN}"))
+            connection.execute(text(f"ALTER TABLE {quoted} RENAME COLUMN {SHADOW_COLUMN} TO {column}"))
+    print(f"✅ {table}.{COLUMN} is now DATETIME; the strings are kept in {OLD_COLUMN}")
+
+
+def add_index(engine, table: str):
+    name, quoted, column = index_name(table), _quote(engine, table), _quote(engine, COLUMN)
+    if engine.dialect.name == "mysql":
+        statement = f"CREATE INDEX {name} ON {quoted} (user_id, {column}) ALGORITHM=INPLACE LOCK=NONE"
+    elif engine.dialect.name == "postgresql":
+        statement = f"CREATE INDEX CONCURRENTLY {name} ON {quoted} (user_id, {column})"
+    else:
+        statement = f"CREATE INDEX {name} ON {quoted} (user_id, {column})"
+    start = time.perf_counter()
+    if engine.dialect.name == "postgresql":
+        # CONCURRENTLY can't run inside a transaction
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+            connection.execute(text(statement))
+    else:
+        with engine.begin() as connection:
+            connection.execute(text(statement))
+    print(f"✅ Built {name} in {time.perf_counter() - start:.1f}s")
+
+
+def drop_old_column(engine, table: str):
+    with engine.begin() as connection:
+        connection.execute(text(f"ALTER TABLE {_quote(engine, table)} DROP COLUMN {OLD_COLUMN}"))
+    print(f"✅ Dropped {table}.{OLD_COLUMN}")
+
+
+def migrate_table(engine, table: str, batch_size: int = 10000, pause: float = 0.0, drop_old: bool = False):
+    columns = _columns(engine, table)
+    if not isinstance(columns[COLUMN], DateTime):
+        if SHADOW_COLUMN not in columns:
+            add_shadow_column(engine, table)
+        last_id = convert(engine, table, COLUMN, SHADOW_COLUMN, 0, batch_size, pause)
+        # Catch up on rows written during the first pass, then swap
+        last_id = convert(engine, table, COLUMN, SHADOW_COLUMN, last_id, batch_size, pause)
+        swap_columns(engine, table)
+        columns = _columns(engine, table)
+    else:
+        last_id = 0  # already swapped on an earlier run; check every row once more
+    if OLD_COLUMN in columns:
+        convert(engine, table, OLD_COLUMN, COLUMN, last_id, batch_size, pause)
+
+    if index_name(table) not in {i["name"] for i in inspect(engine).get_indexes(table)}:
+        add_index(engine, table)
+    if drop_old and OLD_COLUMN in _columns(engine, table):
+        drop_old_column(engine, table)
+
+
+def migrate(engine, tables=TABLES, batch_size: int = 10000, pause_ms: float = 0, drop_old: bool = False):
+    for table in tables:
+        migrate_table(engine, table, batch_size, pause_ms / 1000, drop_old)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--batch-size", type=int, default=10000)
+    parser.add_argument("--pause-ms", type=float, default=0, help="sleep between batches to leave room for traffic")
+    parser.add_argument("--drop-old", action="store_true", help=f"drop the {OLD_COLUMN} columns afterwards")
+    parser.add_argument("--table", choices=TABLES, action="append", help="only these tables (default: both)")
+    args = parser.parse_args()
+
+    from database import engine
+    migrate(engine, args.table or TABLES, args.batch_size, args.pause_ms, args.drop_old)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,9 @@
 # models.py
 from pydantic import BaseModel
-from sqlalchemy import Column, Integer, String, ForeignKey, Text
+from sqlalchemy import Column, Integer, String, ForeignKey, Text, Date, DateTime, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
+from datetime import datetime
 from database import Base
 
 Base = declarative_base()
@@ -35,13 +36,30 @@ class ChatHistory(Base):
     user_id = Column(Integer, ForeignKey('users.id'))
     username = Column(String(50))
     message = Column(Text)
-    timestamp = Column(String(255))
+    # Was String(255) before migrate_timestamps.py
+    timestamp = Column(DateTime, default=datetime.utcnow)
 
     user = relationship('User', back_populates='chats')
 
+    __table_args__ = (Index('ix_chat_history_user_id_timestamp', 'user_id', 'timestamp'),)
+
     def __repr__(self):
         return f"<ChatHistory {self.id} - {self.username}>"
 
+# Messages per user per day, kept up to date by rollups.count_messages as chats are saved
+class DailyMessageRollup(Base):
+    __tablename__ = 'daily_message_rollups'
+
+    user_id = Column(Integer, primary_key=True, autoincrement=False)
+    day = Column(Date, primary_key=True)
+    message_count = Column(Integer, nullable=False, default=0)
+    last_activity = Column(DateTime)
+
+    __table_args__ = (Index('ix_daily_message_rollups_day', 'day'),)
+
+    def __repr__(self):
+        return f"<DailyMessageRollup {self.user_id} {self.day}: {self.message_count}>"
+
 class Document(Base):
     __tablename__ = 'documents'
 
@@ -50,10 +68,13 @@ class Document(Base):
     username = Column(String(50))
     doc_type = Column(String(50))  # 'text', 'pdf', 'url', etc.
     content = Column(Text)  # The content of the document
-    timestamp = Column(String(255))
+    # Was String(255) before migrate_timestamps.py
+    timestamp = Column(DateTime, default=datetime.utcnow)
 
     user = relationship('User', back_populates='documents')
 
+    __table_args__ = (Index('ix_documents_user_id_timestamp', 'user_id', 'timestamp'),)
+
     def __repr__(self):
         return f"<Document {self.id} - {self.username}>"
     
\ No newline at end of file
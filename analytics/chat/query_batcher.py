@@ -0,0 +1,143 @@
+# query_batcher.py
+import os
+import asyncio
+from collections import Counter, defaultdict
+import numpy as np
+from faiss_index import EmptyIndexError
+from lexical_index import fuse_rrf
+from shards import shard_cache, user_shard, SHARED_SHARD
+from embedding_service import encode
+from executors import cpu_pool
+import shared  # puts analytics/ on sys.path for metrics.py
+from metrics import registry
+
+BATCH_WINDOW_MS = float(os.getenv("ASK_BATCH_WINDOW_MS", "5"))
+BATCH_MAX_SIZE = int(os.getenv("ASK_BATCH_MAX_SIZE", "32"))
+# Candidates handed to the context assembler, which packs what fits the prompt budget
+TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "12"))
+# Depth of the dense and the BM25 ranking that go into reciprocal rank fusion
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "20"))
+
+FAISS_SEARCH_SECONDS = registry.histogram(
+    "faiss_search_seconds", "Time per batched FAISS search of one shard",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0),
+)
+
+
+class QueryBatcher:
+    """
+    Collects /ask questions that arrive within a short window and serves them
+    with one encode() call and one batched index.search() per shard: the
+    shared shard for every question, and each asking user's own shard.
+    Each shard's dense ranking is fused with its BM25 ranking, so exact terms
+    like error codes are found even when the embedding misses them.
+
+    A single worker task drains the queue; while one batch is being encoded
+    on the CPU pool the next one accumulates, so the window only adds
+    latency when the service is idle.
+    """
+
+    def __init__(self, window_ms: float = BATCH_WINDOW_MS, max_batch: int = BATCH_MAX_SIZE, k: int = TOP_K,
+                 candidates: int = HYBRID_CANDIDATES):
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self.k = k
+        self.candidates = max(k, candidates)
+        self.batch_sizes = Counter()
+        self._queue = None
+        self._worker = None
+
+    def _ensure_worker(self):
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def search(self, question: str, user_id: int):
+        """
+        Return (question embedding, top-k candidates, scope) for one question.
+        Candidates are (fused score, text, stored embedding), best first; scope
+        names the shards searched and their generations, for the answer cache.
+        """
+        self._ensure_worker()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put(((question, user_id), future))
+        return await future
+
+    def _search_batch(self, questions: list) -> list:
+        embeddings = encode([question for question, _ in questions])
+        rows_by_shard = defaultdict(list)
+        for row, (_, user_id) in enumerate(questions):
+            rows_by_shard[SHARED_SHARD].append(row)
+            rows_by_shard[user_shard(user_id)].append(row)
+
+        hits = [[] for _ in questions]  # (fused score, text, vector) from every shard searched
+        scopes = [[] for _ in questions]
+        for name, rows in rows_by_shard.items():
+            shard = shard_cache.get(name)
+            if shard is None:
+                continue
+            manager, index, chunks = shard
+            lexical = manager.lexical
+            with FAISS_SEARCH_SECONDS.time():
+                _, indices = index.search(np.ascontiguousarray(embeddings[rows]), self.candidates)
+            for row, dense_ids in zip(rows, indices.tolist()):
+                scopes[row].append((name, manager.generation))
+                lexical_ids, _ = lexical.search(questions[row][0], self.candidates)
+                # Ids of deleted documents can linger in the index until the next compaction
+                fused = [(i, score) for i, score in fuse_rrf(dense_ids, lexical_ids) if i in chunks][:self.k]
+                hits[row].extend((score, chunks[i], chunks.vector(i)) for i, score in fused)
+
+        results = []
+        for embedding, row_hits, scope in zip(embeddings, hits, scopes):
+            if not scope:
+                results.append(EmptyIndexError("No documents have been indexed yet."))
+                continue
+            row_hits.sort(key=lambda hit: -hit[0])
+            results.append((embedding, row_hits[:self.k], tuple(scope)))
+        return results
+
+    async def _next_batch(self) -> list:
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.window
+        while len(batch) < self.max_batch:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._next_batch()
+            self.batch_sizes[len(batch)] += 1
+            try:
+                results = await loop.run_in_executor(cpu_pool, self._search_batch, [q for q, _ in batch])
+                for (_, future), result in zip(batch, results):
+                    if future.done():
+                        continue
+                    if isinstance(result, Exception):
+                        future.set_exception(result)
+                    else:
+                        future.set_result(result)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def stats(self) -> dict:
+        batches = sum(self.batch_sizes.values())
+        questions = sum(size * count for size, count in self.batch_sizes.items())
+        return {
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "batches": batches,
+            "mean_batch_size": round(questions / batches, 2) if batches else None,
+            "batch_size_histogram": dict(sorted(self.batch_sizes.items())),
+        }
+
+
+query_batcher = QueryBatcher()
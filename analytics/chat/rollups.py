@@ -0,0 +1,49 @@
+# rollups.py
+from datetime import datetime
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from models import DailyMessageRollup
+
+
+def _upsert(dialect: str, table):
+    """INSERT ... that adds to the counts of (user_id, day) rows that already exist."""
+    if dialect == "mysql":
+        from sqlalchemy.dialects.mysql import insert
+        stmt = insert(table)
+        return stmt.on_duplicate_key_update(
+            message_count=table.c.message_count + stmt.inserted.message_count,
+            last_activity=func.greatest(table.c.last_activity, stmt.inserted.last_activity),
+        )
+    if dialect in ("postgresql", "sqlite"):
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+            latest = func.greatest
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+            latest = func.max  # two-argument max() is SQLite's greatest()
+        stmt = insert(table)
+        return stmt.on_conflict_do_update(
+            index_elements=[table.c.user_id, table.c.day],
+            set_={
+                "message_count": table.c.message_count + stmt.excluded.message_count,
+                "last_activity": latest(table.c.last_activity, stmt.excluded.last_activity),
+            },
+        )
+    raise NotImplementedError(f"No rollup upsert for the {dialect} dialect")
+
+
+def count_messages(db: Session, rows, table=DailyMessageRollup.__table__):
+    """
+    Add (user_id, day, message_count, last_activity) rows to the daily rollup
+    (or a table shaped like it) in db's current transaction; commit it
+    together with the chats they count.
+    """
+    rows = [{"user_id": user_id, "day": day, "message_count": count, "last_activity": last}
+            for user_id, day, count, last in rows]
+    if rows:
+        db.execute(_upsert(db.get_bind().dialect.name, table), rows)
+
+
+def count_message(db: Session, user_id: int, at: datetime):
+    """Count one chat message saved at `at`."""
+    count_messages(db, [(user_id, at.date(), 1, at)])
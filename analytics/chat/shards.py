@@ -0,0 +1,106 @@
+# shards.py
+import os
+import threading
+from collections import OrderedDict
+from vector_store import VectorStore, vector_store, VECTOR_DB_DIR
+from faiss_index import IndexManager, EmptyIndexError, index_manager
+import shared  # puts analytics/ on sys.path for metrics.py
+from metrics import registry
+
+SHARD_DIR = os.path.join(VECTOR_DB_DIR, "shards")
+SHARED_SHARD = "shared"
+# Estimated FAISS memory the resident user shards may take before the least recently used is dropped
+SHARD_CACHE_MAX_MB = float(os.getenv("SHARD_CACHE_MAX_MB", "2048"))
+
+
+def user_shard(user_id: int) -> str:
+    return f"user_{int(user_id)}"
+
+def shard_root(name: str) -> str:
+    # The shared shard is the original vector_db, so documents indexed before sharding stay visible to everyone
+    return VECTOR_DB_DIR if name == SHARED_SHARD else os.path.join(SHARD_DIR, name)
+
+def shard_store(name: str) -> VectorStore:
+    """VectorStore to write a shard's documents to, created on first use."""
+    return vector_store if name == SHARED_SHARD else VectorStore(shard_root(name))
+
+
+class ShardCache:
+    """
+    LRU of per-user IndexManagers, bounded by their estimated index memory.
+
+    Every user's documents live in their own shard under vector_db/shards,
+    so a search only scans the caller's vectors plus the shared shard, which
+    is pinned. A shard is loaded on first use and dropped when the resident
+    shards exceed max_mb; its chunk files are memory-mapped and don't count.
+    """
+
+    def __init__(self, max_mb: float = SHARD_CACHE_MAX_MB):
+        self.max_bytes = max_mb * 1024 * 1024
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._managers = OrderedDict()  # shard name -> IndexManager
+        self._sizes = {}  # shard name -> estimated bytes at last use
+
+    def _manager(self, name: str):
+        if name == SHARED_SHARD:
+            return index_manager
+        with self._lock:
+            manager = self._managers.get(name)
+            if manager is not None:
+                self.hits += 1
+                self._managers.move_to_end(name)
+                return manager
+            root = shard_root(name)
+            if not os.path.isdir(root):
+                return None  # user hasn't uploaded anything
+            self.misses += 1
+            manager = IndexManager(VectorStore(root))
+            self._managers[name] = manager
+            return manager
+
+    def _evict(self, keep: str):
+        while sum(self._sizes.values()) > self.max_bytes and len(self._managers) > 1:
+            name = next(iter(self._managers))
+            if name == keep:
+                self._managers.move_to_end(name)
+                continue
+            del self._managers[name]
+            self._sizes.pop(name, None)
+            self.evictions += 1
+
+    def get(self, name: str):
+        """Return (manager, index, chunks) for a shard, or None if it has no documents."""
+        manager = self._manager(name)
+        if manager is None:
+            return None
+        try:
+            index, chunks = manager.get()
+        except EmptyIndexError:
+            return None
+        if name != SHARED_SHARD:
+            with self._lock:
+                if name in self._managers:
+                    self._sizes[name] = manager.memory_bytes()
+                    self._evict(keep=name)
+        return manager, index, chunks
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "resident": len(self._managers),
+            "resident_mb": round(sum(self._sizes.values()) / (1024 * 1024), 1),
+            "max_mb": self.max_bytes / (1024 * 1024),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else None,
+            "evictions": self.evictions,
+        }
+
+
+shard_cache = ShardCache()
+
+registry.gauge("shard_cache_resident_bytes", "Estimated memory of the resident user shards",
+               function=lambda: sum(list(shard_cache._sizes.values())))
@@ -0,0 +1,9 @@
+# shared.py
+# metrics.py and timing.py are shared with the auth and analytics services and live
+# one level up, in analytics/. Import this module before them to make them importable.
+import os
+import sys
+
+ANALYTICS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ANALYTICS_DIR not in sys.path:
+    sys.path.append(ANALYTICS_DIR)
@@ -0,0 +1,108 @@
+# test_ask_stream.py
+"""
+/ask_stream end to end with the fake LLM backend and a stubbed retrieval.
+
+    LLM_BACKEND=fake python -m pytest test_ask_stream.py
+"""
+import os
+import json
+import asyncio
+
+os.environ["LLM_BACKEND"] = "fake"
+os.environ["JOB_WORKERS"] = "0"  # no ingestion workers on startup
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+import main
+from conversation_memory import conversation_memory
+
+
+class _Session:
+    def close(self):
+        pass
+
+
+def parse_events(body: str) -> list:
+    """[(event name, data)] of a Server-Sent Events body; unnamed events are "message"."""
+    events = []
+    for block in body.strip().split("\n\n"):
+        event, data = "message", None
+        for line in block.split("\n"):
+            if line.startswith("event: "):
+                event = line[len("event: "):]
+            elif line.startswith("data: "):
+                data = json.loads(line[len("data: "):])
+        events.append((event, data))
+    return events
+
+
+@pytest.fixture
+def client(monkeypatch):
+    rng = np.random.default_rng(0)
+
+    async def search(question, user_id):
+        # (question embedding, [(score, text, embedding)], scope), as QueryBatcher.search returns
+        candidates = [(1.0 / (i + 1), text, rng.random(8).astype("float32"))
+                      for i, text in enumerate(["Widgets ship in blue and red.", "Gadgets ship in green."])]
+        return rng.random(8).astype("float32"), candidates, (("test", user_id),)
+
+    saved = []
+    monkeypatch.setattr(main.query_batcher, "search", search)
+    monkeypatch.setattr(main, "SessionLocal", _Session)
+    monkeypatch.setattr(main, "save_chat", lambda db, user_id, username, question, answer:
+                        saved.append((user_id, question, answer)))
+    with TestClient(main.app) as test_client:
+        test_client.saved = saved
+        yield test_client
+
+
+def ask(client, user_id: int, question: str = "What colours do widgets ship in?"):
+    conversation_memory.clear(user_id)
+    response = client.post("/ask_stream", json={"question": question, "user_id": user_id, "username": "test"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    return parse_events(response.text)
+
+
+def test_streams_tokens_then_done_and_saves_the_chat(client):
+    events = ask(client, 9001)
+
+    tokens = [data["token"] for event, data in events if event == "message"]
+    assert tokens
+    assert events[-1][0] == "done"
+    assert {"ttft_ms", "total_ms"} <= events[-1][1].keys()
+
+    answer = "".join(tokens).strip()
+    assert client.saved == [(9001, "What colours do widgets ship in?", answer)]
+    assert conversation_memory.history(9001)[-1]["assistant"] == answer
+
+
+def test_save_failure_is_reported_as_an_error_event(client, monkeypatch):
+    def save_chat(*args):
+        raise RuntimeError("database is down")
+
+    monkeypatch.setattr(main, "save_chat", save_chat)
+    events = ask(client, 9002, "How do gadgets ship?")
+
+    assert [data["token"] for event, data in events if event == "message"]
+    assert events[-1][0] == "error"
+    assert "database is down" in events[-1][1]["error"]
+
+
+def test_cached_answer_costs_the_llm_time_only(client, monkeypatch):
+    search = main.query_batcher.search
+
+    async def slow_search(question, user_id):
+        await asyncio.sleep(0.3)
+        return await search(question, user_id)
+
+    costs = []
+    monkeypatch.setattr(main.query_batcher, "search", slow_search)
+    monkeypatch.setattr(main.answer_cache, "get", lambda embedding, scope: None)
+    monkeypatch.setattr(main.answer_cache, "put", lambda embedding, answer, scope, cost: costs.append(cost))
+    events = ask(client, 9003, "Which colours do gadgets come in?")
+
+    assert events[-1][0] == "done"
+    assert len(costs) == 1 and costs[0] < 0.3 <= events[-1][1]["total_ms"] / 1000
@@ -0,0 +1,86 @@
+# test_chunking.py
+"""
+Properties of iter_chunks() / chunk_text(): offsets, coverage, sizes and
+page numbers, including empty and whitespace-only pages.
+
+    python -m pytest test_chunking.py
+"""
+import json
+import os
+import random
+import pytest
+import fitz  # PyMuPDF
+from chunking import iter_chunks, chunk_text
+from docs_to_chunks import extract_chunks_to_file
+
+WORDS = ["alpha", "beta", "gamma", "delta", "E-1042", "v2.3.1", "(see note)", "\"quoted.\"", "end."]
+
+
+def random_page(rng: random.Random, words: int) -> str:
+    parts = []
+    for _ in range(words):
+        parts.append(rng.choice(WORDS))
+        parts.append(rng.choice([" ", " ", " ", ". ", "\n", "\n\n", "  \t"]))
+    return "".join(parts)
+
+
+@pytest.mark.parametrize("text", ["", " ", "\n", "\n\n\n", " \t \n ", "."])
+def test_empty_and_whitespace_text(text):
+    assert chunk_text(text) == ([text.strip()] if text.strip() else [])
+
+
+@pytest.mark.parametrize("pages", [["", "", "Intro text here."], [" ", "\n", "Intro text here.", ""],
+                                   ["\n\n", "Intro text here.", "   "]])
+def test_blank_pages_are_skipped_and_pages_numbered(pages):
+    chunks = list(iter_chunks(pages))
+    assert [c.text for c in chunks] == ["Intro text here."]
+    assert chunks[0].page == pages.index("Intro text here.") + 1
+    assert "\n".join(pages)[chunks[0].offset:].startswith("Intro text here.")
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_offsets_coverage_sizes_and_pages(seed):
+    rng = random.Random(seed)
+    pages = [random_page(rng, rng.randint(0, 400)) if rng.random() > 0.2 else rng.choice(["", " ", "\n"])
+             for _ in range(rng.randint(1, 6))]
+    size, overlap = rng.choice([(80, 0), (200, 20), (500, 50)])
+    document = "\n".join(pages)
+    page_starts, position = [], 0
+    for page in pages:
+        page_starts.append(position)
+        position += len(page) + 1
+
+    chunks = list(iter_chunks(pages, "doc", size=size, overlap=overlap))
+    covered = [False] * len(document)
+    previous_offset = -1
+    for chunk in chunks:
+        assert chunk.source == "doc"
+        assert 0 < len(chunk.text) <= size
+        assert chunk.text == chunk.text.strip()
+        assert document[chunk.offset:chunk.offset + len(chunk.text)] == chunk.text
+        assert chunk.offset > previous_offset
+        previous_offset = chunk.offset
+        assert chunk.page == max(i for i, start in enumerate(page_starts) if start <= chunk.offset) + 1
+        covered[chunk.offset:chunk.offset + len(chunk.text)] = [True] * len(chunk.text)
+    # Every non-whitespace character ends up in some chunk
+    assert all(covered[i] for i, c in enumerate(document) if not c.isspace())
+    # Pages given one by one chunk like the joined document
+    assert [c.text for c in chunks] == chunk_text(document, size=size, overlap=overlap)
+
+
+def test_pdf_with_blank_leading_pages(tmp_path):
+    path = str(tmp_path / "blank_first.pdf")
+    pdf = fitz.open()
+    pdf.new_page()
+    pdf.new_page()
+    pdf.new_page().insert_text((72, 72), "Intro text here. The manual starts on page three.")
+    pdf.save(path)
+
+    chunk_path = extract_chunks_to_file(path, ".pdf", source="file:blank_first.pdf")
+    try:
+        with open(chunk_path, "r", encoding="utf-8") as f:
+            rows = [json.loads(line) for line in f]
+    finally:
+        os.remove(chunk_path)
+    assert [(text, page) for text, page, _ in rows] == [
+        ("Intro text here. The manual starts on page three.", 3)]
@@ -0,0 +1,93 @@
+# test_index_delete.py
+"""
+Search after deleting a document, for every index type create_index() can
+build, compared with exact search over the vectors that are still live.
+
+    python -m pytest test_index_delete.py
+"""
+import functools
+import os
+import numpy as np
+import pytest
+import faiss_index
+from faiss_index import IndexManager, create_index
+from vector_store import VectorStore
+
+DOCS = 5
+PER_DOC = 600
+DIM = 32
+
+
+def live_vectors(store: VectorStore):
+    ids, vectors = [], []
+    for segment in store.segments():
+        embeddings, _ = store.load_segment(segment)
+        ids.append(store.segment_ids(segment))
+        vectors.append(embeddings)
+    return np.concatenate(ids), np.concatenate(vectors).astype("float32")
+
+
+@pytest.mark.parametrize("index_type", ["flat", "ivf", "ivfpq", "hnsw"])
+def test_search_after_delete_matches_exact_search(tmp_path, monkeypatch, index_type):
+    # Few PQ sub-quantizers keep training fast; the id handling is the same
+    monkeypatch.setattr(faiss_index, "build_index",
+                        functools.partial(faiss_index.build_index, index_type=index_type, pq_m=4))
+    rng = np.random.default_rng(0)
+    store = VectorStore(str(tmp_path))
+    for d in range(DOCS):
+        store.append(f"d{d}", [f"d{d} chunk {i}" for i in range(PER_DOC)], rng.random((PER_DOC, DIM)))
+    create_index(store)
+    manager = IndexManager(store)
+    manager.get()
+
+    deleted = {int(i) for i in store.segment_ids(store.segments()[0])[:PER_DOC]}
+    assert store.delete_document("d0") == PER_DOC
+    index, chunks = manager.get()
+
+    ids, vectors = live_vectors(store)
+    assert not deleted & set(ids.tolist())
+    queries = rng.choice(len(ids), 200, replace=False)
+    _, found = index.search(vectors[queries], 10)
+
+    # The exact nearest live vector of a stored vector is itself
+    hits = [ids[q] in row for q, row in zip(queries, found.tolist())]
+    assert np.mean(hits) >= (1.0 if index_type in ("flat", "ivf") else 0.9)
+    # Whatever the index returns maps to a live chunk (HNSW can't remove; chunk lookup filters it)
+    for row in found.tolist():
+        returned = [i for i in row if i in chunks]
+        if index_type != "hnsw":
+            assert returned == row
+        assert not any(chunks[i].startswith("d0 ") for i in returned)
+
+
+def test_incremental_segments_and_deletes_before_compaction(tmp_path):
+    rng = np.random.default_rng(1)
+    store = VectorStore(str(tmp_path))
+    manager = IndexManager(store)
+    for d in range(3):
+        store.append(f"d{d}", [f"d{d} chunk {i}" for i in range(50)], rng.random((50, DIM)))
+    index, chunks = manager.get()
+    assert index.ntotal == 150 and len(chunks) == 150
+
+    store.delete_document("d1")
+    index, chunks = manager.get()
+    ids, vectors = live_vectors(store)
+    assert index.ntotal == 100 and len(chunks) == 100
+    _, found = index.search(vectors, 1)
+    assert found[:, 0].tolist() == ids.tolist()
+    assert chunks[int(ids[-1])] == "d2 chunk 49"
+
+
+def test_snapshot_is_published_as_one_pair(tmp_path):
+    rng = np.random.default_rng(2)
+    store = VectorStore(str(tmp_path))
+    manager = IndexManager(store)
+    for n in range(3):
+        store.append(f"r{n}", [f"r{n} chunk {i}" for i in range(40)], rng.random((40, DIM)))
+        create_index(store)
+        index, chunks = manager.get()
+        # The index and the segment list it was loaded with describe the same vectors
+        assert index.ntotal == len(chunks) == 40 * (n + 1)
+        assert len(manager._segments) == 1
+    # The current index file and the one before it; older ones are pruned
+    assert len([f for f in os.listdir(tmp_path) if f.startswith("index-")]) == 2
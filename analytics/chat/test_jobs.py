@@ -0,0 +1,64 @@
+# test_jobs.py
+"""
+The ingestion job queue and the worker's handling of failures.
+
+    python -m pytest test_jobs.py
+"""
+import pytest
+import job_worker
+import jobs
+from jobs import JobQueue
+from vector_store import VectorStore
+
+
+@pytest.fixture
+def queue(tmp_path, monkeypatch):
+    queue = JobQueue(str(tmp_path / "jobs.sqlite"))
+    monkeypatch.setattr(job_worker, "job_queue", queue)
+    return queue
+
+
+def test_create_index_on_an_empty_shard_fails_without_retrying(queue, tmp_path, monkeypatch):
+    monkeypatch.setattr(job_worker, "shard_store", lambda shard: VectorStore(str(tmp_path / "shard")))
+    job_id = queue.enqueue("create_index", {"shard": "user-1"})
+
+    assert job_worker.run_one()
+    job = queue.get(job_id)
+    assert (job["status"], job["attempts"]) == ("failed", 1)
+    assert "No documents" in job["error"]
+    assert not job_worker.run_one()
+
+
+def test_other_failures_are_retried_until_attempts_run_out(queue):
+    job_id = queue.enqueue("create_index", {"shard": "user-1"}, max_attempts=2)
+    job = queue.claim()
+    assert queue.fail(job_id, job["attempt"], "boom")
+    assert queue.get(job_id)["status"] == "queued"
+
+
+def test_an_expired_lease_moves_the_job_to_another_worker(queue, monkeypatch):
+    job_id = queue.enqueue("upload", {"files": []})
+    first = queue.claim()
+    assert queue.claim() is None  # leased to the first worker
+    assert queue.update_progress(job_id, {"files_done": 0}, first["attempt"])
+
+    monkeypatch.setattr(jobs, "JOB_LEASE_SECONDS", -1)  # every running job has stopped heartbeating
+    second = queue.claim()
+    assert (second["id"], second["attempt"]) == (job_id, 2)
+    # The first worker lost its lease: its progress and result are not written
+    assert not queue.update_progress(job_id, {"files_done": 1}, first["attempt"])
+    assert not queue.complete(job_id, first["attempt"], "stale")
+    assert queue.fail(job_id, first["attempt"], "stale")  # runs on with the second worker
+    assert queue.complete(job_id, second["attempt"], "done")
+    assert (queue.get(job_id)["status"], queue.get(job_id)["result"]) == ("done", "done")
+
+
+def test_an_expired_lease_on_the_last_attempt_fails_the_job(queue, monkeypatch):
+    job_id = queue.enqueue("upload", {"files": [{"path": "spooled.pdf"}]}, max_attempts=1)
+    queue.claim()
+    monkeypatch.setattr(jobs, "JOB_LEASE_SECONDS", -1)
+    assert queue.claim() is None
+    assert queue.fail_expired() == [{"files": [{"path": "spooled.pdf"}]}]
+    job = queue.get(job_id)
+    assert job["status"] == "failed" and "heartbeating" in job["error"]
+    assert queue.fail_expired() == []
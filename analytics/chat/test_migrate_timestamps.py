@@ -0,0 +1,75 @@
+# test_migrate_timestamps.py
+"""
+migrate_timestamps.py on a SQLite copy of the old string-timestamp schema,
+including a re-run after rows were written during the swap.
+
+    python -m pytest test_migrate_timestamps.py
+"""
+from datetime import datetime
+import pytest
+from sqlalchemy import DateTime, MetaData, Table, create_engine, inspect, select, text
+import migrate_timestamps
+from migrate_timestamps import migrate, index_name, OLD_COLUMN
+
+OLD_SCHEMA = {
+    "chat_history": "id INTEGER PRIMARY KEY, user_id INTEGER, username VARCHAR(50), message TEXT, "
+                    "timestamp VARCHAR(255)",
+    "documents": "id INTEGER PRIMARY KEY, user_id INTEGER, username VARCHAR(50), doc_type VARCHAR(50), "
+                 "content TEXT, timestamp VARCHAR(255)",
+}
+# str(datetime.utcnow()) from main.py, strftime("%Y-%m-%d %H:%M:%S") from chat_history.py, and junk
+VALUES = ["2026-10-01 12:30:00.123456", "2026-10-02 08:00:00", "not a date", None, " 2026-10-03 07:15:00 "]
+PARSED = [datetime(2026, 10, 1, 12, 30, 0, 123456), datetime(2026, 10, 2, 8, 0), None, None,
+          datetime(2026, 10, 3, 7, 15)]
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'chat.db'}")
+    with engine.begin() as connection:
+        for table, columns in OLD_SCHEMA.items():
+            connection.execute(text(f"CREATE TABLE {table} ({columns})"))
+            for i, value in enumerate(VALUES):
+                connection.execute(text(f"INSERT INTO {table} (user_id, timestamp) VALUES (:user_id, :at)"),
+                                   {"user_id": i % 2, "at": value})
+    yield engine
+    engine.dispose()
+
+
+def timestamps(engine, table: str) -> list:
+    t = Table(table, MetaData(), autoload_with=engine)
+    with engine.connect() as connection:
+        return connection.execute(select(t.c.timestamp).order_by(t.c.id)).scalars().all()
+
+
+def test_migrates_both_tables_and_can_be_rerun(engine):
+    migrate(engine, batch_size=2)
+    for table in OLD_SCHEMA:
+        columns = {c["name"]: c["type"] for c in inspect(engine).get_columns(table)}
+        assert isinstance(columns["timestamp"], DateTime)
+        assert OLD_COLUMN in columns
+        assert timestamps(engine, table) == PARSED
+        assert index_name(table) in {i["name"] for i in inspect(engine).get_indexes(table)}
+
+    # A row written by old code during the swap only has the string; a re-run converts it
+    with engine.begin() as connection:
+        connection.execute(text(f"INSERT INTO chat_history (user_id, {OLD_COLUMN}) VALUES (1, '2026-10-04 10:00:00')"))
+    migrate(engine, batch_size=2, drop_old=True)
+    assert timestamps(engine, "chat_history") == PARSED + [datetime(2026, 10, 4, 10, 0)]
+    for table in OLD_SCHEMA:
+        assert OLD_COLUMN not in {c["name"] for c in inspect(engine).get_columns(table)}
+
+
+def test_resumes_after_an_interrupted_conversion(engine, monkeypatch):
+    convert = migrate_timestamps.convert
+
+    def interrupted(*args):
+        convert(*args)  # stopped after the first pass, with the shadow column filled but not swapped
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(migrate_timestamps, "convert", interrupted)
+    with pytest.raises(KeyboardInterrupt):
+        migrate(engine, tables=["documents"], batch_size=1)
+    monkeypatch.setattr(migrate_timestamps, "convert", convert)
+    migrate(engine, tables=["documents"])
+    assert timestamps(engine, "documents") == PARSED
@@ -0,0 +1,68 @@
+# test_rollups.py
+"""
+The daily message rollup: upserts as chats are saved and the backfill from
+chat_history, on SQLite.
+
+    python -m pytest test_rollups.py
+"""
+from collections import Counter
+from datetime import date, datetime
+import pytest
+from sqlalchemy import create_engine, inspect, select
+from sqlalchemy.orm import sessionmaker
+import backfill_rollups
+from models import Base, ChatHistory, DailyMessageRollup, User
+from rollups import count_message, count_messages
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'chat.db'}")
+    Base.metadata.create_all(engine, tables=[User.__table__, ChatHistory.__table__, DailyMessageRollup.__table__])
+    yield engine
+    engine.dispose()
+
+
+def rollup(db) -> dict:
+    rows = db.execute(select(DailyMessageRollup.user_id, DailyMessageRollup.day, DailyMessageRollup.message_count,
+                             DailyMessageRollup.last_activity)).all()
+    return {(user_id, day): (count, last) for user_id, day, count, last in rows}
+
+
+def test_counts_add_up_and_keep_the_latest_activity(engine):
+    db = sessionmaker(bind=engine)()
+    count_message(db, 1, datetime(2026, 10, 1, 9, 0))
+    count_message(db, 1, datetime(2026, 10, 1, 17, 30))
+    count_messages(db, [(1, date(2026, 10, 1), 3, datetime(2026, 10, 1, 12, 0)),
+                        (2, date(2026, 10, 1), 1, datetime(2026, 10, 1, 8, 0))])
+    count_message(db, 1, datetime(2026, 10, 2, 0, 5))
+    db.commit()
+    assert rollup(db) == {
+        (1, date(2026, 10, 1)): (5, datetime(2026, 10, 1, 17, 30)),
+        (2, date(2026, 10, 1)): (1, datetime(2026, 10, 1, 8, 0)),
+        (1, date(2026, 10, 2)): (1, datetime(2026, 10, 2, 0, 5)),
+    }
+    db.close()
+
+
+def test_backfill_replaces_the_rollup_with_counts_from_chat_history(engine, monkeypatch):
+    Session = sessionmaker(bind=engine)
+    monkeypatch.setattr(backfill_rollups, "engine", engine)
+    monkeypatch.setattr(backfill_rollups, "SessionLocal", Session)
+    chats = [(user_id, datetime(2026, 10, day, hour)) for user_id, day, hour in
+             [(1, 1, 9), (1, 1, 18), (2, 1, 7), (1, 3, 12), (2, 4, 23), (2, 4, 1), (1, 3, 8)]]
+    db = Session()
+    db.add_all([ChatHistory(user_id=user_id, username=f"u{user_id}", message="hi", timestamp=at)
+                for user_id, at in chats])
+    db.add(ChatHistory(user_id=None, username="gone", message="hi", timestamp=datetime(2026, 10, 1)))
+    count_message(db, 3, datetime(2026, 9, 30))  # stale: no such chats
+    db.commit()
+
+    backfill_rollups.backfill(batch_size=3)
+
+    counts = Counter((user_id, at.date()) for user_id, at in chats)
+    expected = {key: (count, max(at for user_id, at in chats if (user_id, at.date()) == key))
+                for key, count in counts.items()}
+    assert rollup(db) == expected
+    assert backfill_rollups.STAGING_TABLE not in inspect(engine).get_table_names()
+    db.close()
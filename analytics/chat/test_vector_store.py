@@ -0,0 +1,102 @@
+# test_vector_store.py
+"""
+Compaction of the segment store: chunks, positions, embeddings and the
+merged BM25 postings against a store built from the surviving documents.
+
+    python -m pytest test_vector_store.py
+"""
+import numpy as np
+import pytest
+import vector_store
+from lexical_index import write_postings, SegmentPostings
+from vector_store import VectorStore
+
+DIM = 8
+POSTINGS_ARRAYS = ("terms", "offsets", "doc_ids", "tfs", "lengths")
+
+
+def document(rng, doc_id: str, n: int):
+    chunks = [f"{doc_id} chunk {i} " + " ".join(rng.choice(["alpha", "beta", "gamma", "delta"], rng.integers(1, 6)))
+              for i in range(n)]
+    positions = [(i // 3 + 1, i * 100) for i in range(n)]
+    return chunks, rng.random((n, DIM)).astype("float32"), positions
+
+
+@pytest.fixture
+def store(tmp_path):
+    return VectorStore(str(tmp_path / "store"))
+
+
+def fill(store, rng, docs):
+    data = {}
+    for doc_id, n in docs:
+        data[doc_id] = document(rng, doc_id, n)
+        chunks, embeddings, positions = data[doc_id]
+        store.append(doc_id, chunks, embeddings, positions=positions)
+    return data
+
+
+def assert_compacted(store, segment, data, doc_ids, tmp_path):
+    assert store.segments() == [segment]
+    assert [d["doc_id"] for d in store.documents(segment)] == doc_ids
+    chunks = [c for doc_id in doc_ids for c in data[doc_id][0]]
+    ids = store.segment_ids(segment)
+    assert ids.tolist() == list(range(ids[0], ids[0] + len(chunks)))
+
+    embeddings, chunk_file = store.load_segment(segment)
+    rows = ids - segment["start_id"]
+    assert [chunk_file[i] for i in rows] == chunks
+    assert np.array_equal(embeddings, np.concatenate([data[doc_id][1] for doc_id in doc_ids]))
+    assert [chunk_file.position(i) for i in rows] == [p for doc_id in doc_ids for p in data[doc_id][2]]
+
+    # The CSR merge equals postings tokenized from scratch over the live chunks
+    merged = store.open_postings(segment)
+    write_postings(str(tmp_path / "expected"), chunks)
+    expected = SegmentPostings(str(tmp_path / "expected"))
+    if len(rows) == segment["count"]:
+        for name in POSTINGS_ARRAYS:
+            assert np.array_equal(getattr(merged, name), getattr(expected, name)), name
+    # Restricted to the live chunks, every term finds the same chunks either way
+    live = merged.restrict(rows)
+    found = [(i, np.searchsorted(rows, doc_ids).tolist(), tfs.tolist())
+             for i, doc_ids, tfs in live.lookup(expected.terms)]
+    assert found == [(i, doc_ids.tolist(), tfs.tolist()) for i, doc_ids, tfs in expected.lookup(expected.terms)]
+    assert len(live) == len(expected) and live.total_length == expected.total_length
+
+
+def test_compact_drops_deleted_documents(store, tmp_path):
+    data = fill(store, np.random.default_rng(0), [("a", 5), ("b", 7), ("c", 3), ("d", 6)])
+    store.delete_document("b")
+    segment = store.compact()
+    assert_compacted(store, segment, data, ["a", "c", "d"], tmp_path)
+    assert store.compact() is None  # nothing left to do
+
+
+def test_compacting_a_partly_deleted_compacted_segment(store, tmp_path):
+    rng = np.random.default_rng(1)
+    data = fill(store, rng, [("a", 4), ("b", 6), ("c", 5)])
+    store.compact()
+    store.delete_document("b")
+    data.update(fill(store, rng, [("e", 3)]))
+    segment = store.compact()
+    assert_compacted(store, segment, data, ["a", "c", "e"], tmp_path)
+    assert store.remove_orphans() > 0
+
+
+def test_documents_deleted_while_compacting_are_dropped(store, tmp_path, monkeypatch):
+    rng = np.random.default_rng(2)
+    data = fill(store, rng, [("a", 4), ("b", 6), ("c", 5)])
+    merge = vector_store.merge_postings
+
+    def merge_while_deleting(prefix, parts):
+        # Another process deletes one document and uploads another mid-compaction
+        store.delete_document("c")
+        data.update(fill(store, rng, [("f", 2)]))
+        merge(prefix, parts)
+
+    monkeypatch.setattr(vector_store, "merge_postings", merge_while_deleting)
+    segment = store.compact()
+    assert [d["doc_id"] for s in store.segments() for d in store.documents(s)] == ["a", "b", "f"]
+    monkeypatch.setattr(vector_store, "merge_postings", merge)
+    store.delete_document("f")
+    assert_compacted(store, segment, data, ["a", "b"], tmp_path)
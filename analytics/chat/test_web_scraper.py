@@ -0,0 +1,40 @@
+# test_web_scraper.py
+"""
+Conditional requests of the crawler against a mock site.
+
+    python -m pytest test_web_scraper.py
+"""
+import asyncio
+import functools
+import httpx
+import web_scraper
+from crawl_cache import CrawlCache
+
+PAGE = b"<html><body><p>Widgets ship in blue.</p></body></html>"
+
+
+def crawl(monkeypatch, cache, handler):
+    monkeypatch.setattr(web_scraper.httpx, "AsyncClient",
+                        functools.partial(httpx.AsyncClient, transport=httpx.MockTransport(handler)))
+    return asyncio.run(web_scraper.crawl_website_async("https://example.com/", max_pages=5, cache=cache))
+
+
+def test_not_modified_keeps_the_cached_validators(tmp_path, monkeypatch):
+    cache = CrawlCache(str(tmp_path / "crawl.sqlite"))
+    requests = []
+
+    def handler(request):
+        requests.append(request.headers)
+        if request.headers.get("if-none-match") == '"v1"':
+            return httpx.Response(304)  # no ETag or Last-Modified repeated
+        return httpx.Response(200, content=PAGE, headers={
+            "content-type": "text/html", "etag": '"v1"', "last-modified": "Mon, 05 Oct 2026 10:00:00 GMT"})
+
+    for expected in ("changed", "not_modified", "not_modified"):
+        pages, _ = crawl(monkeypatch, cache, handler)
+        assert [page["status"] for page in pages] == [expected]
+        cache.put_many(pages)
+        cached = cache.get("https://example.com/")
+        assert (cached["etag"], cached["last_modified"]) == ('"v1"', "Mon, 05 Oct 2026 10:00:00 GMT")
+    assert requests[-1].get("if-none-match") == '"v1"'
+    assert requests[-1].get("if-modified-since") == "Mon, 05 Oct 2026 10:00:00 GMT"
@@ -0,0 +1,290 @@
+# vector_store.py
+import os
+import json
+import pickle
+from contextlib import contextmanager
+import numpy as np
+from chunk_store import ChunkFile, write_chunks
+from lexical_index import SegmentPostings, write_postings, merge_postings, POSTINGS_EXT
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# Segments, manifest, index snapshots, job queue, caches and spooled uploads all live here
+VECTOR_DB_DIR = os.getenv("VECTOR_DB_DIR", "vector_db")
+
+
+class VectorStore:
+    """
+    Append-only segment store for chunk embeddings.
+
+    Every ingest writes one immutable segment (embeddings .npy, a chunk blob
+    and offsets, see chunk_store.py, and BM25 postings, see lexical_index.py)
+    and records it in manifest.json along with the range of global ids given
+    to its vectors, so ingest cost is proportional to the upload and the rest
+    of the corpus is never rewritten. Deleting a document only drops its
+    segments from the manifest; the files and their vectors in the index
+    snapshot are purged by the next create_index() compaction.
+
+    Compaction (compact()) rewrites the live segments into one, so the number
+    of segment files stays bounded. A compacted segment lists its documents,
+    each with its own id range; deleting one of them just drops it from that
+    list until the next compaction.
+    """
+
+    def __init__(self, root: str = VECTOR_DB_DIR):
+        self.root = root
+        self.segment_dir = os.path.join(root, "segments")
+        self.manifest_path = os.path.join(root, "manifest.json")
+        self.lock_path = os.path.join(root, ".lock")
+        self.compaction_lock_path = os.path.join(root, ".compact.lock")
+        os.makedirs(self.segment_dir, exist_ok=True)
+
+    @contextmanager
+    def _locked(self, path: str = None):
+        # Serialises manifest updates across worker processes
+        with open(path or self.lock_path, "a+") as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            else:
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+                else:
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def compacting(self):
+        """
+        Held for a whole compaction: one runs at a time, and only it removes
+        orphaned files, so it never deletes a segment another one is writing.
+        """
+        return self._locked(self.compaction_lock_path)
+
+    def _segment_path(self, name: str, ext: str) -> str:
+        return os.path.join(self.segment_dir, name + ext)
+
+    def read_manifest(self) -> dict:
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"next_id": 0, "next_seq": 1, "segments": []}
+
+    def _write_manifest(self, manifest: dict):
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, self.manifest_path)
+
+    def append(self, doc_id: str, chunks: list, embeddings, replace: bool = False, content_hash: str = None,
+               positions=None):
+        """
+        Add one document's chunks as a new segment and return its manifest entry.
+        positions optionally gives each chunk's (page, offset) in the document.
+        """
+        embeddings = np.asarray(embeddings, dtype="float32")
+        if len(chunks) != len(embeddings):
+            raise ValueError("chunks and embeddings must have the same length")
+        if not chunks:
+            return None
+
+        with self._locked():
+            manifest = self.read_manifest()
+            if replace:
+                self._drop_document(manifest, doc_id)
+
+            name = f"seg_{manifest['next_seq']:08d}"
+            np.save(self._segment_path(name, ".npy"), embeddings)
+            write_chunks(self._segment_path(name, ""), chunks, positions)
+            write_postings(self._segment_path(name, ""), chunks)
+
+            segment = {
+                "name": name,
+                "doc_id": doc_id,
+                "start_id": manifest["next_id"],
+                "count": len(chunks),
+            }
+            if content_hash:
+                segment["content_hash"] = content_hash
+            manifest["segments"].append(segment)
+            manifest["next_id"] += len(chunks)
+            manifest["next_seq"] += 1
+            self._write_manifest(manifest)
+        return segment
+
+    @staticmethod
+    def documents(segment: dict) -> list:
+        """Id ranges of a segment's documents: the segment itself, or a compacted segment's list."""
+        return segment.get("documents", [segment])
+
+    def _drop_document(self, manifest: dict, doc_id: str) -> int:
+        dropped = 0
+        segments = []
+        for segment in manifest["segments"]:
+            documents = self.documents(segment)
+            kept = [d for d in documents if d["doc_id"] != doc_id]
+            dropped += sum(d["count"] for d in documents if d["doc_id"] == doc_id)
+            if len(kept) == len(documents):
+                segments.append(segment)
+            elif kept:
+                segments.append(dict(segment, documents=kept))
+        manifest["segments"] = segments
+        return dropped
+
+    def delete_document(self, doc_id: str) -> int:
+        """Remove every segment of a document, returning the number of chunks dropped."""
+        with self._locked():
+            manifest = self.read_manifest()
+            dropped = self._drop_document(manifest, doc_id)
+            if dropped:
+                self._write_manifest(manifest)
+        return dropped
+
+    def document_hash(self, doc_id: str):
+        """Content hash recorded on the document's last segment once it was fully ingested."""
+        content_hash = None
+        for segment in self.read_manifest()["segments"]:
+            for document in self.documents(segment):
+                if document["doc_id"] == doc_id:
+                    content_hash = document.get("content_hash")
+        return content_hash
+
+    def segments(self) -> list:
+        return self.read_manifest()["segments"]
+
+    def load_segment(self, segment: dict):
+        """Embeddings of the segment's live chunks, in segment_ids() order, and its ChunkFile."""
+        embeddings = np.load(self._segment_path(segment["name"], ".npy"))
+        rows = self.segment_ids(segment) - segment["start_id"]
+        if len(rows) < len(embeddings):
+            embeddings = embeddings[rows]
+        return embeddings, self.open_chunks(segment)
+
+    def open_chunks(self, segment: dict) -> ChunkFile:
+        """Memory-map a segment's chunks, converting a pre-blob .pkl segment on first open."""
+        prefix = self._segment_path(segment["name"], "")
+        pickle_path = prefix + ".pkl"
+        if os.path.exists(pickle_path):
+            # The .pkl is only removed once the blob is complete, so waiting on the lock is enough
+            with self._locked():
+                if os.path.exists(pickle_path):
+                    with open(pickle_path, "rb") as f:
+                        write_chunks(prefix, pickle.load(f))
+                    os.remove(pickle_path)
+        return ChunkFile(prefix, self._segment_path(segment["name"], ".npy"), segment.get("doc_id"))
+
+    def open_postings(self, segment: dict) -> SegmentPostings:
+        """Load a segment's BM25 postings, building them for segments written before they existed."""
+        prefix = self._segment_path(segment["name"], "")
+        if not os.path.exists(prefix + POSTINGS_EXT):
+            write_postings(prefix, self.open_chunks(segment))
+        return SegmentPostings(prefix)
+
+    def segment_ids(self, segment: dict):
+        """Global ids of the segment's live chunks."""
+        return np.concatenate([np.arange(d["start_id"], d["start_id"] + d["count"], dtype="int64")
+                               for d in self.documents(segment)])
+
+    def compact(self):
+        """
+        Rewrite every live segment into one new segment (chunks, positions,
+        embeddings and postings) whose documents get fresh, contiguous ids.
+        Segments appended meanwhile are left alone, and documents deleted or
+        replaced meanwhile are dropped when the new segment is swapped in.
+        Call it under compacting(). Returns the new segment, or None.
+        """
+        with self._locked():
+            manifest = self.read_manifest()
+            sources = manifest["segments"]
+            total = sum(d["count"] for s in sources for d in self.documents(s))
+            if not sources or (len(sources) == 1 and total == sources[0]["count"]):
+                return None  # already a single segment without dead chunks
+            # Reserve the name and the id range; ingest carries on above them
+            name = f"seg_{manifest['next_seq']:08d}"
+            start_id = manifest["next_id"]
+            manifest["next_id"] += total
+            manifest["next_seq"] += 1
+            self._write_manifest(manifest)
+
+        parts, documents, origins = [], [], []
+        next_id = start_id
+        for segment in sources:
+            chunk_file = self.open_chunks(segment)
+            for document in self.documents(segment):
+                entry = {"doc_id": document["doc_id"], "start_id": next_id, "count": document["count"]}
+                if document.get("content_hash"):
+                    entry["content_hash"] = document["content_hash"]
+                documents.append(entry)
+                origins.append((segment["name"], document["start_id"]))
+                parts.append((chunk_file, document["start_id"] - segment["start_id"], document["count"]))
+                next_id += document["count"]
+
+        def chunks():
+            for chunk_file, base, count in parts:
+                for i in range(base, base + count):
+                    yield chunk_file[i]
+
+        prefix = self._segment_path(name, "")
+        positions = np.concatenate([
+            chunk_file.positions[base:base + count] if chunk_file.positions is not None
+            else np.full((count, 2), -1, dtype="int64")
+            for chunk_file, base, count in parts
+        ])
+        write_chunks(prefix, chunks(), positions)
+        dim = parts[0][0].embeddings.shape[1]
+        embeddings = np.lib.format.open_memmap(prefix + ".npy", mode="w+", dtype="float32", shape=(total, dim))
+        row = 0
+        for chunk_file, base, count in parts:
+            embeddings[row:row + count] = chunk_file.embeddings[base:base + count]
+            row += count
+        embeddings.flush()
+        del embeddings
+        merge_postings(prefix, [(self.open_postings(segment), self.segment_ids(segment) - segment["start_id"])
+                                for segment in sources])
+
+        with self._locked():
+            manifest = self.read_manifest()
+            live = {(s["name"], d["start_id"]) for s in manifest["segments"] for d in self.documents(s)}
+            merged = {s["name"] for s in sources}
+            kept = [d for d, origin in zip(documents, origins) if origin in live]
+            manifest["segments"] = [s for s in manifest["segments"] if s["name"] not in merged]
+            segment = None
+            if kept:
+                segment = {"name": name, "start_id": start_id, "count": total, "documents": kept}
+                manifest["segments"].insert(0, segment)
+            self._write_manifest(manifest)
+        return segment
+
+    def remove_orphans(self) -> int:
+        """Delete segment files no longer referenced by the manifest; call it under compacting()."""
+        with self._locked():
+            live = {s["name"] for s in self.read_manifest()["segments"]}
+            removed = 0
+            for filename in os.listdir(self.segment_dir):
+                if filename.split(".")[0] not in live:
+                    try:
+                        os.remove(os.path.join(self.segment_dir, filename))
+                    except PermissionError:
+                        continue  # still memory-mapped by a worker on Windows; retried next compaction
+                    removed += 1
+        return removed
+
+    def import_legacy(self):
+        """One-off import of the pre-segment embeddings.npy / chunks.pkl pair."""
+        embeddings_path = os.path.join(self.root, "embeddings.npy")
+        chunks_path = os.path.join(self.root, "chunks.pkl")
+        if os.path.exists(self.manifest_path) or not os.path.exists(embeddings_path):
+            return None
+        embeddings = np.load(embeddings_path)
+        with open(chunks_path, "rb") as f:
+            chunks = pickle.load(f)
+        return self.append("legacy", chunks, embeddings)
+
+
+vector_store = VectorStore()
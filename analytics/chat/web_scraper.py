@@ -1,74 +1,179 @@
 import os
-import requests
-import numpy as np
-import pickle
+import time
+import hashlib
+import asyncio
+from collections import defaultdict
+import httpx
 from bs4 import BeautifulSoup
-from urllib.parse import urljoin, urlparse
-from sentence_transformers import SentenceTransformer
-
-VECTOR_DB_DIR = "vector_db"
-CHUNK_SIZE = 500
-os.makedirs(VECTOR_DB_DIR, exist_ok=True)
-
-embedder = SentenceTransformer("all-MiniLM-L6-v2")
-
-def chunk_text(text, size=CHUNK_SIZE):
-    return [text[i:i + size] for i in range(0, len(text), size)]
-
-def extract_text_from_html(html_content):
+from urllib.parse import urljoin, urlsplit, urlunsplit
+from vector_store import vector_store, VectorStore
+from embedding_service import encode_cached
+from crawl_cache import crawl_cache, CrawlCache, CACHE_FILE
+from chunking import iter_chunks
+
+CRAWL_MAX_PAGES = int(os.getenv("CRAWL_MAX_PAGES", "10"))
+CRAWL_TIME_BUDGET = float(os.getenv("CRAWL_TIME_BUDGET", "30"))  # seconds per crawl
+CRAWL_HOST_CONCURRENCY = int(os.getenv("CRAWL_HOST_CONCURRENCY", "4"))
+CRAWL_TIMEOUT = 5
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+def normalize_url(url: str) -> str:
+    """Canonical form used for dedupe: lower-case host, no fragment or default port, '/' for an empty path."""
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+    return urlunsplit((scheme, host, parts.path or "/", parts.query, ""))
+
+def parse_page(html_content, page_url: str):
+    """Parse a page once, returning its visible text and the absolute URLs it links to."""
     soup = BeautifulSoup(html_content, "html.parser")
+    links = [urljoin(page_url, tag["href"]) for tag in soup.find_all("a", href=True)]
 
     for script_or_style in soup(["script", "style", "noscript"]):
         script_or_style.extract()
 
     text = soup.get_text(separator="\n")
     lines = [line.strip() for line in text.splitlines() if line.strip()]
-    return "\n".join(lines)
-
-def crawl_website(base_url: str, max_pages: int = 10):
-    visited = set()
-    to_visit = [base_url]
-    all_text = ""
-
-    while to_visit and len(visited) < max_pages:
-        url = to_visit.pop(0)
-        if url in visited:
-            continue
-
-        try:
-            response = requests.get(url, timeout=5)
-            if response.status_code != 200:
-                continue
-            visited.add(url)
+    return "\n".join(lines), links
 
-            text = extract_text_from_html(response.content)
-            all_text += text + "\n"
-
-            soup = BeautifulSoup(response.content, "html.parser")
-            for link_tag in soup.find_all("a", href=True):
-                href = link_tag.get("href")
-                full_url = urljoin(base_url, href)
-
-                # Only crawl the same domain
-                if urlparse(full_url).netloc == urlparse(base_url).netloc:
-                    if full_url not in visited and full_url not in to_visit:
-                        to_visit.append(full_url)
-        except Exception as e:
-            print(f"Error visiting {url}: {e}")
-            continue
-
-    return all_text
-
-def process_url_content(url: str) -> str:
+def extract_text_from_html(html_content):
+    return parse_page(html_content, "")[0]
+
+async def crawl_website_async(base_url: str, max_pages: int = CRAWL_MAX_PAGES,
+                              time_budget: float = CRAWL_TIME_BUDGET,
+                              host_concurrency: int = CRAWL_HOST_CONCURRENCY, cache=None, ingested=None):
+    """
+    Breadth-first crawl of one site with a pooled async HTTP client.
+
+    Returns (pages, stats) where each page is a dict with url, status, text
+    (None unless status is "changed"), validators, content hash and links.
+    The frontier is a FIFO queue plus a set of every URL ever queued, so
+    dedupe is O(1); at most host_concurrency requests are in flight against
+    a host at once. With a CrawlCache, requests are conditional and pages
+    that come back 304 or with an unchanged hash are neither parsed nor
+    returned as changed. If `ingested` (a set of URLs) is given, the cache is
+    only used for those pages, so a page whose document was deleted is
+    fetched and parsed again.
+    """
+    start_url = normalize_url(base_url)
+    site = urlsplit(start_url).netloc
+    frontier = asyncio.Queue()
+    frontier.put_nowait(start_url)
+    seen = {start_url}
+    pages = []
+    host_slots = defaultdict(lambda: asyncio.Semaphore(host_concurrency))
+    started = time.perf_counter()
+    deadline = started + time_budget
+    stats = {"fetched": 0, "not_modified": 0, "skipped": 0, "errors": 0}
+
+    async def worker(client):
+        while len(pages) < max_pages and time.perf_counter() < deadline:
+            url = await frontier.get()
+            try:
+                cached = cache.get(url) if cache and (ingested is None or url in ingested) else None
+                headers = {}
+                if cached and cached["etag"]:
+                    headers["If-None-Match"] = cached["etag"]
+                if cached and cached["last_modified"]:
+                    headers["If-Modified-Since"] = cached["last_modified"]
+
+                async with host_slots[urlsplit(url).netloc]:
+                    response = await client.get(url, headers=headers)
+
+                page = {
+                    "url": url,
+                    "etag": response.headers.get("etag"),
+                    "last_modified": response.headers.get("last-modified"),
+                }
+                if response.status_code == 304 and cached:
+                    stats["not_modified"] += 1
+                    # A 304 need not repeat the validators; keep the cached ones it leaves out
+                    page.update(status="not_modified", text=None, content_hash=cached["content_hash"],
+                                links=cached["links"], etag=page["etag"] or cached["etag"],
+                                last_modified=page["last_modified"] or cached["last_modified"])
+                elif response.status_code != 200 or "html" not in response.headers.get("content-type", "html"):
+                    continue
+                else:
+                    content_hash = hashlib.sha256(response.content).hexdigest()
+                    if cached and cached["content_hash"] == content_hash:
+                        stats["skipped"] += 1
+                        page.update(status="unchanged", text=None, content_hash=content_hash,
+                                    links=cached["links"])
+                    else:
+                        stats["fetched"] += 1
+                        text, links = parse_page(response.content, str(response.url))
+                        page.update(status="changed", text=text, content_hash=content_hash, links=links)
+
+                if len(pages) >= max_pages:
+                    continue
+                pages.append(page)
+                for link in page["links"]:
+                    link = normalize_url(link)
+                    # Only crawl the same domain
+                    if urlsplit(link).netloc == site and link not in seen:
+                        seen.add(link)
+                        frontier.put_nowait(link)
+            except Exception as e:
+                stats["errors"] += 1
+                print(f"Error visiting {url}: {e}")
+            finally:
+                frontier.task_done()
+
+    limits = httpx.Limits(max_connections=host_concurrency, max_keepalive_connections=host_concurrency)
+    async with httpx.AsyncClient(timeout=CRAWL_TIMEOUT, limits=limits, follow_redirects=True) as client:
+        workers = [asyncio.create_task(worker(client)) for _ in range(host_concurrency)]
+        # Done when the frontier drains, or a worker hits the page / time budget
+        drained = asyncio.create_task(frontier.join())
+        remaining = max(0.0, deadline - time.perf_counter())
+        await asyncio.wait([drained, *workers], timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+        for task in [drained, *workers]:
+            task.cancel()
+        await asyncio.gather(drained, *workers, return_exceptions=True)
+
+    elapsed = time.perf_counter() - started
+    stats.update({
+        "pages": len(pages),
+        "seconds": round(elapsed, 3),
+        "pages_per_second": round(len(pages) / elapsed, 2) if elapsed else None,
+    })
+    return pages, stats
+
+def crawl_website(base_url: str, max_pages: int = CRAWL_MAX_PAGES):
+    pages, _ = asyncio.run(crawl_website_async(base_url, max_pages=max_pages))
+    return "\n".join(page["text"] for page in pages)
+
+def process_url_content(url: str, store: VectorStore = vector_store) -> str:
+    # Called from a worker thread, so the crawl gets its own event loop
     try:
-        full_text = crawl_website(url, max_pages=10)  # limit to 10 pages for safety
-        chunks = chunk_text(full_text)
-        embeddings = embedder.encode(chunks, convert_to_numpy=True)
-
-        np.save(os.path.join(VECTOR_DB_DIR, "embeddings.npy"), embeddings)
-        with open(os.path.join(VECTOR_DB_DIR, "chunks.pkl"), "wb") as f:
-            pickle.dump(chunks, f)
-
-        return f"✅ Crawled and processed {len(chunks)} chunks from the website."
+        # Validators are kept per shard: a page another user already crawled is still new to this one
+        cache = crawl_cache if store is vector_store else CrawlCache(os.path.join(store.root, CACHE_FILE))
+        # Skipping an unchanged page is only safe while its document is still in the store
+        ingested = {document["doc_id"][len("page:"):] for segment in store.segments()
+                    for document in store.documents(segment) if document["doc_id"].startswith("page:")}
+        pages, stats = asyncio.run(crawl_website_async(url, cache=cache, ingested=ingested))
+
+        # Each page is its own document, so only pages that changed are re-chunked and re-embedded
+        total_chunks = 0
+        for page in pages:
+            if page["status"] != "changed":
+                continue
+            doc_id = f"page:{page['url']}"
+            chunks = list(iter_chunks([page["text"]], doc_id))
+            if chunks:
+                texts = [chunk.text for chunk in chunks]
+                store.append(doc_id, texts, encode_cached(texts), replace=True,
+                             positions=[(chunk.page, chunk.offset) for chunk in chunks])
+            else:
+                store.delete_document(doc_id)
+            total_chunks += len(chunks)
+        # Sites crawled before per-page documents were stored as one document
+        store.delete_document(f"url:{url}")
+        cache.put_many(pages)
+
+        return (f"✅ Crawled and processed {total_chunks} chunks from the website "
+                f"({stats['fetched']} pages fetched, {stats['not_modified']} not modified, "
+                f"{stats['skipped']} unchanged, {stats['pages_per_second']} pages/s).")
     except Exception as e:
         raise Exception(f"Failed to process URL: {e}")
@@ -4,6 +4,7 @@ from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from dotenv import load_dotenv
 import os
+from metrics import instrument_pool
 
 # Load environment variables
 load_dotenv()
@@ -16,6 +17,8 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
 
+instrument_pool(engine)
+
 # Dependency to get DB session
 def get_db():
     db = SessionLocal()
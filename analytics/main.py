@@ -1,26 +1,48 @@
 from fastapi import FastAPI, Depends
-from sqlalchemy import func, cast, Date
+from fastapi.responses import PlainTextResponse
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 from datetime import datetime, timedelta
 from database import get_db
-from chat.models import ChatHistory, User
+from chat.models import User, DailyMessageRollup
+from timing import RequestTimings, TimingMiddleware
+from service import telemetry_writer
+from metrics import registry, CONTENT_TYPE
 
 
 app = FastAPI(title="Chatbot Analytics API")
 
+# Per-route latency histograms, written to performance_metrics/usage_stats as periodic summaries
+request_timings = RequestTimings("analytics", telemetry_writer)
+app.add_middleware(TimingMiddleware, timings=request_timings)
+
+
+# Prometheus scrape endpoint
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    return PlainTextResponse(registry.render(), media_type=CONTENT_TYPE)
+
+
+# Message counts come from daily_message_rollups (one row per user per day, see
+# chat/rollups.py), so these queries don't grow with chat_history
+
 
 @app.get("/analytics/total_messages")
 def total_messages(user_id: int, db: Session = Depends(get_db)):
-    count = db.query(func.count(ChatHistory.id)).filter(ChatHistory.user_id == user_id).scalar()
-    return {"user_id": user_id, "total_messages": count}
+    count = (
+        db.query(func.coalesce(func.sum(DailyMessageRollup.message_count), 0))
+        .filter(DailyMessageRollup.user_id == user_id)
+        .scalar()
+    )
+    return {"user_id": user_id, "total_messages": int(count)}
 
 
 @app.get("/analytics/messages_per_day")
 def messages_per_day(user_id: int, db: Session = Depends(get_db)):
     results = (
-        db.query(cast(ChatHistory.timestamp, Date), func.count())
-        .filter(ChatHistory.user_id == user_id)
-        .group_by(cast(ChatHistory.timestamp, Date))
+        db.query(DailyMessageRollup.day, DailyMessageRollup.message_count)
+        .filter(DailyMessageRollup.user_id == user_id)
+        .order_by(DailyMessageRollup.day)
         .all()
     )
     return [{"date": str(r[0]), "message_count": r[1]} for r in results]
@@ -28,14 +50,15 @@ def messages_per_day(user_id: int, db: Session = Depends(get_db)):
 
 @app.get("/analytics/recent_activity")
 def recent_activity(days: int = 7, db: Session = Depends(get_db)):
-    since = datetime.utcnow() - timedelta(days=days)
+    # Whole days: everything from the day `days` days ago onwards
+    since = (datetime.utcnow() - timedelta(days=days)).date()
     results = (
-        db.query(ChatHistory.user_id, func.count(ChatHistory.id))
-        .filter(ChatHistory.timestamp >= since)
-        .group_by(ChatHistory.user_id)
+        db.query(DailyMessageRollup.user_id, func.sum(DailyMessageRollup.message_count))
+        .filter(DailyMessageRollup.day >= since)
+        .group_by(DailyMessageRollup.user_id)
         .all()
     )
-    return [{"user_id": r[0], "message_count": r[1]} for r in results]
+    return [{"user_id": r[0], "message_count": int(r[1])} for r in results]
 
 
 @app.get("/analytics/user_summary/{user_id}")
@@ -44,12 +67,16 @@ def user_summary(user_id: int, db: Session = Depends(get_db)):
     if not user:
         return {"error": "User not found."}
 
-    total_messages = db.query(func.count(ChatHistory.id)).filter(ChatHistory.user_id == user_id).scalar()
-    latest_message = db.query(ChatHistory.timestamp).filter(ChatHistory.user_id == user_id).order_by(ChatHistory.timestamp.desc()).first()
+    total_messages, last_activity = (
+        db.query(func.coalesce(func.sum(DailyMessageRollup.message_count), 0),
+                 func.max(DailyMessageRollup.last_activity))
+        .filter(DailyMessageRollup.user_id == user_id)
+        .one()
+    )
 
     return {
         "user_id": user_id,
         "username": user.username,
-        "total_messages": total_messages,
-        "last_activity": latest_message[0] if latest_message else None,
+        "total_messages": int(total_messages),
+        "last_activity": last_activity,
     }
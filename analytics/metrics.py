@@ -0,0 +1,256 @@
+# metrics.py
+"""
+In-process metrics shared by the auth, chat and analytics services, exposed
+at /metrics in the Prometheus text format.
+
+Counters and histograms keep one slot per thread, and a thread only ever
+writes its own slot, so recording takes no lock; a scrape sums the slots.
+Histograms have fixed buckets. Each process (uvicorn worker, job worker)
+keeps its own numbers, the way a Prometheus client library would.
+"""
+import time
+import bisect
+import threading
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# Seconds; the Prometheus client defaults plus room for slow LLM calls
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class _Slots:
+    """Per-thread rows of `width` numbers for one metric (or one label set)."""
+
+    def __init__(self, width: int):
+        self.width = width
+        self._local = threading.local()
+        self._rows = []
+        self._lock = threading.Lock()  # only taken the first time a thread records
+
+    def mine(self) -> list:
+        try:
+            return self._local.row
+        except AttributeError:
+            row = self._local.row = [0] * self.width
+            with self._lock:
+                self._rows.append(row)
+            return row
+
+    def totals(self) -> list:
+        with self._lock:
+            rows = list(self._rows)
+        return [sum(row[i] for row in rows) for i in range(self.width)]
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values):
+        """The child metric for one set of label values."""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} takes labels {self.labelnames}")
+            with self._lock:
+                child = self._children.setdefault(values, self._child())
+        return child
+
+    def _child(self):
+        raise NotImplementedError
+
+    def _label_sets(self):
+        if not self.labelnames:
+            return [((), self)]
+        return sorted(self._children.items())
+
+    def _labels(self, values, extra: str = "") -> str:
+        pairs = [f'{k}="{_escape(v)}"' for k, v in zip(self.labelnames, values)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def render(self) -> list:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._slots = _Slots(1)
+
+    def _child(self):
+        return Counter(self.name, self.documentation)
+
+    def inc(self, amount: float = 1):
+        self._slots.mine()[0] += amount
+
+    def value(self) -> float:
+        return self._slots.totals()[0]
+
+    def render(self) -> list:
+        lines = super().render()
+        for values, child in self._label_sets():
+            lines.append(f"{self.name}{self._labels(values)} {_number(child.value())}")
+        return lines
+
+
+class Gauge(_Metric):
+    """A value that is set, or read from a function at scrape time."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), function=None):
+        super().__init__(name, documentation, labelnames)
+        self._value = 0
+        self._function = function
+
+    def _child(self):
+        return Gauge(self.name, self.documentation)
+
+    def set(self, value: float):
+        self._value = value
+
+    def set_function(self, function):
+        self._function = function
+
+    def value(self) -> float:
+        return self._function() if self._function is not None else self._value
+
+    def render(self) -> list:
+        lines = super().render()
+        for values, child in self._label_sets():
+            lines.append(f"{self.name}{self._labels(values)} {_number(child.value())}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # One count per bucket, one for +Inf, then the sum
+        self._slots = _Slots(len(self.buckets) + 2)
+
+    def _child(self):
+        return Histogram(self.name, self.documentation, buckets=self.buckets)
+
+    def observe(self, value: float):
+        row = self._slots.mine()
+        row[bisect.bisect_left(self.buckets, value)] += 1
+        row[-1] += value
+
+    def time(self):
+        """Observe the seconds spent in a `with` block."""
+        return _Timer(self)
+
+    def render(self) -> list:
+        lines = super().render()
+        for values, child in self._label_sets():
+            totals = child._slots.totals()
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), totals[:-1]):
+                cumulative += count
+                le = 'le="{}"'.format(_number(bound))
+                lines.append(f"{self.name}_bucket{self._labels(values, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{self._labels(values)} {_number(totals[-1])}")
+            lines.append(f"{self.name}_count{self._labels(values)} {cumulative}")
+        return lines
+
+
+class _Timer:
+    # A plain class rather than @contextmanager, which costs a generator per use
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram: Histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start)
+        return False
+
+
+class Registry:
+    """Named metrics of one process; asking for an existing name returns it."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name: str, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"{name} is already registered as a {metric.kind}")
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames=()) -> Counter:
+        return self._get(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames=(), function=None) -> Gauge:
+        return self._get(Gauge, name, documentation, labelnames, function)
+
+    def histogram(self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._get(Histogram, name, documentation, labelnames, buckets)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda m: m.name)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+registry = Registry()
+
+# Seconds a request or job holds a pooled connection; finer at the low end than the defaults
+DB_CONNECTION_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def instrument_pool(engine):
+    """
+    Time how long each pooled connection is checked out, from the pool's
+    checkout event to its checkin, and gauge how many are out right now.
+    Sessions stay lazy: nothing is checked out until the first query.
+    """
+    from sqlalchemy import event
+
+    held = registry.histogram("db_connection_held_seconds", "Time a pooled database connection was checked out",
+                              buckets=DB_CONNECTION_BUCKETS)
+    if hasattr(engine.pool, "checkedout"):
+        registry.gauge("db_pool_checked_out", "Pooled database connections currently checked out",
+                       function=engine.pool.checkedout)
+
+    @event.listens_for(engine, "checkout")
+    def _checkout(dbapi_connection, connection_record, connection_proxy):
+        connection_record.info["checked_out_at"] = time.perf_counter()
+
+    @event.listens_for(engine, "checkin")
+    def _checkin(dbapi_connection, connection_record):
+        start = connection_record.info.pop("checked_out_at", None)
+        if start is not None:
+            held.observe(time.perf_counter() - start)
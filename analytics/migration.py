@@ -1,4 +1,5 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.schema import CreateColumn
 from models import Base
 from database import DATABASE_URL
 
@@ -8,5 +9,16 @@ engine = create_engine(DATABASE_URL)
 # Create all tables
 Base.metadata.create_all(bind=engine)
 
+# create_all skips tables that exist, so add columns the models gained since (all nullable)
+existing = inspect(engine)
+with engine.begin() as connection:
+    for table in Base.metadata.sorted_tables:
+        present = {c["name"] for c in existing.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in present:
+                ddl = CreateColumn(column).compile(dialect=engine.dialect)
+                connection.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {ddl}"))
+                print(f"✅ Added {table.name}.{column.name}")
+
 # Print confirmation message
 print("✅ Tables have been created successfully.")
@@ -14,6 +14,9 @@ class UsageStat(Base):
     endpoint = Column(String(100))
     request_type = Column(String(20))  
     timestamp = Column(DateTime, default=datetime.utcnow)
+    # Rows written by timing.TimingMiddleware count a whole time window's requests
+    service = Column(String(20), nullable=True)
+    request_count = Column(Integer, default=1)
 
 
 class PerformanceMetric(Base):
@@ -26,6 +29,22 @@ class PerformanceMetric(Base):
     username = Column(String(50))
     timestamp = Column(DateTime, default=datetime.utcnow)
 
+    # Summary rows from timing.TimingMiddleware: one per service, route and phase per
+    # time window, with response_time the window's mean in ms
+    service = Column(String(20), nullable=True)
+    method = Column(String(10), nullable=True)
+    phase = Column(String(20), nullable=True)  # None for the whole request
+    request_count = Column(Integer, nullable=True)
+    error_count = Column(Integer, nullable=True)  # 5xx
+    client_error_count = Column(Integer, nullable=True)  # 4xx
+    p50_ms = Column(Float, nullable=True)
+    p95_ms = Column(Float, nullable=True)
+    p99_ms = Column(Float, nullable=True)
+    max_ms = Column(Float, nullable=True)
+    bytes_in = Column(Integer, nullable=True)
+    bytes_out = Column(Integer, nullable=True)
+    window_seconds = Column(Float, nullable=True)
+
 
 class ErrorLog(Base):
     __tablename__ = 'error_logs'
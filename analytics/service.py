@@ -1,36 +1,40 @@
+import atexit
 from datetime import datetime
-from analytics.models import UsageStat, PerformanceMetric, ErrorLog
 from sqlalchemy.orm import Session
+from models import UsageStat, PerformanceMetric, ErrorLog
+from database import SessionLocal
+from telemetry import TelemetryWriter
 
+telemetry_writer = TelemetryWriter(SessionLocal)
+atexit.register(telemetry_writer.close)
+
+# db is kept so existing callers don't change; rows are written by telemetry_writer
 def log_usage(db: Session, user_id, username, endpoint, request_type):
-    usage = UsageStat(
+    telemetry_writer.submit(
+        UsageStat,
         user_id=user_id,
         username=username,
         endpoint=endpoint,
         request_type=request_type,
         timestamp=datetime.utcnow()
     )
-    db.add(usage)
-    db.commit()
 
 def log_performance(db: Session, user_id, username, endpoint, response_time):
-    perf = PerformanceMetric(
+    telemetry_writer.submit(
+        PerformanceMetric,
         user_id=user_id,
         username=username,
         endpoint=endpoint,
         response_time=response_time,
         timestamp=datetime.utcnow()
     )
-    db.add(perf)
-    db.commit()
 
 def log_error(db: Session, endpoint, error_message, user_id=None, username=None):
-    err = ErrorLog(
+    telemetry_writer.submit(
+        ErrorLog,
         endpoint=endpoint,
         error_message=error_message,
         user_id=user_id,
         username=username,
         timestamp=datetime.utcnow()
     )
-    db.add(err)
-    db.commit()
@@ -0,0 +1,142 @@
+# telemetry.py
+"""
+Write-behind writer for telemetry rows, shared by the analytics service
+(usage, performance and error logs) and the request timing summaries of
+every service (see timing.py).
+"""
+import os
+import queue
+import threading
+import time
+from collections import Counter
+from sqlalchemy import insert
+
+TELEMETRY_QUEUE_MAX = int(os.getenv("TELEMETRY_QUEUE_MAX", "10000"))
+TELEMETRY_BATCH_SIZE = int(os.getenv("TELEMETRY_BATCH_SIZE", "500"))
+TELEMETRY_FLUSH_SECONDS = float(os.getenv("TELEMETRY_FLUSH_SECONDS", "1.0"))
+# How long a caller may wait for room in a full queue; 0 drops the record at once
+TELEMETRY_BLOCK_MS = float(os.getenv("TELEMETRY_BLOCK_MS", "0"))
+
+_STOP = object()  # queue marker: write out what's left and exit
+
+
+def _table_name(model) -> str:
+    return getattr(model, "__tablename__", None) or model.name
+
+
+class TelemetryWriter:
+    """
+    Write-behind sink for telemetry rows of ORM models or Core tables.
+
+    submit() only puts the row on a bounded in-memory queue. A background
+    thread drains it and writes each table's rows with one multi-row INSERT
+    per batch, once TELEMETRY_BATCH_SIZE rows are waiting or the oldest has
+    waited TELEMETRY_FLUSH_SECONDS. When the queue is full the caller waits
+    up to TELEMETRY_BLOCK_MS, then the row is dropped and counted.
+    """
+
+    def __init__(self, session_factory, max_queue: int = TELEMETRY_QUEUE_MAX,
+                 batch_size: int = TELEMETRY_BATCH_SIZE, flush_seconds: float = TELEMETRY_FLUSH_SECONDS,
+                 block_ms: float = TELEMETRY_BLOCK_MS):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.block = block_ms / 1000
+        self._queue = queue.Queue(max_queue)
+        self._lock = threading.Lock()
+        self._thread = None
+        self.written = Counter()
+        self.dropped = Counter()
+        self.failed = Counter()
+        self.blocked = 0
+        self.batches = 0
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name="telemetry-writer", daemon=True)
+                    self._thread.start()
+
+    def submit(self, model, **row) -> bool:
+        """Queue one row for model's table. Returns False if it was dropped."""
+        self._ensure_thread()
+        try:
+            self._queue.put_nowait((model, row))
+            return True
+        except queue.Full:
+            pass
+        if self.block > 0:
+            self.blocked += 1
+            try:
+                self._queue.put((model, row), timeout=self.block)
+                return True
+            except queue.Full:
+                pass
+        self.dropped[_table_name(model)] += 1
+        return False
+
+    def _write(self, pending: dict):
+        db = self.session_factory()
+        try:
+            for model, rows in pending.items():
+                try:
+                    db.execute(insert(model), rows)
+                    db.commit()
+                    self.written[_table_name(model)] += len(rows)
+                except Exception as e:
+                    db.rollback()
+                    self.failed[_table_name(model)] += len(rows)
+                    print(f"⚠️ Telemetry write to {_table_name(model)} failed: {e}")
+            self.batches += 1
+        finally:
+            db.close()
+
+    def _run(self):
+        pending, count, deadline = {}, 0, None
+        while True:
+            timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if isinstance(item, tuple):
+                model, row = item
+                pending.setdefault(model, []).append(row)
+                count += 1
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_seconds
+                if count < self.batch_size:
+                    continue
+            if pending:
+                self._write(pending)
+                pending, count, deadline = {}, 0, None
+            if isinstance(item, threading.Event):
+                item.set()
+            if item is _STOP:
+                return
+
+    def flush(self, timeout: float = None) -> bool:
+        """Block until everything submitted so far is written (or timeout)."""
+        if self._thread is None or not self._thread.is_alive():
+            return self._queue.empty()
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def close(self, timeout: float = 10):
+        """Write out what's queued and stop the background thread."""
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize(),
+            "batches": self.batches,
+            "written": dict(self.written),
+            "dropped": dict(self.dropped),
+            "failed": dict(self.failed),
+            "blocked": self.blocked,
+        }
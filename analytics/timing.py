@@ -0,0 +1,280 @@
+# timing.py
+"""
+Request timing shared by the auth, chat and analytics services.
+
+TimingMiddleware times every request and aggregates in memory, per route
+template and method: a latency histogram, status classes, and request and
+response bytes. Handlers can time their own phases (retrieval, LLM, DB) with
+`with phase("llm"):`, and say who is asking with set_user(). Every
+TIMING_FLUSH_SECONDS the aggregates are swapped out and written as one
+summary row per route (and per phase) to performance_metrics, plus one
+usage_stats row per route and user, so the tables grow with routes × time
+windows, not with traffic.
+"""
+import os
+import time
+import atexit
+import bisect
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from sqlalchemy import table, column
+
+TIMING_FLUSH_SECONDS = float(os.getenv("TIMING_FLUSH_SECONDS", "60"))
+
+# Bucket upper bounds in ms, 0.05 ms to ~2 minutes, each 15% above the last
+BUCKETS_MS = [0.05 * 1.15 ** i for i in range(106)]
+
+# The analytics models' tables, declared with Core so the chat and auth
+# services can write them without importing analytics/models.py
+usage_stats = table(
+    "usage_stats",
+    column("user_id"), column("username"), column("endpoint"), column("request_type"),
+    column("service"), column("request_count"), column("timestamp"),
+)
+performance_metrics = table(
+    "performance_metrics",
+    column("user_id"), column("username"), column("endpoint"), column("response_time"),
+    column("service"), column("method"), column("phase"), column("request_count"), column("error_count"),
+    column("client_error_count"), column("p50_ms"), column("p95_ms"), column("p99_ms"), column("max_ms"),
+    column("bytes_in"), column("bytes_out"), column("window_seconds"), column("timestamp"),
+)
+
+# Per-request state: {"user": (id, name) or None, "phases": {name: seconds}}
+_request = ContextVar("timing_request", default=None)
+
+
+class Histogram:
+    """Fixed-bucket latency histogram; percentiles are read off the bucket bounds."""
+
+    __slots__ = ("counts", "total", "count", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.total = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def add(self, ms: float):
+        self.counts[bisect.bisect_left(BUCKETS_MS, ms)] += 1
+        self.total += ms
+        self.count += 1
+        if ms > self.max:
+            self.max = ms
+
+    def percentile(self, q: float) -> float:
+        rank, seen = q * self.count, 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank and n:
+                return min(BUCKETS_MS[i] if i < len(BUCKETS_MS) else self.max, self.max)
+        return self.max
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total / self.count, 2) if self.count else None,
+            "p50_ms": round(self.percentile(0.5), 2),
+            "p95_ms": round(self.percentile(0.95), 2),
+            "p99_ms": round(self.percentile(0.99), 2),
+            "max_ms": round(self.max, 2),
+        }
+
+
+class RouteStats:
+    __slots__ = ("latency", "phases", "statuses", "bytes_in", "bytes_out", "users")
+
+    def __init__(self):
+        self.latency = Histogram()
+        self.phases = {}
+        self.statuses = [0] * 6  # by status // 100
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.users = {}  # (user_id, username) -> requests
+
+
+def set_user(user_id, username=None):
+    """Attribute the current request to a user in usage_stats."""
+    state = _request.get()
+    if state is not None:
+        state["user"] = (user_id, username)
+
+
+@contextmanager
+def phase(name: str):
+    """Add the time spent in the block to the current request's phase `name`."""
+    state = _request.get()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if state is not None:
+            phases = state["phases"]
+            phases[name] = phases.get(name, 0.0) + time.perf_counter() - start
+
+
+class RequestTimings:
+    """
+    One service's request aggregates. A background thread submits them to the
+    given TelemetryWriter every flush_seconds; without a writer they are only
+    kept for stats().
+    """
+
+    def __init__(self, service: str, writer=None, flush_seconds: float = TIMING_FLUSH_SECONDS):
+        self.service = service
+        self.writer = writer
+        self.flush_seconds = flush_seconds
+        self._lock = threading.Lock()
+        self._routes = {}
+        self._window_start = time.time()
+        self._last = {}  # summaries of the last written window, for stats()
+        self._thread = None
+        self.submitted = 0
+        self.dropped = 0
+
+    def record(self, key, elapsed_ms, status, received, sent, state):
+        with self._lock:
+            stats = self._routes.get(key)
+            if stats is None:
+                stats = self._routes[key] = RouteStats()
+            stats.latency.add(elapsed_ms)
+            stats.statuses[min(status // 100, 5)] += 1
+            stats.bytes_in += received
+            stats.bytes_out += sent
+            for name, seconds in state["phases"].items():
+                histogram = stats.phases.get(name)
+                if histogram is None:
+                    histogram = stats.phases[name] = Histogram()
+                histogram.add(seconds * 1000)
+            user = state["user"] or (None, None)
+            stats.users[user] = stats.users.get(user, 0) + 1
+
+    def start(self):
+        if self.writer is not None and (self._thread is None or not self._thread.is_alive()):
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name=f"timing-{self.service}", daemon=True)
+                    self._thread.start()
+                    # atexit runs last-registered first: submit the last window, then drain the writer
+                    atexit.register(self.writer.close)
+                    atexit.register(self.flush)
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_seconds)
+            self.flush()
+
+    def _swap(self):
+        with self._lock:
+            routes, self._routes = self._routes, {}
+            window_start, self._window_start = self._window_start, time.time()
+        return routes, time.time() - window_start
+
+    def _rows(self, routes: dict, window: float):
+        now = datetime.utcnow()
+        performance, usage = [], []
+        for (endpoint, method), stats in routes.items():
+            for phase_name, histogram in [(None, stats.latency)] + sorted(stats.phases.items()):
+                summary = histogram.summary()
+                performance.append({
+                    "user_id": None, "username": None, "endpoint": endpoint, "service": self.service,
+                    "method": method, "phase": phase_name, "request_count": summary["count"],
+                    "response_time": summary["mean_ms"],
+                    "error_count": stats.statuses[5] if phase_name is None else None,
+                    "client_error_count": stats.statuses[4] if phase_name is None else None,
+                    "p50_ms": summary["p50_ms"], "p95_ms": summary["p95_ms"], "p99_ms": summary["p99_ms"],
+                    "max_ms": summary["max_ms"],
+                    "bytes_in": stats.bytes_in if phase_name is None else None,
+                    "bytes_out": stats.bytes_out if phase_name is None else None,
+                    "window_seconds": round(window, 1), "timestamp": now,
+                })
+            for (user_id, username), count in stats.users.items():
+                usage.append({
+                    "user_id": user_id, "username": username, "endpoint": endpoint, "request_type": method,
+                    "service": self.service, "request_count": count, "timestamp": now,
+                })
+        return performance, usage
+
+    def flush(self):
+        """Write the current window's summaries and start a new window."""
+        routes, window = self._swap()
+        if not routes:
+            return
+        self._last = {f"{method} {endpoint}": self._summary(stats) for (endpoint, method), stats in routes.items()}
+        if self.writer is None:
+            return
+        performance, usage = self._rows(routes, window)
+        for target, rows in ((performance_metrics, performance), (usage_stats, usage)):
+            for row in rows:
+                if self.writer.submit(target, **row):
+                    self.submitted += 1
+                else:
+                    self.dropped += 1
+
+    @staticmethod
+    def _summary(stats: RouteStats) -> dict:
+        return {
+            **stats.latency.summary(),
+            "phases": {name: h.summary() for name, h in stats.phases.items()},
+            "status": {f"{i}xx": n for i, n in enumerate(stats.statuses) if n},
+            "bytes_in": stats.bytes_in,
+            "bytes_out": stats.bytes_out,
+        }
+
+    def stats(self) -> dict:
+        """Summaries of the current window, falling back to the last written one."""
+        with self._lock:
+            current = {f"{method} {endpoint}": self._summary(stats)
+                       for (endpoint, method), stats in self._routes.items()}
+        return {
+            "window_seconds": round(time.time() - self._window_start, 1),
+            "routes": current or self._last,
+            "rows_submitted": self.submitted,
+            "rows_dropped": self.dropped,
+            "writer": self.writer.stats() if self.writer is not None else None,
+        }
+
+
+class TimingMiddleware:
+    """
+    Pure ASGI middleware, so streaming responses are timed to their last byte
+    and nothing is buffered. Requests are keyed by route template, so
+    /jobs/1 and /jobs/2 share one entry.
+    """
+
+    def __init__(self, app, timings: RequestTimings):
+        self.app = app
+        self.timings = timings
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        self.timings.start()
+
+        start = time.perf_counter()
+        state = {"user": None, "phases": {}}
+        token = _request.set(state)
+        status, sent = 500, 0
+
+        async def send_timed(message):
+            nonlocal status, sent
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                sent += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_timed)
+        finally:
+            _request.reset(token)
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            route = scope.get("route")
+            key = (getattr(route, "path", None) or "unmatched", scope["method"])
+            received = 0
+            for name, value in scope["headers"]:
+                if name == b"content-length":
+                    received = int(value)
+                    break
+            self.timings.record(key, elapsed_ms, status, received, sent, state)
@@ -5,6 +5,8 @@ from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from dotenv import load_dotenv
 import os
+import shared  # puts analytics/ on sys.path for metrics.py
+from metrics import instrument_pool
 
 # Load environment variables
 load_dotenv()
@@ -17,6 +19,8 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
 
+instrument_pool(engine)
+
 # Dependency to get DB session
 def get_db():
     db = SessionLocal()
@@ -1,8 +1,14 @@
 # main.py
 
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from routes import router as auth_router
+from database import SessionLocal
+import shared  # puts analytics/ on sys.path for timing.py, telemetry.py and metrics.py
+from timing import RequestTimings, TimingMiddleware
+from telemetry import TelemetryWriter
+from metrics import registry, CONTENT_TYPE
 
 app = FastAPI(
     title="Authentication API",
@@ -18,6 +24,10 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Per-route latency histograms, written to performance_metrics/usage_stats as periodic summaries
+request_timings = RequestTimings("auth", TelemetryWriter(SessionLocal))
+app.add_middleware(TimingMiddleware, timings=request_timings)
+
 # Include authentication routes
 app.include_router(auth_router)
 
@@ -25,3 +35,8 @@ app.include_router(auth_router)
 @app.get("/")
 def read_root():
     return {"message": "Chatbot Authentication API is running ✅"}
+
+# Prometheus scrape endpoint
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    return PlainTextResponse(registry.render(), media_type=CONTENT_TYPE)
@@ -0,0 +1,9 @@
+# shared.py
+# metrics.py and timing.py are shared with the chat and analytics services and live
+# in analytics/. Import this module before them to make them importable.
+import os
+import sys
+
+ANALYTICS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "analytics")
+if ANALYTICS_DIR not in sys.path:
+    sys.path.append(ANALYTICS_DIR)
@@ -6,6 +6,8 @@ from datetime import datetime, timedelta
 from typing import Dict
 from sqlalchemy.orm import Session
 from models import User
+import shared  # puts analytics/ on sys.path for metrics.py
+from metrics import registry
 
 # Load environment variables
 load_dotenv()
@@ -20,19 +22,25 @@ REFRESH_TOKEN_EXPIRE_DAYS = 7     # 7 days
 # Initialize password context for hashing
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+PASSWORD_HASH_SECONDS = registry.histogram(
+    "auth_password_hash_seconds", "bcrypt time per password hash or verify", labelnames=("operation",)
+)
+
 # Function to hash the password
 def get_password_hash(password: str) -> str:
     """
     Hash the provided password using bcrypt algorithm.
     """
-    return pwd_context.hash(password)
+    with PASSWORD_HASH_SECONDS.labels("hash").time():
+        return pwd_context.hash(password)
 
 # Function to verify the password hash
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """
     Verify if the plain password matches the hashed password.
     """
-    return pwd_context.verify(plain_password, hashed_password)
+    with PASSWORD_HASH_SECONDS.labels("verify").time():
+        return pwd_context.verify(plain_password, hashed_password)
 
 # Function to create an access token
 def create_access_token(data: Dict[str, str], expires_delta: timedelta = None) -> str: